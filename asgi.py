@@ -0,0 +1,199 @@
+"""
+ASGI Entry Point
+Serves job event streams (/jobs/<id>/events) and audio (/serve-audio/<path>)
+asynchronously so any number of watchers and players are served without
+holding a worker thread each. All other routes are handed to the Flask app
+through a bounded thread pool.
+
+Run with:
+    uvicorn asgi:application --host 0.0.0.0 --port $PORT
+"""
+
+import os
+import re
+import asyncio
+from urllib.parse import parse_qs
+
+from a2wsgi import WSGIMiddleware
+
+import audio_serving
+import jobs
+import server
+
+# Threads available to the regular Flask routes
+WSGI_THREADS = int(os.environ.get('WSGI_THREADS', 8))
+
+KEEPALIVE_SECONDS = 15
+
+EVENTS_PATH = re.compile(r'^/jobs/([^/]+)/events/?$')
+AUDIO_PATH = re.compile(r'^/serve-audio/(.+)$')
+
+flask_app = WSGIMiddleware(server.app, workers=WSGI_THREADS)
+
+
+async def stream_job_events(job, since, receive, send):
+    """Send a job's events as SSE until it finishes or the client disconnects"""
+    await send({
+        'type': 'http.response.start',
+        'status': 200,
+        'headers': [
+            (b'content-type', b'text/event-stream'),
+            (b'cache-control', b'no-cache'),
+            (b'x-accel-buffering', b'no'),
+            (b'access-control-allow-origin', b'*'),
+        ]
+    })
+
+    disconnected = asyncio.Event()
+    wake = asyncio.Event()
+
+    async def watch_disconnect():
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                disconnected.set()
+                wake.set()
+                return
+
+    watcher = asyncio.ensure_future(watch_disconnect())
+    loop = asyncio.get_running_loop()
+    # The bus wakes the stream when events land - no polling, no executor call per tick
+    stop_listening = job.bus.listen(lambda: loop.call_soon_threadsafe(wake.set))
+    index = since
+    try:
+        while not disconnected.is_set():
+            wake.clear()
+            # Read closed first: once it is set every event is in the list.
+            # Appends are atomic, so the slice needs no lock
+            closed = job.bus.closed
+            events = job.events[index:]
+            if events:
+                body = jobs.sse_frames(index, events)
+                index += len(events)
+                await send({'type': 'http.response.body', 'body': body.encode(), 'more_body': True})
+                continue
+            if closed:
+                break
+            try:
+                await asyncio.wait_for(wake.wait(), KEEPALIVE_SECONDS)
+            except asyncio.TimeoutError:
+                await send({'type': 'http.response.body', 'body': b': keepalive\n\n', 'more_body': True})
+    finally:
+        stop_listening()
+        watcher.cancel()
+
+    if not disconnected.is_set():
+        await send({'type': 'http.response.body', 'body': b'', 'more_body': False})
+
+
+async def serve_audio(scope, send, rel_path):
+    """/serve-audio with ranges and validators, streamed without a worker thread
+
+    Uses the ASGI zero-copy extension when the server offers it, otherwise
+    reads chunks with pread on the default executor between sends.
+    """
+    loop = asyncio.get_running_loop()
+    full_path = await loop.run_in_executor(None, server.resolve_audio_path, rel_path)
+    if not full_path:
+        await send_json_error(send, 404, 'File not found')
+        return
+
+    request_headers = {k.decode('latin-1').lower(): v.decode('latin-1') for k, v in scope.get('headers') or []}
+    stat = os.stat(full_path)
+    headers = audio_serving.cache_headers(stat)
+    headers['Content-Type'] = audio_serving.content_type(full_path)
+    headers['Access-Control-Allow-Origin'] = '*'
+
+    accel = audio_serving.accel_redirect(rel_path, stat.st_size)
+    if accel:
+        headers['X-Accel-Redirect'] = accel
+        await send_response(send, 200, headers)
+        return
+
+    if audio_serving.not_modified(stat, request_headers.get('if-none-match'),
+                                  request_headers.get('if-modified-since')):
+        del headers['Content-Type']
+        await send_response(send, 304, headers)
+        return
+
+    try:
+        byte_range = audio_serving.parse_range(request_headers.get('range'), stat.st_size,
+                                               request_headers.get('if-range'), stat)
+    except ValueError:
+        headers['Content-Range'] = f'bytes */{stat.st_size}'
+        await send_response(send, 416, headers)
+        return
+
+    status = 200
+    start, end = 0, stat.st_size - 1
+    if byte_range:
+        status = 206
+        start, end = byte_range
+        headers['Content-Range'] = f'bytes {start}-{end}/{stat.st_size}'
+    length = end - start + 1
+    headers['Content-Length'] = str(length)
+
+    if scope['method'] == 'HEAD':
+        await send_response(send, status, headers)
+        return
+
+    await send({'type': 'http.response.start', 'status': status,
+                'headers': [(k.lower().encode('latin-1'), v.encode('latin-1')) for k, v in headers.items()]})
+
+    with open(full_path, 'rb') as f:
+        if 'http.response.zerocopy' in scope.get('extensions', {}):
+            await send({'type': 'http.response.zerocopy', 'file': f.fileno(),
+                        'offset': start, 'count': length, 'more_body': False})
+            return
+
+        offset = start
+        finished = False
+        while offset <= end:
+            chunk = await loop.run_in_executor(
+                None, os.pread, f.fileno(), min(audio_serving.CHUNK_SIZE, end - offset + 1), offset)
+            if not chunk:
+                break
+            offset += len(chunk)
+            finished = offset > end
+            await send({'type': 'http.response.body', 'body': chunk, 'more_body': not finished})
+    # Empty file, or it shrank while being sent - the response still has to end
+    if not finished:
+        await send({'type': 'http.response.body', 'body': b'', 'more_body': False})
+
+
+async def send_response(send, status, headers, body=b''):
+    await send({'type': 'http.response.start', 'status': status,
+                'headers': [(k.lower().encode('latin-1'), v.encode('latin-1')) for k, v in headers.items()]})
+    await send({'type': 'http.response.body', 'body': body})
+
+
+async def send_json_error(send, status, message):
+    body = ('{"error": "%s"}' % message).encode()
+    await send({'type': 'http.response.start', 'status': status,
+                'headers': [(b'content-type', b'application/json')]})
+    await send({'type': 'http.response.body', 'body': body})
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'http' and scope['method'] in ('GET', 'HEAD'):
+        match = AUDIO_PATH.match(scope['path'])
+        if match:
+            await serve_audio(scope, send, match.group(1))
+            return
+
+    if scope['type'] == 'http' and scope['method'] == 'GET':
+        match = EVENTS_PATH.match(scope['path'])
+        if match:
+            # Finished jobs may be loaded from the job store (SQLite)
+            job = await asyncio.get_running_loop().run_in_executor(None, server.job_registry.get, match.group(1))
+            if not job:
+                await send_json_error(send, 404, 'Job not found')
+                return
+
+            headers = dict(scope.get('headers') or [])
+            query = parse_qs(scope.get('query_string', b'').decode())
+            last_id = headers.get(b'last-event-id', b'').decode() or query.get('lastEventId', [None])[0]
+            await stream_job_events(job, jobs.parse_last_event_id(last_id), receive, send)
+            return
+
+    await flask_app(scope, receive, send)
@@ -0,0 +1,253 @@
+"""
+Audio Cache Module
+Manages DOWNLOADS_DIR as a bounded read-through cache in front of GitHub
+storage. Misses are fetched once even when requested concurrently, files
+are evicted least-recently-used beyond CACHE_MAX_BYTES, and files pinned by
+running jobs are never evicted.
+"""
+
+import os
+import shutil
+import hashlib
+import threading
+from collections import OrderedDict
+
+# Byte budget for cached copies of remote files (default 1 GiB)
+CACHE_MAX_BYTES = int(os.environ.get('CACHE_MAX_BYTES', 1024 ** 3))
+
+
+_digests = {}   # (path, size, mtime_ns) -> sha256 hex
+_digests_lock = threading.Lock()
+
+
+def file_digest(path):
+    """SHA-256 of a file's content, remembered while the file is unchanged"""
+    stat = os.stat(path)
+    key = (path, stat.st_size, stat.st_mtime_ns)
+    with _digests_lock:
+        digest = _digests.get(key)
+    if digest is None:
+        sha = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                sha.update(chunk)
+        digest = sha.hexdigest()
+        with _digests_lock:
+            _digests[key] = digest
+    return digest
+
+
+def remove_local(path):
+    """Delete a local file or folder
+
+    Returns:
+        True if it was there
+    """
+    if os.path.isdir(path):
+        shutil.rmtree(path, ignore_errors=True)
+        return True
+    try:
+        os.remove(path)
+        return True
+    except FileNotFoundError:
+        return False
+
+
+class DiskCache:
+    """LRU disk cache of remote files under a local root
+
+    Args:
+        root: Local folder mirroring the remote layout
+        fetch: Callable(rel_path, local_path) -> bool that downloads a file
+        max_bytes: Eviction threshold
+    """
+
+    def __init__(self, root, fetch, max_bytes=CACHE_MAX_BYTES):
+        self.root = root
+        self.fetch = fetch
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()   # rel path -> size, least recent first
+        self._bytes = 0
+        self._pins = {}                 # rel path -> set of owners
+        self._inflight = {}             # rel path -> Event set when the fetch ends
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.fetch_failures = 0
+
+    def local_path(self, rel_path):
+        return os.path.join(self.root, rel_path)
+
+    def adopt(self, rel_paths):
+        """Track files already on disk that are known to be in remote storage
+
+        Oldest (by access time) become the first eviction candidates.
+        """
+        found = []
+        for rel_path in rel_paths:
+            try:
+                stat = os.stat(self.local_path(rel_path))
+            except OSError:
+                continue
+            found.append((stat.st_atime, rel_path, stat.st_size))
+        with self._lock:
+            for _, rel_path, size in sorted(found):
+                self._track(rel_path, size)
+        self._evict()
+
+    def add(self, rel_path, owner=None):
+        """Track a local file that has just been uploaded to remote storage
+
+        Passing an owner pins it until release(owner), e.g. while the job
+        that produced it still reads it.
+        """
+        try:
+            size = os.path.getsize(self.local_path(rel_path))
+        except OSError:
+            return
+        with self._lock:
+            if owner is not None:
+                self._pins.setdefault(rel_path, set()).add(owner)
+            self._track(rel_path, size)
+        self._evict()
+
+    def get(self, rel_path, owner=None):
+        """Local path of a remote file, fetching it on a miss
+
+        Concurrent misses for the same file share one fetch. Passing an owner
+        (e.g. a job ID) pins the file until release(owner).
+
+        Returns:
+            Local path, or None if the file could not be fetched
+        """
+        path = self.local_path(rel_path)
+        while True:
+            with self._lock:
+                if owner is not None:
+                    self._pins.setdefault(rel_path, set()).add(owner)
+                if rel_path in self._entries and os.path.exists(path):
+                    self._entries.move_to_end(rel_path)
+                    self.hits += 1
+                    return path
+                if os.path.exists(path) and rel_path not in self._inflight:
+                    # On disk but untracked, e.g. written by a job before upload
+                    self.hits += 1
+                    return path
+                waiting = self._inflight.get(rel_path)
+                if waiting is None:
+                    done = threading.Event()
+                    self._inflight[rel_path] = done
+                    self.misses += 1
+                    break
+            waiting.wait()
+            if not os.path.exists(path):
+                return self._fail(rel_path, owner)
+
+        try:
+            fetched = self.fetch(rel_path, path)
+        except Exception as e:
+            print(f'Cache fetch error for {rel_path}: {e}')
+            fetched = False
+
+        with self._lock:
+            del self._inflight[rel_path]
+            if fetched and os.path.exists(path):
+                self._track(rel_path, os.path.getsize(path))
+            else:
+                self.fetch_failures += 1
+        done.set()
+
+        if not fetched:
+            return self._fail(rel_path, owner)
+        self._evict()
+        return path
+
+    def unpin(self, rel_path, owner):
+        """Unpin one file pinned by an owner, e.g. once a job is done with it"""
+        with self._lock:
+            self._discard_pin(rel_path, owner)
+        self._evict()
+
+    def release(self, owner):
+        """Unpin everything pinned by an owner"""
+        with self._lock:
+            for rel_path in list(self._pins):
+                self._pins[rel_path].discard(owner)
+                if not self._pins[rel_path]:
+                    del self._pins[rel_path]
+        self._evict()
+
+    def forget(self, rel_path):
+        """Stop tracking a file or everything under a folder (already deleted)"""
+        prefix = rel_path.rstrip('/') + '/'
+        with self._lock:
+            for path in [p for p in self._entries if p == rel_path or p.startswith(prefix)]:
+                self._bytes -= self._entries.pop(path)
+
+    def remove(self, rel_path):
+        """Delete the local copy of a file, or of everything under a folder
+
+        Returns:
+            True if anything was on disk
+        """
+        self.forget(rel_path)
+        return remove_local(self.local_path(rel_path))
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'files': len(self._entries),
+                'bytes': self._bytes,
+                'maxBytes': self.max_bytes,
+                'pinned': len(self._pins),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hitRate': round(self.hits / lookups, 3) if lookups else None,
+                'evictions': self.evictions,
+                'fetchFailures': self.fetch_failures
+            }
+
+    def _fail(self, rel_path, owner):
+        if owner is not None:
+            with self._lock:
+                self._discard_pin(rel_path, owner)
+        return None
+
+    def _discard_pin(self, rel_path, owner):
+        """(caller holds the lock)"""
+        owners = self._pins.get(rel_path)
+        if owners:
+            owners.discard(owner)
+            if not owners:
+                del self._pins[rel_path]
+
+    def _track(self, rel_path, size):
+        """Record or refresh an entry as most recently used (caller holds the lock)"""
+        self._bytes -= self._entries.pop(rel_path, 0)
+        self._entries[rel_path] = size
+        self._bytes += size
+
+    def _evict(self):
+        """Delete least recently used, unpinned files until under budget"""
+        with self._lock:
+            if self._bytes <= self.max_bytes:
+                return
+            victims = []
+            for rel_path, size in self._entries.items():
+                if self._bytes <= self.max_bytes:
+                    break
+                if rel_path in self._pins or rel_path in self._inflight:
+                    continue
+                victims.append(rel_path)
+                self._bytes -= size
+            for rel_path in victims:
+                del self._entries[rel_path]
+                self.evictions += 1
+
+        for rel_path in victims:
+            try:
+                os.remove(self.local_path(rel_path))
+            except OSError:
+                pass
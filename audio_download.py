@@ -0,0 +1,143 @@
+"""
+Audio Download Module
+Fetches generated audio (kie.ai results) to disk without holding it in
+memory. The body is streamed to a .part file in chunks; a dropped connection
+resumes with a Range request where the host allows it, and the finished file
+is checked against the announced size and the clip's duration before it is
+renamed into place, so a result we paid for is never half-written or lost to
+one slow read.
+"""
+
+import os
+import json
+import time
+import subprocess
+import requests
+
+import metrics
+
+DOWNLOAD_CHUNK_SIZE = 256 * 1024
+
+# Attempts per file, including resumes after a dropped connection
+DOWNLOAD_ATTEMPTS = int(os.environ.get('DOWNLOAD_ATTEMPTS', 4))
+
+# Connect and per-read timeouts (seconds) - no limit on the whole transfer
+DOWNLOAD_TIMEOUT = (10, 60)
+
+# Decoded duration may be this much shorter than announced (seconds)
+DURATION_TOLERANCE = 2.0
+
+
+class DownloadError(Exception):
+    """The file could not be fetched or failed verification"""
+
+
+def probe_duration(path):
+    """Duration of an audio file in seconds from ffprobe
+
+    Returns:
+        Seconds, or None if ffprobe is not installed
+
+    Raises:
+        DownloadError if ffprobe cannot read the file
+    """
+    try:
+        probe = subprocess.run(
+            ['ffprobe', '-v', 'error', '-show_entries', 'format=duration', '-of', 'json', path],
+            capture_output=True, timeout=60
+        )
+    except FileNotFoundError:
+        return None
+    try:
+        return float(json.loads(probe.stdout)['format']['duration'])
+    except (ValueError, KeyError, TypeError):
+        raise DownloadError(f'Not a readable audio file: {probe.stderr.decode(errors="replace")[-200:]}')
+
+
+def _discard(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def _total_size(response, offset):
+    """Full file size from Content-Range or Content-Length, or None"""
+    content_range = response.headers.get('Content-Range', '')
+    if '/' in content_range and not content_range.endswith('/*'):
+        return int(content_range.rsplit('/', 1)[1])
+    length = response.headers.get('Content-Length')
+    return int(length) + offset if length else None
+
+
+def download_audio(url, local_path, expected_duration=None, on_progress=None):
+    """Stream a file to local_path, resuming and verifying it
+
+    Args:
+        expected_duration: Announced clip length in seconds, checked with ffprobe
+        on_progress: Optional callback(bytes_written, total_bytes_or_None)
+
+    Returns:
+        Size in bytes
+
+    Raises:
+        DownloadError if the file cannot be fetched completely or is damaged
+    """
+    os.makedirs(os.path.dirname(local_path), exist_ok=True)
+    part_path = f'{local_path}.part'
+    written = 0
+    total = None
+    last_error = None
+
+    with requests.Session() as session:
+        for attempt in range(DOWNLOAD_ATTEMPTS):
+            if attempt:
+                metrics.retry()
+                time.sleep(min(2 ** attempt, 10))
+            headers = {'Range': f'bytes={written}-'} if written else {}
+            try:
+                with session.get(url, headers=headers, stream=True, timeout=DOWNLOAD_TIMEOUT) as response:
+                    if response.status_code == 416 and total and written == total:
+                        break  # already complete
+                    if response.status_code not in (200, 206):
+                        if 400 <= response.status_code < 500 and response.status_code not in (408, 429):
+                            _discard(part_path)
+                            raise DownloadError(f'HTTP {response.status_code}')
+                        last_error = f'HTTP {response.status_code}'
+                        continue
+                    if response.status_code == 200:
+                        written = 0  # host ignored Range - start over
+                    total = _total_size(response, written) or total
+
+                    with open(part_path, 'ab' if written else 'wb') as f:
+                        for chunk in response.iter_content(DOWNLOAD_CHUNK_SIZE):
+                            f.write(chunk)
+                            written += len(chunk)
+                            metrics.add_bytes(len(chunk))
+                            if on_progress:
+                                on_progress(written, total)
+
+                if total is None or written >= total:
+                    break
+                last_error = f'connection closed at {written} of {total} bytes'
+            except requests.RequestException as e:
+                last_error = e
+            print(f'Download of {url} interrupted ({last_error}), resuming at {written} bytes')
+        else:
+            _discard(part_path)
+            raise DownloadError(f'Download failed after {DOWNLOAD_ATTEMPTS} attempts: {last_error}')
+
+    try:
+        if total is not None and written != total:
+            raise DownloadError(f'Size mismatch: got {written} of {total} bytes')
+        if not written:
+            raise DownloadError('Empty file')
+        duration = probe_duration(part_path)
+        if expected_duration and duration is not None and duration < expected_duration - DURATION_TOLERANCE:
+            raise DownloadError(f'Truncated audio: {duration:.1f}s of {expected_duration:.1f}s')
+    except DownloadError:
+        _discard(part_path)
+        raise
+
+    os.replace(part_path, local_path)
+    return written
@@ -0,0 +1,104 @@
+"""
+Audio Serving Module
+Validators, byte ranges and fronting-server offload for /serve-audio, shared
+by the Flask route (send_file) and the async handler in asgi.py so both give
+the same ETags and caching behaviour.
+"""
+
+import os
+import re
+import mimetypes
+from email.utils import formatdate, parsedate_to_datetime
+from urllib.parse import quote
+
+# Browser/CDN cache lifetime for audio responses (seconds)
+AUDIO_MAX_AGE = int(os.environ.get('AUDIO_MAX_AGE', 86400))
+
+# nginx internal location that maps to DOWNLOADS_DIR, e.g. /protected-audio/
+# When set, files of AUDIO_OFFLOAD_MIN_BYTES or more are sent by nginx via
+# X-Accel-Redirect instead of Python
+AUDIO_ACCEL_REDIRECT = os.environ.get('AUDIO_ACCEL_REDIRECT', '')
+AUDIO_OFFLOAD_MIN_BYTES = int(os.environ.get('AUDIO_OFFLOAD_MIN_BYTES', 1024 * 1024))
+
+# Apache/lighttpd style X-Sendfile (handled by Flask's send_file)
+USE_X_SENDFILE = os.environ.get('USE_X_SENDFILE', '').lower() in ('1', 'true', 'yes')
+
+CHUNK_SIZE = 256 * 1024
+
+# A single byte-range-spec: bytes=first-last, bytes=first- or bytes=-suffix
+RANGE_PATTERN = re.compile(r'^bytes=\s*(\d*)-(\d*)\s*$')
+
+mimetypes.add_type('audio/mpeg', '.mp3')
+
+
+def file_etag(stat):
+    """Strong validator from modification time and size (unquoted)"""
+    return f'{stat.st_mtime_ns:x}-{stat.st_size:x}'
+
+
+def content_type(path):
+    return mimetypes.guess_type(path)[0] or 'application/octet-stream'
+
+
+def cache_headers(stat):
+    """Validator and caching headers for a file"""
+    return {
+        'ETag': f'"{file_etag(stat)}"',
+        'Last-Modified': formatdate(stat.st_mtime, usegmt=True),
+        'Cache-Control': f'public, max-age={AUDIO_MAX_AGE}',
+        'Accept-Ranges': 'bytes'
+    }
+
+
+def not_modified(stat, if_none_match=None, if_modified_since=None):
+    """True if the client's cached copy is current (answer 304)"""
+    if if_none_match:
+        etag = file_etag(stat)
+        tags = [tag.strip().removeprefix('W/').strip('"') for tag in if_none_match.split(',')]
+        return etag in tags or '*' in tags
+    if if_modified_since:
+        try:
+            return int(stat.st_mtime) <= parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+def parse_range(header, size, if_range=None, stat=None):
+    """Byte range requested by a Range header
+
+    Only single ranges are honoured; anything else, including a header that
+    doesn't parse, is ignored and the file is served in full (RFC 9110).
+
+    Returns:
+        (start, end) inclusive, or None for the whole file
+
+    Raises:
+        ValueError if the range cannot be satisfied (answer 416)
+    """
+    match = RANGE_PATTERN.match(header or '')
+    if not match or not (match.group(1) or match.group(2)):
+        return None
+    if match.group(1) and match.group(2) and int(match.group(2)) < int(match.group(1)):
+        return None  # last before first - not a valid range
+    if if_range and stat is not None and if_range.strip('"') != file_etag(stat):
+        return None  # file changed since the client's partial copy
+
+    first, last = match.groups()
+    if not first:
+        length = int(last)
+        if length <= 0 or size == 0:
+            raise ValueError(f'Range not satisfiable: {header}')
+        return max(0, size - length), size - 1
+
+    start = int(first)
+    if start >= size:
+        raise ValueError(f'Range not satisfiable: {header}')
+    return start, min(int(last), size - 1) if last else size - 1
+
+
+def accel_redirect(rel_path, size):
+    """X-Accel-Redirect target for a file nginx should send, or None"""
+    if not AUDIO_ACCEL_REDIRECT or size < AUDIO_OFFLOAD_MIN_BYTES:
+        return None
+    return AUDIO_ACCEL_REDIRECT.rstrip('/') + '/' + quote(rel_path)
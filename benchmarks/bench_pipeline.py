@@ -0,0 +1,464 @@
+#!/usr/bin/env python3
+"""
+Pipeline Benchmark
+Runs download -> isolate -> upload -> list -> cover end to end against local
+stand-ins, so throughput can be compared across releases without touching
+YouTube, GitHub or kie.ai:
+    GitHub  - contents, trees and raw file API kept in memory
+    kie.ai  - upload-cover and record-info; tasks finish after --kie-seconds,
+              call back to the server and serve generated audio
+    yt-dlp  - script on PATH that "downloads" a synthetic beat per video
+    audio-separator - script on PATH that writes the four stems
+The server runs in this process on a real port. Prints per-stage latency,
+throughput and peak RSS as JSON.
+
+Usage:
+    python benchmarks/bench_pipeline.py [--videos 8] [--seconds 30] [--output results.json]
+"""
+
+import os
+import sys
+import json
+import time
+import wave
+import base64
+import socket
+import contextlib
+import hashlib
+import shutil
+import argparse
+import resource
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs, unquote
+
+import numpy as np
+import requests
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+CHANNEL = 'BenchChannel'
+GITHUB_REPO = 'bench/library'
+SAMPLE_RATE = 44100
+
+
+def write_fixture(path, seconds):
+    """Synthetic stereo beat: a kick on every beat at 120 BPM over a two-note pad"""
+    t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    pad = 0.2 * np.sin(2 * np.pi * 220 * t) + 0.15 * np.sin(2 * np.pi * 277.2 * t)
+    beat_phase = t % 0.5
+    kick = 0.6 * np.sin(2 * np.pi * 60 * beat_phase) * np.exp(-beat_phase * 30)
+    rng = np.random.default_rng(0)
+    left = pad + kick + 0.02 * rng.standard_normal(len(t))
+    samples = np.stack([left, np.roll(left, 441)], axis=1)
+    with wave.open(path, 'wb') as f:
+        f.setnchannels(2)
+        f.setsampwidth(2)
+        f.setframerate(SAMPLE_RATE)
+        f.writeframes((np.clip(samples, -1, 1) * 32767).astype('<i2').tobytes())
+
+
+def write_tools(bin_dir):
+    """Stand-in yt-dlp and audio-separator executables"""
+    ytdlp = f'''#!{sys.executable}
+import os, sys, time, shutil
+args = sys.argv[1:]
+if '--version' in args:
+    print('bench')
+    sys.exit(0)
+template = args[args.index('-o') + 1]
+for i in range(int(os.environ['BENCH_VIDEOS'])):
+    path = template.replace('%(title)s', f'Bench Beat {{i + 1:03d}}').replace('%(ext)s', 'mp3')
+    print(f'[download] Destination: {{path}}', flush=True)
+    for percent in (25, 50, 75, 100):
+        time.sleep(float(os.environ.get('BENCH_DOWNLOAD_DELAY', 0)) / 4)
+        print(f'[download] {{percent:5.1f}}% of 1.00MiB', flush=True)
+    shutil.copyfile(os.environ['BENCH_FIXTURE'], path)
+'''
+    separator = f'''#!{sys.executable}
+import os, sys, time, shutil
+args = sys.argv[1:]
+source = args[0]
+output_dir = args[args.index('--output_dir') + 1]
+time.sleep(float(os.environ.get('BENCH_SEPARATE_DELAY', 0)))
+base = os.path.splitext(os.path.basename(source))[0]
+for stem in ('Vocals', 'Drums', 'Bass', 'Other'):
+    shutil.copyfile(source, os.path.join(output_dir, f'{{base}}_({{stem}})_htdemucs.mp3'))
+'''
+    for name, script in (('yt-dlp', ytdlp), ('audio-separator', separator)):
+        path = os.path.join(bin_dir, name)
+        with open(path, 'w') as f:
+            f.write(script)
+        os.chmod(path, 0o755)
+
+
+class StandIn(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, handler, latency=0.0):
+        super().__init__(('127.0.0.1', 0), handler)
+        self.latency = latency
+        self.lock = threading.Lock()
+        self.requests = {}
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+    @property
+    def base_url(self):
+        return f'http://127.0.0.1:{self.server_address[1]}'
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def read_body(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        with self.server.lock:
+            self.server.bytes_in += len(body)
+        return body
+
+    def send(self, status, body=b'', content_type='application/json'):
+        if not isinstance(body, bytes):
+            body = json.dumps(body).encode()
+        time.sleep(self.server.latency)
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        with self.server.lock:
+            self.server.bytes_out += len(body)
+            key = f'{self.command} {self.route}'
+            self.server.requests[key] = self.server.requests.get(key, 0) + 1
+
+
+class GitHubHandler(StandInHandler):
+    """Contents, trees and raw API for one in-memory repo under /api/repos and /raw"""
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        path = unquote(url.path)
+        repo = f'/api/repos/{GITHUB_REPO}'
+        files = self.server.files
+        if path.startswith(f'/raw/{GITHUB_REPO}/'):
+            self.route = 'raw'
+            name = path.split('/', 5)[5]
+            return self.send(200, files[name], 'application/octet-stream') if name in files else self.send(404)
+        if path == repo:
+            self.route = 'repo'
+            return self.send(200, {'size': sum(len(v) for v in files.values()) // 1024})
+        if path.startswith(f'{repo}/git/trees/'):
+            self.route = 'trees'
+            return self.send(200, {'truncated': False, 'tree': [
+                {'path': name, 'type': 'blob', 'size': len(data)} for name, data in sorted(files.items())]})
+        if not path.startswith(f'{repo}/contents/'):
+            self.route = 'other'
+            return self.send(404)
+
+        self.route = 'contents'
+        name = path[len(f'{repo}/contents/'):].strip('/')
+        if name in files:
+            if 'raw' in self.headers.get('Accept', ''):
+                return self.send(200, files[name], 'application/octet-stream')
+            return self.send(200, self.entry(name))
+        children = {}
+        for other in files:
+            if other.startswith(name + '/'):
+                child = other[len(name) + 1:].split('/', 1)[0]
+                children[child] = f'{name}/{child}'
+        if not children:
+            return self.send(404, {'message': 'Not Found'})
+        return self.send(200, [self.entry(full) if full in files else
+                               {'type': 'dir', 'name': child, 'path': full, 'size': 0}
+                               for child, full in sorted(children.items())])
+
+    def do_PUT(self):
+        self.route = 'contents'
+        name = unquote(urlsplit(self.path).path).split('/contents/', 1)[1]
+        data = json.loads(self.read_body())
+        with self.server.lock:
+            conflict = name in self.server.files and data.get('sha') != self.sha(name)
+            if not conflict:
+                self.server.files[name] = base64.b64decode(data['content'])
+        if conflict:
+            return self.send(409, {'message': 'sha mismatch'})
+        self.send(201, {'content': self.entry(name)})
+
+    def do_DELETE(self):
+        self.route = 'contents'
+        name = unquote(urlsplit(self.path).path).split('/contents/', 1)[1]
+        self.read_body()
+        with self.server.lock:
+            found = self.server.files.pop(name, None) is not None
+        self.send(200 if found else 404, {})
+
+    def sha(self, name):
+        data = self.server.files[name]
+        return hashlib.sha1(b'blob %d\0' % len(data) + data).hexdigest()
+
+    def entry(self, name):
+        return {'type': 'file', 'name': name.rsplit('/', 1)[-1], 'path': name, 'sha': self.sha(name),
+                'size': len(self.server.files[name]),
+                'download_url': f'{self.server.base_url}/raw/{GITHUB_REPO}/main/{name}'}
+
+
+class KieHandler(StandInHandler):
+    """upload-cover, record-info and generated audio; tasks succeed after kie_seconds"""
+
+    def do_POST(self):
+        self.route = 'upload-cover'
+        request = json.loads(self.read_body())
+        with self.server.lock:
+            task_id = f'bench{len(self.server.tasks) + 1:05d}'
+            self.server.tasks[task_id] = {'status': 'PENDING', 'callback': request.get('callBackUrl')}
+        threading.Timer(self.server.kie_seconds, self.server.finish, [task_id]).start()
+        self.send(200, {'code': 200, 'msg': 'success', 'data': {'taskId': task_id}})
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        if url.path.startswith('/audio/'):
+            self.route = 'audio'
+            return self.send(200, self.server.clip_audio, 'audio/mpeg')
+        self.route = 'record-info'
+        task_id = parse_qs(url.query).get('taskId', [''])[0]
+        task = self.server.tasks.get(task_id)
+        if not task:
+            return self.send(200, {'code': 404, 'msg': 'Task not found'})
+        self.send(200, {'code': 200, 'data': self.server.record(task_id)})
+
+
+class KieStandIn(StandIn):
+    def __init__(self, kie_seconds, clip_audio, clip_seconds, callbacks=True, latency=0.0):
+        super().__init__(KieHandler, latency)
+        self.kie_seconds = kie_seconds
+        self.clip_audio = clip_audio
+        self.clip_seconds = clip_seconds
+        self.callbacks = callbacks
+        self.tasks = {}
+
+    def clips(self, task_id):
+        return [{'id': f'{task_id}-{n}', 'audioUrl': f'{self.base_url}/audio/{task_id}-{n}.mp3',
+                 'duration': self.clip_seconds} for n in (1, 2)]
+
+    def record(self, task_id):
+        task = self.tasks[task_id]
+        return {'taskId': task_id, 'status': task['status'],
+                'response': {'sunoData': self.clips(task_id) if task['status'] == 'SUCCESS' else []}}
+
+    def finish(self, task_id):
+        task = self.tasks[task_id]
+        task['status'] = 'SUCCESS'
+        if self.callbacks and task['callback']:
+            clips = [{'id': c['id'], 'audio_url': c['audioUrl'], 'duration': c['duration']}
+                     for c in self.clips(task_id)]
+            try:
+                requests.post(task['callback'], timeout=10, json={
+                    'code': 200, 'msg': 'All generated successfully.',
+                    'data': {'callbackType': 'complete', 'task_id': task_id, 'data': clips}})
+            except requests.RequestException as e:
+                print(f'Stand-in callback failed: {e}', file=sys.stderr)
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process and of its finished children (MB)"""
+    scale = 1024 * 1024 if sys.platform == 'darwin' else 1024
+    return {'self': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale, 1),
+            'children': round(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / scale, 1)}
+
+
+def latency_stats(samples):
+    if not samples:
+        return {}
+    ordered = sorted(samples)
+    pick = lambda q: ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+    return {'count': len(ordered), 'mean': round(sum(ordered) / len(ordered), 4),
+            'p50': round(pick(0.5), 4), 'p95': round(pick(0.95), 4), 'max': round(ordered[-1], 4)}
+
+
+def wait_job(base_url, response, timeout):
+    """Block until a submitted job finishes; returns its status summary"""
+    job_id = response.json()['jobId']
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = requests.get(f'{base_url}/jobs/{job_id}').json()
+        if job['finished']:
+            return job
+        time.sleep(0.05)
+    raise TimeoutError(f'Job {job_id} did not finish in {timeout}s')
+
+
+def stage(name, items, started, extra=None):
+    wall = time.perf_counter() - started
+    result = {'stage': name, 'items': items, 'wall_seconds': round(wall, 3),
+              'items_per_sec': round(items / wall, 2) if wall else None, 'peak_rss_mb': peak_rss_mb()}
+    result.update(extra or {})
+    return result
+
+
+def run(args):
+    work_dir = tempfile.mkdtemp(prefix='bench-pipeline-')
+    bin_dir = os.path.join(work_dir, 'bin')
+    os.makedirs(bin_dir)
+    write_tools(bin_dir)
+    fixture = os.path.join(work_dir, 'fixture.mp3')  # WAV data - every tool here reads it by content
+    write_fixture(fixture, args.seconds)
+    with open(fixture, 'rb') as f:
+        clip_audio = f.read()
+
+    github = StandIn(GitHubHandler, args.latency)
+    github.files = {}
+    github.start()
+    kie = KieStandIn(args.kie_seconds, clip_audio, args.seconds, not args.no_callbacks, args.latency).start()
+
+    port = free_port()
+    base_url = f'http://127.0.0.1:{port}'
+    os.environ.update({
+        'PATH': bin_dir + os.pathsep + os.environ.get('PATH', ''),
+        'BENCH_VIDEOS': str(args.videos),
+        'BENCH_FIXTURE': fixture,
+        'BENCH_DOWNLOAD_DELAY': str(args.download_delay),
+        'BENCH_SEPARATE_DELAY': str(args.separate_delay),
+        'DOWNLOADS_DIR': os.path.join(work_dir, 'downloads'),
+        'LIBRARY_INDEX_PATH': os.path.join(work_dir, 'library.sqlite3'),
+        'JOB_STORE_PATH': os.path.join(work_dir, 'jobs.sqlite3'),
+        'SIMILARITY_DIR': os.path.join(work_dir, 'similarity'),
+        'GITHUB_TOKEN': 'bench',
+        'GITHUB_REPO': GITHUB_REPO,
+        'GITHUB_API_BASE': f'{github.base_url}/api/repos',
+        'GITHUB_RAW_BASE': f'{github.base_url}/raw',
+        'KIE_API_KEY': 'bench',
+        'KIE_API_BASE': f'{kie.base_url}/api/v1',
+        'KIE_POLL_FIRST_SECONDS': '1',
+        'KIE_POLL_MIN_SECONDS': '1',
+        'PUBLIC_BASE_URL': base_url,
+    })
+
+    import github_storage
+    import server
+    from werkzeug.serving import make_server, WSGIRequestHandler
+
+    class QuietHandler(WSGIRequestHandler):
+        def log_request(self, *args):
+            pass
+
+    # Time every upload the pipeline makes
+    uploads = []
+    upload_to_github = github_storage.upload_to_github
+
+    def timed_upload(file_path, repo_path):
+        started = time.perf_counter()
+        url = upload_to_github(file_path, repo_path)
+        uploads.append((time.perf_counter() - started, os.path.getsize(file_path) if url else 0))
+        return url
+
+    github_storage.upload_to_github = timed_upload
+
+    http = make_server('127.0.0.1', port, server.app, threaded=True, request_handler=QuietHandler)
+    threading.Thread(target=http.serve_forever, daemon=True).start()
+
+    results = []
+
+    started = time.perf_counter()
+    job = wait_job(base_url, requests.post(f'{base_url}/download', json={
+        'url': f'https://www.youtube.com/@{CHANNEL}/videos', 'mode': 'channel'}), args.timeout)
+    results.append(stage('download', args.videos, started, {'status': job['status'],
+                                                            'bytes': args.videos * len(clip_audio)}))
+    download_uploads = len(uploads)
+
+    started = time.perf_counter()
+    job = wait_job(base_url, requests.post(f'{base_url}/isolate', json={'folder': CHANNEL}), args.timeout)
+    results.append(stage('isolate', args.videos, started, {'status': job['status']}))
+
+    upload_seconds = sum(seconds for seconds, _ in uploads)
+    upload_bytes = sum(size for _, size in uploads)
+    results.append({'stage': 'upload', 'items': len(uploads), 'during_download': download_uploads,
+                    'bytes': upload_bytes, 'seconds': round(upload_seconds, 3),
+                    'mb_per_sec': round(upload_bytes / upload_seconds / 1e6, 2) if upload_seconds else None,
+                    'latency': latency_stats([seconds for seconds, _ in uploads]),
+                    'peak_rss_mb': peak_rss_mb()})
+
+    started = time.perf_counter()
+    beat_names = [b['name'] for b in requests.get(f'{base_url}/beats/{CHANNEL}').json()['items']]
+    listing = {'/downloads': [], f'/beats/{CHANNEL}': [], '/stems': []}
+    for i in range(args.list_requests):
+        for endpoint in ('/downloads', f'/beats/{CHANNEL}'):
+            t = time.perf_counter()
+            requests.get(f'{base_url}{endpoint}').raise_for_status()
+            listing[endpoint].append(time.perf_counter() - t)
+        t = time.perf_counter()
+        requests.get(f'{base_url}/stems/{CHANNEL}/{beat_names[i % len(beat_names)]}').raise_for_status()
+        listing['/stems'].append(time.perf_counter() - t)
+    t = time.perf_counter()
+    requests.post(f'{base_url}/library/rebuild').raise_for_status()
+    rebuild_seconds = time.perf_counter() - t
+    results.append(stage('list', 3 * args.list_requests, started, {
+        'latency': {endpoint: latency_stats(samples) for endpoint, samples in listing.items()},
+        'rebuild_seconds': round(rebuild_seconds, 3)}))
+
+    # fresh: the synthetic beats are identical, so memoized covers would hide the work
+    started = time.perf_counter()
+    job = wait_job(base_url, requests.post(f'{base_url}/cover/batch', json={
+        'channel': CHANNEL, 'stems': ['Drums'], 'genres': ['bench'], 'fresh': True}), args.timeout)
+    covers = [j for j in requests.get(f'{base_url}/jobs').json() if j['kind'] == 'cover' and j['finished']]
+    results.append(stage('cover', len(covers), started, {
+        'status': job['status'], 'failed': sum(j['status'] != 'complete' for j in covers),
+        'latency': latency_stats([j['finished'] - j['created'] for j in covers]),
+        'kie_tracker': server.kie_tracker.stats()}))
+
+    report = {
+        'benchmark': 'pipeline',
+        'config': vars(args),
+        'stages': results,
+        'stand_ins': {'github': dict(sorted(github.requests.items())), 'kie': dict(sorted(kie.requests.items())),
+                      'github_files': len(github.files)},
+        'work_dir': work_dir if args.keep else None
+    }
+
+    http.shutdown()
+    if not args.keep:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--videos', type=int, default=8, help='Beats the fake channel has')
+    parser.add_argument('--seconds', type=float, default=30, help='Length of each synthetic beat')
+    parser.add_argument('--download-delay', type=float, default=0, help='Seconds yt-dlp spends per video')
+    parser.add_argument('--separate-delay', type=float, default=0, help='Seconds audio-separator spends per beat')
+    parser.add_argument('--kie-seconds', type=float, default=2, help='Seconds until a kie.ai task succeeds')
+    parser.add_argument('--no-callbacks', action='store_true', help='Make covers rely on record-info polling')
+    parser.add_argument('--latency', type=float, default=0, help='Added latency per stand-in response (seconds)')
+    parser.add_argument('--list-requests', type=int, default=50, help='Requests per listing endpoint')
+    parser.add_argument('--timeout', type=float, default=600, help='Limit per stage (seconds)')
+    parser.add_argument('--output', help='Also write the JSON results to this file')
+    parser.add_argument('--keep', action='store_true', help='Keep the temporary library for inspection')
+    args = parser.parse_args()
+
+    # Server logging goes to stderr so stdout is only the JSON report
+    with contextlib.redirect_stdout(sys.stderr):
+        report = run(args)
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Progress Bus Benchmark
+Simulates yt-dlp progress output feeding one job while 50 watchers follow its
+SSE stream, with and without coalescing, and prints the results as JSON.
+
+Usage:
+    python benchmarks/bench_progress_bus.py [--watchers 50] [--lines 20000]
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import jobs
+import progress_bus
+
+
+def run(interval, watchers, lines, items, status_every):
+    job = jobs.Job('download', ('bench',), {})
+    job.bus.interval = interval
+
+    stats = {'frames': 0, 'bytes': 0}
+    stats_lock = threading.Lock()
+
+    def watch():
+        frames = 0
+        size = 0
+        for frame in job.stream(keepalive=0.5):
+            if frame.startswith('id:'):
+                frames += 1
+                size += len(frame)
+        with stats_lock:
+            stats['frames'] += frames
+            stats['bytes'] += size
+
+    threads = [threading.Thread(target=watch) for _ in range(watchers)]
+    for thread in threads:
+        thread.start()
+
+    cpu_start = time.process_time()
+    start = time.perf_counter()
+    for i in range(lines):
+        item = f'Beat {i % items}'
+        job.put({'progress': (i * 0.1) % 100, 'item': item})
+        if i % status_every == 0:
+            job.put({'status': f'Status {i}'})
+    job.put({'complete': True, 'message': 'done'})
+    produce_seconds = time.perf_counter() - start
+
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - start
+    cpu = time.process_time() - cpu_start
+
+    statuses = sum(1 for msg in job.events if 'status' in msg)
+    return {
+        'interval': interval,
+        'watchers': watchers,
+        'published': job.bus.published,
+        'stored_events': len(job.events),
+        'status_events_kept': statuses,
+        'published_per_sec': round(job.bus.published / produce_seconds),
+        'frames_sent': stats['frames'],
+        'bytes_sent': stats['bytes'],
+        'wall_seconds': round(wall, 3),
+        'cpu_seconds': round(cpu, 3),
+        'cpu_percent': round(100 * cpu / wall, 1)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--watchers', type=int, default=50)
+    parser.add_argument('--lines', type=int, default=20000)
+    parser.add_argument('--items', type=int, default=4)
+    parser.add_argument('--status-every', type=int, default=500)
+    args = parser.parse_args()
+
+    results = [
+        run(0, args.watchers, args.lines, args.items, args.status_every),
+        run(progress_bus.PROGRESS_INTERVAL, args.watchers, args.lines, args.items, args.status_every),
+    ]
+    print(json.dumps({'benchmark': 'progress_bus', 'results': results}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
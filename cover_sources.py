@@ -0,0 +1,193 @@
+"""
+Cover Sources Module
+Builds the audio sent to kie.ai as a cover's source. A single selected stem
+is sent as it is; several stems are mixed down server-side: each is decoded
+once to float PCM with ffmpeg and added into a single mix buffer, which is
+brought to a target loudness, peak-limited with a smooth gain envelope, then
+encoded once. Mixes are stored
+next to the stems, named by stem set and content:
+    channel/beat/cover_sources/mix_Bass+Drums+Other_<digest>.mp3
+
+On request a source is also reduced for upload: a fixed-length excerpt,
+mono, at a lower sample rate and bitrate, well inside kie.ai's and GitHub's
+size limits. It is cached beside the mixes:
+    channel/beat/cover_sources/Drums_Beat Name_short_<digest>.mp3
+"""
+
+import os
+import hashlib
+import subprocess
+
+SAMPLE_RATE = 44100
+CHANNELS = 2
+
+# Loudness the summed stems are brought to, and the peak ceiling (dBFS)
+MIX_TARGET_RMS_DB = float(os.environ.get('MIX_TARGET_RMS_DB', -14))
+MIX_CEILING_DB = float(os.environ.get('MIX_CEILING_DB', -1))
+MIX_BITRATE = os.environ.get('MIX_BITRATE', '192k')
+
+# Bumped when the mixing recipe changes, so old mixes are not reused
+MIX_VERSION = 2
+
+# Limiter gain envelope: block length (look-ahead) and release time (seconds)
+LIMIT_BLOCK_SECONDS = 0.005
+LIMIT_RELEASE_SECONDS = 0.1
+
+# Reduced sources: excerpt length (seconds, with a fade-out), format and bitrate
+COVER_SOURCE_SECONDS = int(os.environ.get('COVER_SOURCE_SECONDS', 120))
+COVER_SOURCE_FADE_SECONDS = 2
+COVER_SOURCE_SAMPLE_RATE = int(os.environ.get('COVER_SOURCE_SAMPLE_RATE', 32000))
+COVER_SOURCE_CHANNELS = 1
+COVER_SOURCE_BITRATE = os.environ.get('COVER_SOURCE_BITRATE', '96k')
+
+# Send reduced sources when a request does not say
+COVER_SOURCE_REDUCE = os.environ.get('COVER_SOURCE_REDUCE', '').lower() in ('1', 'true', 'yes')
+
+REDUCED_VERSION = 1
+
+
+def mix_digest(stem_digests):
+    """Content key of a mix - known before the mix is built"""
+    parts = [f'mix-v{MIX_VERSION}', MIX_TARGET_RMS_DB, MIX_CEILING_DB, MIX_BITRATE] + sorted(stem_digests)
+    return hashlib.sha256('\x1f'.join(str(p) for p in parts).encode()).hexdigest()
+
+
+def mix_name(stem_types, digest):
+    """Filename of a mix, e.g. mix_Bass+Drums_0123456789ab.mp3"""
+    return f"mix_{'+'.join(sorted(stem_types))}_{digest[:12]}.mp3"
+
+
+def reduced_digest(source_digest):
+    """Content key of the reduced version of a source"""
+    parts = [f'reduced-v{REDUCED_VERSION}', COVER_SOURCE_SECONDS, COVER_SOURCE_SAMPLE_RATE,
+             COVER_SOURCE_CHANNELS, COVER_SOURCE_BITRATE, source_digest]
+    return hashlib.sha256('\x1f'.join(str(p) for p in parts).encode()).hexdigest()
+
+
+def reduced_name(source_name, digest):
+    """Filename of a reduced source, e.g. Drums_Beat_short_0123456789ab.mp3"""
+    return f'{os.path.splitext(source_name)[0]}_short_{digest[:12]}.mp3'
+
+
+def decode(path):
+    """Audio file as float32 samples, shape (frames, CHANNELS)
+
+    Raises:
+        RuntimeError if ffmpeg cannot decode the file
+    """
+    import numpy as np
+
+    decoded = subprocess.run(
+        ['ffmpeg', '-v', 'error', '-i', path, '-ac', str(CHANNELS), '-ar', str(SAMPLE_RATE), '-f', 'f32le', '-'],
+        capture_output=True, timeout=300
+    )
+    if decoded.returncode != 0 or not decoded.stdout:
+        raise RuntimeError(f'ffmpeg decode failed: {decoded.stderr.decode(errors="replace")[-200:]}')
+    return np.frombuffer(decoded.stdout, dtype=np.float32).reshape(-1, CHANNELS)
+
+
+def limit(samples, ceiling):
+    """Look-ahead peak limiter: keeps peaks at or below ceiling with a smooth gain
+
+    The gain needed by each LIMIT_BLOCK_SECONDS block is applied from the
+    block before it (look-ahead), recovers over LIMIT_RELEASE_SECONDS and is
+    interpolated between blocks, so transients are turned down rather than
+    reshaped. Audio that never reaches the ceiling is left untouched.
+    """
+    import numpy as np
+
+    peaks = np.maximum(samples.max(axis=1), -samples.min(axis=1))
+    if not len(peaks) or peaks.max() <= ceiling:
+        return samples
+
+    block = max(1, int(SAMPLE_RATE * LIMIT_BLOCK_SECONDS))
+    blocks = -(-len(peaks) // block)
+    padded = np.zeros(blocks * block, dtype=np.float32)
+    padded[:len(peaks)] = peaks
+    needed = np.minimum(1.0, ceiling / np.maximum(padded.reshape(blocks, block).max(axis=1), 1e-9))
+    # Each block boundary is at most the gain of the blocks on either side
+    target = needed.copy()
+    target[1:] = np.minimum(target[1:], needed[:-1])
+    target[:-1] = np.minimum(target[:-1], needed[1:])
+
+    release = 1 - np.exp(-LIMIT_BLOCK_SECONDS / LIMIT_RELEASE_SECONDS)
+    gain = np.empty(blocks + 1, dtype=np.float32)
+    current = 1.0
+    for i, wanted in enumerate(target):
+        current = wanted if wanted < current else current + (wanted - current) * release
+        gain[i] = current
+    gain[blocks] = current
+
+    ramp = np.arange(block, dtype=np.float32) / block
+    envelope = (gain[:-1, None] + (gain[1:] - gain[:-1])[:, None] * ramp).ravel()[:len(peaks)]
+    samples *= envelope[:, None]
+    return np.clip(samples, -ceiling, ceiling, out=samples)
+
+
+def mix(tracks):
+    """Sum tracks of any lengths and normalize the result
+
+    Tracks are added into one buffer as they arrive, so a generator keeps
+    only the mix and one decoded track in memory.
+
+    Args:
+        tracks: Iterable of (frames, CHANNELS) float32 arrays
+
+    Returns:
+        (frames, CHANNELS) float32 mix, as long as the longest track
+    """
+    import numpy as np
+
+    mixed = np.zeros((0, CHANNELS), dtype=np.float32)
+    for track in tracks:
+        if len(track) > len(mixed):
+            grown = np.zeros((len(track), CHANNELS), dtype=np.float32)
+            grown[:len(mixed)] = mixed
+            mixed = grown
+        mixed[:len(track)] += track
+
+    rms = float(np.sqrt(np.einsum('ij,ij->', mixed, mixed, dtype=np.float64) / max(mixed.size, 1)))
+    if rms > 0:
+        mixed *= 10 ** (MIX_TARGET_RMS_DB / 20) / rms
+    return limit(mixed, 10 ** (MIX_CEILING_DB / 20))
+
+
+def mixdown(stem_paths, output_path):
+    """Mix stems into one MP3 at output_path
+
+    Raises:
+        RuntimeError if a stem cannot be decoded or the mix cannot be encoded
+    """
+    mixed = mix(decode(path) for path in stem_paths)
+
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    part_path = f'{output_path}.part'
+    encoded = subprocess.run(
+        ['ffmpeg', '-v', 'error', '-y', '-f', 'f32le', '-ar', str(SAMPLE_RATE), '-ac', str(CHANNELS), '-i', '-',
+         '-b:a', MIX_BITRATE, '-f', 'mp3', part_path],
+        input=mixed.tobytes(), capture_output=True, timeout=300
+    )
+    if encoded.returncode != 0:
+        raise RuntimeError(f'ffmpeg encode failed: {encoded.stderr.decode(errors="replace")[-200:]}')
+    os.replace(part_path, output_path)
+
+
+def reduce(input_path, output_path):
+    """Write the upload-sized excerpt of input_path to output_path
+
+    Raises:
+        RuntimeError if ffmpeg cannot transcode the file
+    """
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    part_path = f'{output_path}.part'
+    fade_start = max(0, COVER_SOURCE_SECONDS - COVER_SOURCE_FADE_SECONDS)
+    encoded = subprocess.run(
+        ['ffmpeg', '-v', 'error', '-y', '-i', input_path, '-vn', '-t', str(COVER_SOURCE_SECONDS),
+         '-af', f'afade=t=out:st={fade_start}:d={COVER_SOURCE_FADE_SECONDS}',
+         '-ac', str(COVER_SOURCE_CHANNELS), '-ar', str(COVER_SOURCE_SAMPLE_RATE),
+         '-b:a', COVER_SOURCE_BITRATE, '-f', 'mp3', part_path],
+        capture_output=True, timeout=300
+    )
+    if encoded.returncode != 0:
+        raise RuntimeError(f'ffmpeg reduce failed: {encoded.stderr.decode(errors="replace")[-200:]}')
+    os.replace(part_path, output_path)
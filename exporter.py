@@ -0,0 +1,145 @@
+"""
+Exporter Module
+Streams zip or tar archives of library files while they are being built.
+The archive is written by a producer thread into a small bounded queue that
+the HTTP response drains, so memory stays at a few chunks whatever the pack
+size and nothing is staged on disk. MP3s are stored uncompressed.
+"""
+
+import io
+import queue
+import tarfile
+import threading
+import time
+import zipfile
+
+# Bytes copied per read from a member's source
+EXPORT_CHUNK_SIZE = 256 * 1024
+
+# Chunks buffered between the archive writer and the response
+EXPORT_QUEUE_CHUNKS = 16
+
+FORMATS = {'zip': 'application/zip', 'tar': 'application/x-tar'}
+
+# Already-compressed formats gain nothing from deflate
+STORED_EXTENSIONS = ('.mp3', '.mp4')
+
+
+class ExportCancelled(Exception):
+    """The client went away - stop writing the archive"""
+
+
+class _QueueWriter(io.RawIOBase):
+    """Unseekable file object that hands everything written to a bounded queue"""
+
+    def __init__(self, chunks, cancelled):
+        self._chunks = chunks
+        self._cancelled = cancelled
+        self._buffer = bytearray()
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def tell(self):
+        return self._position
+
+    def write(self, data):
+        self._buffer += data
+        self._position += len(data)
+        if len(self._buffer) >= EXPORT_CHUNK_SIZE:
+            self.flush()
+        return len(data)
+
+    def flush(self):
+        if self._buffer:
+            self._put(bytes(self._buffer))
+            self._buffer.clear()
+
+    def _put(self, item):
+        while True:
+            if self._cancelled.is_set():
+                raise ExportCancelled()
+            try:
+                self._chunks.put(item, timeout=1)
+                return
+            except queue.Full:
+                continue
+
+
+def _write_zip(sink, members, open_member):
+    with zipfile.ZipFile(sink, 'w', allowZip64=True) as archive:
+        for member in members:
+            info = zipfile.ZipInfo(member['name'], time.localtime(member['mtime'])[:6])
+            info.file_size = member['size']
+            info.compress_type = (zipfile.ZIP_STORED if member['name'].lower().endswith(STORED_EXTENSIONS)
+                                  else zipfile.ZIP_DEFLATED)
+            source = open_member(member)
+            if source is None:
+                continue
+            try:
+                with archive.open(info, 'w') as target:
+                    while True:
+                        chunk = source.read(EXPORT_CHUNK_SIZE)
+                        if not chunk:
+                            break
+                        target.write(chunk)
+            finally:
+                source.close()
+
+
+def _write_tar(sink, members, open_member):
+    with tarfile.open(fileobj=sink, mode='w|', bufsize=EXPORT_CHUNK_SIZE) as archive:
+        for member in members:
+            info = tarfile.TarInfo(member['name'])
+            info.size = member['size']
+            info.mtime = int(member['mtime'])
+            source = open_member(member)
+            if source is None:
+                continue
+            try:
+                archive.addfile(info, source)
+            finally:
+                source.close()
+
+
+def stream_archive(members, fmt, open_member):
+    """Yield the bytes of an archive as it is built
+
+    Args:
+        members: [{'name': archive path, 'size': bytes, 'mtime': timestamp}]
+        fmt: 'zip' or 'tar'
+        open_member: Callable(member) -> file object with read(n) and close(),
+            or None to leave the member out (sizes must match what it returns -
+            tar headers are written first)
+    """
+    chunks = queue.Queue(maxsize=EXPORT_QUEUE_CHUNKS)
+    cancelled = threading.Event()
+    done = object()
+    writer = _write_zip if fmt == 'zip' else _write_tar
+
+    def produce():
+        sink = _QueueWriter(chunks, cancelled)
+        try:
+            writer(sink, members, open_member)
+            sink.flush()
+        except ExportCancelled:
+            return
+        except Exception as e:
+            # Headers are already sent - all we can do is end the archive early
+            print(f'Export error: {e}')
+        try:
+            sink._put(done)
+        except ExportCancelled:
+            pass
+
+    thread = threading.Thread(target=produce, name='export-writer', daemon=True)
+    thread.start()
+    try:
+        while True:
+            chunk = chunks.get()
+            if chunk is done:
+                return
+            yield chunk
+    finally:
+        cancelled.set()
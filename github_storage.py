@@ -9,15 +9,22 @@ import base64
 import requests
 from urllib.parse import quote
 
+import metrics
+
 # GitHub Configuration - get from environment variables
 GITHUB_TOKEN = os.environ.get('GITHUB_TOKEN', '')  # Personal Access Token
 GITHUB_REPO = os.environ.get('GITHUB_REPO', '')    # username/repo-name
 GITHUB_BRANCH = os.environ.get('GITHUB_BRANCH', 'main')
-GITHUB_API_BASE = 'https://api.github.com/repos'
+# API and raw file hosts - overridable to point at a stand-in (benchmarks)
+GITHUB_API_BASE = os.environ.get('GITHUB_API_BASE', 'https://api.github.com/repos')
+GITHUB_RAW_BASE = os.environ.get('GITHUB_RAW_BASE', 'https://raw.githubusercontent.com')
 
 # Storage path within the repository
 STORAGE_PATH = 'storage'  # All files stored in repo_root/storage/
 
+# Bytes per read when streaming files down from GitHub
+DOWNLOAD_CHUNK_SIZE = 256 * 1024
+
 # Enable/disable GitHub storage
 USE_GITHUB = all([GITHUB_TOKEN, GITHUB_REPO])
 
@@ -31,6 +38,7 @@ def get_headers():
     }
 
 
+@metrics.timed('github.sha')
 def get_file_sha(path):
     """Get the SHA of a file (needed for updates/deletes)"""
     if not USE_GITHUB:
@@ -49,6 +57,7 @@ def get_file_sha(path):
         return None
 
 
+@metrics.timed('github.upload', ok=bool)
 def upload_to_github(file_path, repo_path):
     """Upload a file to GitHub repository
 
@@ -99,13 +108,14 @@ def upload_to_github(file_path, repo_path):
         response = requests.put(url, headers=get_headers(), json=data, timeout=60)
 
         if response.status_code in [200, 201]:
+            metrics.add_bytes(file_size)
             # Verify upload was successful by checking the response
             try:
                 resp_data = response.json()
                 if resp_data.get('content') and resp_data['content'].get('sha'):
                     # Upload was successful - return the URL
                     # (Skip immediate verification as GitHub may need time to index)
-                    return f'https://raw.githubusercontent.com/{GITHUB_REPO}/{GITHUB_BRANCH}/{full_path}'
+                    return f'{GITHUB_RAW_BASE}/{GITHUB_REPO}/{GITHUB_BRANCH}/{full_path}'
                 else:
                     print(f'GitHub upload failed: No content in response')
                     return None
@@ -130,6 +140,7 @@ def upload_to_github(file_path, repo_path):
         return None
 
 
+@metrics.timed('github.download', ok=bool)
 def download_from_github(repo_path, local_path):
     """Download a file from GitHub repository
 
@@ -146,15 +157,18 @@ def download_from_github(repo_path, local_path):
     try:
         full_path = f'{STORAGE_PATH}/{repo_path}'
         url = f'{GITHUB_API_BASE}/{GITHUB_REPO}/contents/{full_path}'
-        response = requests.get(url, headers=get_headers(), params={'ref': GITHUB_BRANCH})
+        # Raw media type streams the bytes - the JSON form only inlines files up to 1MB
+        headers = dict(get_headers(), Accept='application/vnd.github.raw')
+        response = requests.get(url, headers=headers, params={'ref': GITHUB_BRANCH}, stream=True, timeout=60)
 
         if response.status_code == 200:
-            data = response.json()
-            content = base64.b64decode(data['content'])
-
             os.makedirs(os.path.dirname(local_path), exist_ok=True)
-            with open(local_path, 'wb') as f:
-                f.write(content)
+            part_path = f'{local_path}.part'
+            with open(part_path, 'wb') as f:
+                for chunk in response.iter_content(DOWNLOAD_CHUNK_SIZE):
+                    f.write(chunk)
+                    metrics.add_bytes(len(chunk))
+            os.replace(part_path, local_path)
             return True
 
         return False
@@ -164,6 +178,36 @@ def download_from_github(repo_path, local_path):
         return False
 
 
+@metrics.timed('github.open', ok=bool)
+def open_github_file(repo_path):
+    """Open a stored file for streaming reads without saving it locally
+
+    Args:
+        repo_path: Path within the repository (e.g., 'channel/beat/file.mp3')
+
+    Returns:
+        File-like object with read()/close(), or None if unavailable
+    """
+    if not USE_GITHUB:
+        return None
+
+    try:
+        url = f'{GITHUB_API_BASE}/{GITHUB_REPO}/contents/{STORAGE_PATH}/{repo_path}'
+        headers = dict(get_headers(), Accept='application/vnd.github.raw')
+        response = requests.get(url, headers=headers, params={'ref': GITHUB_BRANCH}, stream=True, timeout=60)
+
+        if response.status_code == 200:
+            response.raw.decode_content = True
+            return response.raw
+
+        response.close()
+        return None
+
+    except Exception as e:
+        print(f'GitHub open error: {e}')
+        return None
+
+
 def file_exists_in_github(repo_path):
     """Check if a file exists in GitHub
 
@@ -176,6 +220,7 @@ def file_exists_in_github(repo_path):
     return get_file_sha(f'{STORAGE_PATH}/{repo_path}') is not None
 
 
+@metrics.timed('github.delete', ok=bool)
 def delete_from_github(repo_path):
     """Delete a file from GitHub repository
 
@@ -210,6 +255,46 @@ def delete_from_github(repo_path):
         return False
 
 
+def _list_contents(prefix=''):
+    """Every file under a storage prefix, one contents request per folder
+
+    Raises:
+        RuntimeError if any folder could not be listed - a partial listing
+        must not pass for a complete one
+    """
+    full_prefix = f'{STORAGE_PATH}/{prefix}' if prefix else STORAGE_PATH
+    files = []
+
+    def process_folder(folder):
+        url = f'{GITHUB_API_BASE}/{GITHUB_REPO}/contents/{folder}'
+        response = requests.get(url, headers=get_headers(), params={'ref': GITHUB_BRANCH}, timeout=60)
+        if response.status_code == 404 and folder == full_prefix:
+            return  # Nothing stored under the prefix yet
+        if response.status_code != 200:
+            raise RuntimeError(f'HTTP {response.status_code} listing {folder}')
+
+        # Handle both list of items and single item responses
+        items = response.json()
+        if not isinstance(items, list):
+            items = [items] if items else []
+
+        for item in items:
+            if item['type'] == 'file':
+                # Remove STORAGE_PATH prefix from the path
+                files.append({
+                    'name': item['name'],
+                    'path': item['path'][len(STORAGE_PATH)+1:],
+                    'size': item['size'],
+                    'url': item['download_url']
+                })
+            elif item['type'] == 'dir':
+                process_folder(item['path'])
+
+    process_folder(full_prefix)
+    return files
+
+
+@metrics.timed('github.list')
 def list_github_files(prefix=''):
     """List files in GitHub with given prefix (recursively)
 
@@ -218,57 +303,20 @@ def list_github_files(prefix=''):
 
     Returns:
         List of file info dicts with 'name', 'path', 'size', 'url'
+        ([] if the listing failed)
     """
     if not USE_GITHUB:
         return []
 
     try:
-        full_prefix = f'{STORAGE_PATH}/{prefix}' if prefix else STORAGE_PATH
-        url = f'{GITHUB_API_BASE}/{GITHUB_REPO}/contents/{full_prefix}'
-        response = requests.get(url, headers=get_headers(), params={'ref': GITHUB_BRANCH})
-
-        if response.status_code == 200:
-            files = []
-            items = response.json()
-
-            # Handle both list of items and single item responses
-            if not isinstance(items, list):
-                items = [items] if items else []
-
-            def process_item(item, current_prefix=''):
-                """Recursively process items to find all files"""
-                if item['type'] == 'file':
-                    # Remove STORAGE_PATH prefix from the path
-                    relative_path = item['path'][len(STORAGE_PATH)+1:]
-                    files.append({
-                        'name': item['name'],
-                        'path': relative_path,
-                        'size': item['size'],
-                        'url': item['download_url']
-                    })
-                elif item['type'] == 'dir':
-                    # Recursively fetch files from subdirectory
-                    dir_url = f'{GITHUB_API_BASE}/{GITHUB_REPO}/contents/{item["path"]}'
-                    dir_response = requests.get(dir_url, headers=get_headers(), params={'ref': GITHUB_BRANCH})
-                    if dir_response.status_code == 200:
-                        sub_items = dir_response.json()
-                        if not isinstance(sub_items, list):
-                            sub_items = [sub_items] if sub_items else []
-                        for sub_item in sub_items:
-                            process_item(sub_item, current_prefix + item['name'] + '/')
-
-            for item in items:
-                process_item(item)
-
-            return files
-
-        return []
+        return _list_contents(prefix)
 
     except Exception as e:
         print(f'GitHub list error: {e}')
         return []
 
 
+@metrics.timed('github.repo_size')
 def get_repo_size():
     """Get approximate repository size in MB
 
@@ -290,3 +338,54 @@ def get_repo_size():
     except Exception as e:
         print(f'GitHub repo size error: {e}')
         return None
+
+
+@metrics.timed('github.tree', ok=lambda files: files is not None)
+def list_github_tree():
+    """List every file under STORAGE_PATH with one recursive git trees call
+
+    Much cheaper than list_github_files('') for large libraries: one request
+    instead of one per folder. Falls back to list_github_files when GitHub
+    truncates the tree.
+
+    Returns:
+        List of file info dicts with 'name', 'path', 'size', 'url',
+        or None if the listing failed (so callers don't mistake it for empty)
+    """
+    if not USE_GITHUB:
+        return []
+
+    try:
+        url = f'{GITHUB_API_BASE}/{GITHUB_REPO}/git/trees/{GITHUB_BRANCH}'
+        response = requests.get(url, headers=get_headers(), params={'recursive': '1'}, timeout=60)
+
+        if response.status_code != 200:
+            print(f'GitHub tree HTTP {response.status_code}: {response.text[:200]}')
+            return None
+
+        data = response.json()
+        if data.get('truncated'):
+            # A folder that fails to list raises, so the except below returns None
+            return _list_contents()
+
+        prefix = f'{STORAGE_PATH}/'
+        files = []
+        for item in data.get('tree', []):
+            if item['type'] == 'blob' and item['path'].startswith(prefix):
+                relative_path = item['path'][len(prefix):]
+                files.append({
+                    'name': relative_path.split('/')[-1],
+                    'path': relative_path,
+                    'size': item.get('size', 0),
+                    'url': raw_url(relative_path)
+                })
+        return files
+
+    except Exception as e:
+        print(f'GitHub tree error: {e}')
+        return None
+
+
+def raw_url(repo_path):
+    """Public raw.githubusercontent.com URL for a path within STORAGE_PATH"""
+    return f'{GITHUB_RAW_BASE}/{GITHUB_REPO}/{GITHUB_BRANCH}/{STORAGE_PATH}/{quote(repo_path)}'
@@ -0,0 +1,144 @@
+"""
+Job Store Module
+Persists jobs, their progress events and per-item step state to a local SQLite
+database so unfinished work can resume after a restart or redeploy
+Note: point JOB_STORE_PATH at a persistent disk on Render, the default lives
+next to the server and is wiped on redeploy
+"""
+
+import os
+import json
+import sqlite3
+import threading
+import time
+
+JOB_STORE_PATH = os.environ.get(
+    'JOB_STORE_PATH',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'jobs.sqlite3')
+)
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    key TEXT NOT NULL,
+    params TEXT NOT NULL,
+    priority INTEGER NOT NULL,
+    status TEXT NOT NULL,
+    created REAL NOT NULL,
+    finished REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status);
+
+CREATE TABLE IF NOT EXISTS job_events (
+    job_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (job_id, seq)
+);
+
+CREATE TABLE IF NOT EXISTS job_steps (
+    job_id TEXT NOT NULL,
+    item TEXT NOT NULL,
+    step TEXT NOT NULL,
+    data TEXT,
+    updated REAL NOT NULL,
+    PRIMARY KEY (job_id, item, step)
+);
+'''
+
+
+def _tuplify(value):
+    """JSON turns the tuple registry keys into lists - turn them back"""
+    if isinstance(value, list):
+        return tuple(_tuplify(v) for v in value)
+    return value
+
+
+class JobStore:
+    """Thread-safe SQLite persistence for the job registry"""
+
+    def __init__(self, path=JOB_STORE_PATH):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.executescript(SCHEMA)
+        self._lock = threading.Lock()
+
+    def _execute(self, sql, args=()):
+        with self._lock:
+            return self._conn.execute(sql, args).fetchall()
+
+    def save_job(self, job, priority):
+        self._execute(
+            'INSERT OR REPLACE INTO jobs (id, kind, key, params, priority, status, created, finished) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+            (job.id, job.kind, json.dumps(job.key), json.dumps(job.params), priority,
+             job.status, job.created, job.finished)
+        )
+
+    def update_status(self, job_id, status, finished=None):
+        self._execute('UPDATE jobs SET status = ?, finished = ? WHERE id = ?', (status, finished, job_id))
+
+    def add_event(self, job_id, seq, msg):
+        self._execute('INSERT OR REPLACE INTO job_events (job_id, seq, data) VALUES (?, ?, ?)',
+                      (job_id, seq, json.dumps(msg)))
+
+    def set_step(self, job_id, item, step, data=None):
+        self._execute(
+            'INSERT OR REPLACE INTO job_steps (job_id, item, step, data, updated) VALUES (?, ?, ?, ?, ?)',
+            (job_id, item, step, json.dumps(data), time.time())
+        )
+
+    def load_job(self, job_id):
+        """Load one job row with its events and steps
+
+        Returns:
+            Dict with the stored fields, or None if the job is unknown
+        """
+        rows = self._execute(
+            'SELECT id, kind, key, params, priority, status, created, finished FROM jobs WHERE id = ?',
+            (job_id,)
+        )
+        if not rows:
+            return None
+        job_id, kind, key, params, priority, status, created, finished = rows[0]
+
+        events = [json.loads(data) for (data,) in self._execute(
+            'SELECT data FROM job_events WHERE job_id = ? ORDER BY seq', (job_id,))]
+
+        steps = {}
+        for item, step, data in self._execute(
+                'SELECT item, step, data FROM job_steps WHERE job_id = ?', (job_id,)):
+            steps.setdefault(item, {})[step] = json.loads(data) if data else None
+
+        return {
+            'id': job_id,
+            'kind': kind,
+            'key': _tuplify(json.loads(key)),
+            'params': json.loads(params),
+            'priority': priority,
+            'status': status,
+            'created': created,
+            'finished': finished,
+            'events': events,
+            'steps': steps
+        }
+
+    def unfinished_job_ids(self):
+        """IDs of jobs that were queued, running or waiting when the process stopped"""
+        return [job_id for (job_id,) in self._execute(
+            "SELECT id FROM jobs WHERE status IN ('queued', 'running', 'waiting') ORDER BY created")]
+
+    def prune(self, older_than):
+        """Delete finished jobs (and their events/steps) finished before a timestamp"""
+        with self._lock:
+            expired = [job_id for (job_id,) in self._conn.execute(
+                'SELECT id FROM jobs WHERE finished IS NOT NULL AND finished < ?', (older_than,))]
+            for job_id in expired:
+                self._conn.execute('DELETE FROM job_events WHERE job_id = ?', (job_id,))
+                self._conn.execute('DELETE FROM job_steps WHERE job_id = ?', (job_id,))
+                self._conn.execute('DELETE FROM jobs WHERE id = ?', (job_id,))
+        return len(expired)
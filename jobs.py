@@ -0,0 +1,411 @@
+"""
+Job Registry Module
+Tracks download, isolation and cover jobs so identical requests share one run
+Finished jobs are kept for JOB_RETENTION_SECONDS so their progress can be replayed
+With a JobStore attached, jobs and per-item step state survive restarts
+"""
+
+import os
+import json
+import time
+import uuid
+import threading
+import scheduler
+import metrics
+import progress_bus
+from urllib.parse import urlparse, parse_qs, urlencode
+
+# How long finished jobs stay in memory for replay (seconds)
+JOB_RETENTION_SECONDS = int(os.environ.get('JOB_RETENTION_SECONDS', 3600))
+
+# Longest a single WSGI event stream stays open before the client reconnects
+# with Last-Event-ID - keeps a watcher from pinning a request thread
+JOB_EVENTS_MAX_SECONDS = int(os.environ.get('JOB_EVENTS_MAX_SECONDS', 30))
+
+# Most events packed into a single SSE frame
+SSE_BATCH_SIZE = 100
+
+# Returned by a runner whose job carries on outside its worker thread (e.g.
+# while a remote API generates). The runner sets the job 'waiting' before
+# handing it off; a continuation queued with JobRegistry.continue_job()
+# finishes it
+DETACHED = object()
+
+# Query parameters that identify YouTube content - everything else is tracking noise
+YOUTUBE_QUERY_KEYS = ('v', 'list')
+
+
+def canonical_url(url):
+    """Normalize a YouTube URL so equivalent links map to the same job
+
+    Lowercases the host, drops www./m. prefixes, rewrites youtu.be short links,
+    keeps only the v/list query parameters and strips trailing slashes.
+    """
+    url = url.strip()
+    if '://' not in url:
+        url = 'https://' + url
+
+    parsed = urlparse(url)
+    host = parsed.netloc.lower()
+    for prefix in ('www.', 'm.', 'music.'):
+        if host.startswith(prefix):
+            host = host[len(prefix):]
+
+    path = parsed.path.rstrip('/')
+    query = parse_qs(parsed.query)
+
+    if host == 'youtu.be' and path:
+        query['v'] = [path.lstrip('/')]
+        host, path = 'youtube.com', '/watch'
+
+    kept = [(k, query[k][0]) for k in YOUTUBE_QUERY_KEYS if query.get(k)]
+    return f'https://{host}{path}' + (f'?{urlencode(kept)}' if kept else '')
+
+
+def download_key(url, mode, to_mp3):
+    """Registry key for a /download request"""
+    return ('download', canonical_url(url), mode, bool(to_mp3))
+
+
+def isolate_key(channel, beat):
+    """Registry key for an /isolate request (beat=None means whole channel)"""
+    return ('isolate', channel, beat or '')
+
+
+def cover_key(channel, beat, stems, genre, fresh=False, reduced=False, engine='kie'):
+    """Registry key for a /cover request (fresh asks for a new variation,
+    reduced for an upload-sized source, engine 'yue' for the local model)"""
+    stem_names = sorted(
+        s.get('type', s.get('name', '')) if isinstance(s, dict) else str(s)
+        for s in stems
+    )
+    key = ('cover', channel, beat, tuple(stem_names), (genre or '').strip().lower())
+    if engine != 'kie':
+        key += (engine,)
+    return key + ('fresh',) * fresh + ('reduced',) * reduced
+
+
+def cover_batch_key(channel, pairs, stems, fresh=False, reduced=False):
+    """Registry key for a /cover/batch request"""
+    stem_names = cover_key(channel, '', stems, '')[3]
+    selection = sorted((beat, (genre or '').strip().lower()) for beat, genre in pairs)
+    key = ('cover-batch', channel, stem_names, tuple(selection))
+    return key + ('fresh',) * fresh + ('reduced',) * reduced
+
+
+def sse_frames(index, events):
+    """Format events that follow index as SSE frames
+
+    Consecutive events share one frame: data is a single object for one event
+    and an array for several. The frame id is the index of its last event, so
+    it doubles as the Last-Event-ID to resume from.
+    """
+    frames = []
+    for start in range(0, len(events), SSE_BATCH_SIZE):
+        batch = events[start:start + SSE_BATCH_SIZE]
+        data = batch[0] if len(batch) == 1 else batch
+        frames.append(f"id: {index + start + len(batch)}\ndata: {json.dumps(data)}\n\n")
+    return ''.join(frames)
+
+
+def parse_last_event_id(value):
+    """Parse a Last-Event-ID header / query value into an event index"""
+    try:
+        return max(0, int(value))
+    except (TypeError, ValueError):
+        return 0
+
+
+class Job:
+    """A single unit of work and its progress history
+
+    Exposes put() so it can be handed to the run_* workers in place of a
+    queue.Queue. Messages go through a ProgressBus, which keeps every status
+    and error (coalescing only chatty progress) so late subscribers can replay it.
+
+    Workers record per-item progress with mark_step() and check it with
+    step_done() so a resumed job skips the steps it already finished.
+    """
+
+    def __init__(self, kind, key, params, job_id=None, store=None, priority=scheduler.PRIORITY_NORMAL):
+        self.id = job_id or uuid.uuid4().hex[:12]
+        self.kind = kind
+        self.key = key
+        self.params = params
+        self.priority = priority
+        self.status = 'queued'
+        self.created = time.time()
+        self.finished = None
+        self.bus = progress_bus.ProgressBus(on_append=self._persist_event)
+        self.steps = {}     # item -> {step: data}
+        self.store = store
+        self._errors = 0
+        self._on_finish = []
+        self._lock = threading.Lock()
+        self.timing = metrics.JobTiming()
+
+    @classmethod
+    def from_record(cls, record, store):
+        """Rebuild a job loaded from the JobStore"""
+        job = cls(record['kind'], record['key'], record['params'],
+                  job_id=record['id'], store=store, priority=record['priority'])
+        job.status = record['status']
+        job.created = record['created']
+        job.finished = record['finished']
+        job.bus.events = record['events']
+        job.steps = record['steps']
+        job._errors = sum(1 for msg in job.events if msg.get('error'))
+        if job.finished:
+            job.bus.close()
+        return job
+
+    @property
+    def events(self):
+        return self.bus.events
+
+    def put(self, msg):
+        """Record a progress message and wake any subscribers"""
+        callbacks = []
+        with self._lock:
+            if self.finished:
+                return
+            if msg.get('error'):
+                self._errors += 1
+            if msg.get('complete'):
+                failed = msg.get('error') or (self._errors and not msg.get('message'))
+                self.status = 'failed' if failed else 'complete'
+                self.finished = time.time()
+                if self.timing.stages:
+                    msg = dict(msg, timing=self.timing.summary(self.finished - self.created))
+
+            self.bus.publish(msg)
+            if self.finished:
+                self.bus.close()
+                if self.store:
+                    self.store.update_status(self.id, self.status, self.finished)
+                callbacks, self._on_finish = self._on_finish, []
+
+        for fn in callbacks:
+            try:
+                fn(self)
+            except Exception as e:
+                print(f'Job {self.id} finish callback error: {e}')
+
+    def on_finish(self, fn):
+        """Call fn(job) once the job has finished (right away if it already has)"""
+        with self._lock:
+            if not self.finished:
+                self._on_finish.append(fn)
+                return
+        fn(self)
+
+    def _persist_event(self, seq, msg):
+        if self.store:
+            self.store.add_event(self.id, seq, msg)
+
+    def set_status(self, status):
+        """Scheduler hook for queued -> running (-> waiting) transitions"""
+        self.status = status
+        if self.store:
+            self.store.update_status(self.id, status)
+
+    def step_done(self, item, step):
+        """True if a previous run of this job already finished step for item"""
+        return step in self.steps.get(item, {})
+
+    def step_data(self, item, step):
+        """Data saved with a finished step, or None"""
+        return self.steps.get(item, {}).get(step)
+
+    def mark_step(self, item, step, data=None):
+        """Record that step finished for item (e.g. 'separated' for a beat)"""
+        self.steps.setdefault(item, {})[step] = data
+        if self.store:
+            self.store.set_step(self.id, item, step, data)
+
+    def events_since(self, index, timeout=None):
+        """Return events after index, waiting up to timeout for new ones"""
+        return self.bus.read(index, timeout)
+
+    def stream(self, since=0, keepalive=1, max_seconds=None):
+        """Yield SSE frames for this job's events, starting after index since
+
+        With max_seconds the stream ends early with a retry hint, and the
+        client's EventSource reconnects with Last-Event-ID to continue.
+        """
+        index = since
+        deadline = time.time() + max_seconds if max_seconds else None
+        while True:
+            events = self.events_since(index, timeout=keepalive)
+            if events:
+                yield sse_frames(index, events)
+                index += len(events)
+            elif self.bus.closed:
+                return
+            elif deadline and time.time() > deadline:
+                yield "retry: 1000\n\n"
+                return
+            else:
+                yield ": keepalive\n\n"
+
+    def to_dict(self):
+        """Summary used by status endpoints"""
+        return {
+            'id': self.id,
+            'kind': self.kind,
+            'status': self.status,
+            'created': self.created,
+            'finished': self.finished,
+            'events': len(self.events),
+            'last': self.events[-1] if self.events else None
+        }
+
+
+class JobRegistry:
+    """Keeps one live job per normalized request key and hands new jobs to the scheduler"""
+
+    def __init__(self, job_scheduler=None, store=None, retention=JOB_RETENTION_SECONDS):
+        self.scheduler = job_scheduler or scheduler.Scheduler()
+        self.store = store
+        self.retention = retention
+        self._runners = {}
+        self._jobs = {}     # job id -> Job
+        self._active = {}   # request key -> running Job
+        self._lock = threading.Lock()
+
+    def register(self, kind, runner, pool):
+        """Register the function that executes jobs of a kind: runner(job, params)
+
+        pool names the scheduler pool (network/cpu/remote) the kind is bound by.
+        """
+        self._runners[kind] = (runner, pool)
+
+    def submit(self, kind, key, params, priority=scheduler.PRIORITY_NORMAL, force=False):
+        """Queue a job, or attach to the in-flight one with the same key
+
+        force skips admission control (used for parts of an admitted batch).
+
+        Returns:
+            (job, created) - created is False when an in-flight job was reused
+
+        Raises:
+            scheduler.QueueFull if the kind's pool cannot accept more work
+        """
+        with self._lock:
+            self._prune()
+            job = self._active.get(key)
+            if job and not job.finished:
+                return job, False
+
+            job = Job(kind, key, params, store=self.store, priority=priority)
+            self._jobs[job.id] = job
+            self._active[key] = job
+
+        if self.store:
+            self.store.save_job(job, priority)
+
+        try:
+            self.scheduler.submit(self._runners[kind][1], job, self._run, priority, force)
+        except scheduler.QueueFull:
+            with self._lock:
+                self._jobs.pop(job.id, None)
+                if self._active.get(key) is job:
+                    del self._active[key]
+            if self.store:
+                self.store.update_status(job.id, 'rejected', time.time())
+            raise
+        return job, True
+
+    def get(self, job_id):
+        """Look up a running or retained job by ID, falling back to the store"""
+        with self._lock:
+            self._prune()
+            job = self._jobs.get(job_id)
+            if job or not self.store:
+                return job
+
+            record = self.store.load_job(job_id)
+            if not record or not record['finished']:
+                return None
+            if record['finished'] < time.time() - self.retention:
+                return None
+            job = Job.from_record(record, self.store)
+            self._jobs[job.id] = job
+            return job
+
+    def list(self, status=None):
+        """Jobs currently held in memory, newest first"""
+        with self._lock:
+            self._prune()
+            found = [job for job in self._jobs.values() if not status or job.status == status]
+        return sorted(found, key=lambda job: job.created, reverse=True)
+
+    def resume_unfinished(self):
+        """Re-queue jobs that were queued or running when the process stopped
+
+        Resumed jobs keep their ID and event history, so clients can reconnect
+        with GET /jobs/<id>, and their runners skip already finished steps.
+
+        Returns:
+            Number of jobs resumed
+        """
+        if not self.store:
+            return 0
+
+        self.store.prune(time.time() - self.retention)
+        # Register every job before running any, so a resumed batch attaches
+        # to its resumed parts instead of starting them again
+        resumed = []
+        for job_id in self.store.unfinished_job_ids():
+            record = self.store.load_job(job_id)
+            if not record or record['kind'] not in self._runners:
+                continue
+
+            job = Job.from_record(record, self.store)
+            with self._lock:
+                if job.key in self._active:
+                    continue
+                self._jobs[job.id] = job
+                self._active[job.key] = job
+            resumed.append(job)
+
+        for job in resumed:
+            job.put({'status': 'Server restarted - resuming job...'})
+            self.scheduler.submit(self._runners[job.kind][1], job, self._run, job.priority, force=True)
+        return len(resumed)
+
+    def continue_job(self, job, runner, pool=None):
+        """Queue the next part of a detached job: runner(job, params)
+
+        Runs on the kind's pool unless another is named. Skips admission
+        control, since the job was admitted when it was first submitted.
+        """
+        self.scheduler.submit(pool or self._runners[job.kind][1], job,
+                              lambda job: self._run(job, runner), job.priority, force=True)
+
+    def _run(self, job, runner=None):
+        detached = False
+        try:
+            runner = runner or self._runners[job.kind][0]
+            with metrics.bind(job):
+                detached = runner(job, job.params) is DETACHED
+        except Exception as e:
+            job.put({'error': str(e), 'complete': True})
+        finally:
+            if detached and not job.finished:
+                return  # stays registered until its continuation completes it
+            # Workers normally finish with a 'complete' message; make sure
+            # subscribers are released even if one forgot
+            if not job.finished:
+                job.put({'complete': True})
+            with self._lock:
+                if self._active.get(job.key) is job:
+                    del self._active[job.key]
+
+    def _prune(self):
+        """Drop finished jobs older than the retention window (caller holds lock)"""
+        cutoff = time.time() - self.retention
+        expired = [job_id for job_id, job in self._jobs.items()
+                   if job.finished and job.finished < cutoff]
+        for job_id in expired:
+            del self._jobs[job_id]
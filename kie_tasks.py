@@ -0,0 +1,288 @@
+"""
+Kie Tasks Module
+Tracks every outstanding kie.ai task from one background thread. kie.ai
+POSTs each stage of a task to /kie-callback, which is handed straight to the
+task's job; record-info is polled as a fallback on a schedule that adapts to
+the task's age and status, so the number of threads stays the same however
+many covers are generating.
+
+Callbacks are converted to the shape of a record-info 'data' object, so jobs
+handle both sources the same way:
+    {'taskId', 'status', 'response': {'sunoData': [{'audioUrl', ...}]}, 'errorMessage'}
+"""
+
+import os
+import time
+import hashlib
+import threading
+from collections import deque
+
+# Delay before the first record-info poll of a new task - covers take 1-2 minutes
+KIE_POLL_FIRST_SECONDS = int(os.environ.get('KIE_POLL_FIRST_SECONDS', 30))
+
+# Bounds of the adaptive poll interval
+KIE_POLL_MIN_SECONDS = int(os.environ.get('KIE_POLL_MIN_SECONDS', 5))
+KIE_POLL_MAX_SECONDS = int(os.environ.get('KIE_POLL_MAX_SECONDS', 60))
+
+# Poll interval once callbacks are known to reach us for a task
+KIE_POLL_FALLBACK_SECONDS = int(os.environ.get('KIE_POLL_FALLBACK_SECONDS', 60))
+
+# Tasks still unfinished after this long are given up on (seconds)
+KIE_TASK_TIMEOUT_SECONDS = int(os.environ.get('KIE_TASK_TIMEOUT_SECONDS', 600))
+
+# How long a result that arrived for an untracked task is kept (seconds)
+KIE_RESULT_RETENTION_SECONDS = 600
+
+# kie.ai accepts KIE_SUBMIT_LIMIT new generation requests per KIE_SUBMIT_PERIOD seconds
+KIE_SUBMIT_LIMIT = int(os.environ.get('KIE_SUBMIT_LIMIT', 20))
+KIE_SUBMIT_PERIOD = 10
+
+# callbackType -> record-info status
+CALLBACK_STATUS = {
+    'text': 'TEXT_SUCCESS',
+    'first': 'FIRST_SUCCESS',
+    'complete': 'SUCCESS',
+    'error': 'GENERATE_AUDIO_FAILED',
+}
+
+# Statuses after which a task is no longer tracked (TIMEOUT is our own)
+TERMINAL_STATUSES = ('SUCCESS', 'CREATE_TASK_FAILED', 'GENERATE_AUDIO_FAILED',
+                     'CALLBACK_EXCEPTION', 'SENSITIVE_WORD_ERROR', 'TIMEOUT')
+
+
+def _camel(name):
+    head, *rest = name.split('_')
+    return head + ''.join(part.capitalize() for part in rest)
+
+
+def from_callback(payload):
+    """Task ID and record-info style data for a /kie-callback body
+
+    Returns:
+        (task_id, task_data), or (None, None) if the body is not a task callback
+    """
+    body = payload.get('data') or {}
+    task_id = body.get('task_id') or body.get('taskId')
+    if not task_id:
+        return None, None
+
+    clips = [{_camel(k): v for k, v in clip.items()}
+             for clip in body.get('data') or [] if isinstance(clip, dict)]
+    status = CALLBACK_STATUS.get(body.get('callbackType'), 'PENDING')
+    if payload.get('code') not in (None, 200) and status != 'SUCCESS':
+        status = 'GENERATE_AUDIO_FAILED'
+
+    task_data = {'taskId': task_id, 'status': status, 'response': {'sunoData': clips}}
+    if status == 'GENERATE_AUDIO_FAILED':
+        task_data['errorMessage'] = payload.get('msg') or 'Generation failed'
+    return task_id, task_data
+
+
+def request_key(stem_digest, request):
+    """Memo key of a cover request: the source stem's content and every
+    parameter that changes what kie.ai generates"""
+    fields = [stem_digest] + [str(request.get(name)) for name in
+                              ('prompt', 'instrumental', 'customMode', 'model')]
+    return hashlib.sha256('\x1f'.join(fields).encode()).hexdigest()
+
+
+def clips(task_data):
+    """Generated clips of a finished task that have an audio URL"""
+    suno_data = (task_data.get('response') or {}).get('sunoData') or []
+    return [clip for clip in suno_data if clip.get('audioUrl')]
+
+
+def poll_interval(status, age, pushed):
+    """Seconds until a task is next polled
+
+    Args:
+        status: Last known status
+        age: Seconds since the task was submitted
+        pushed: True once a callback has arrived for the task
+    """
+    if pushed:
+        return KIE_POLL_FALLBACK_SECONDS
+    if status == 'FIRST_SUCCESS':
+        return KIE_POLL_MIN_SECONDS  # the rest usually follows within seconds
+    return min(KIE_POLL_MAX_SECONDS, max(KIE_POLL_MIN_SECONDS, age / 4))
+
+
+class RateLimit:
+    """Sliding-window limit on calls shared by all threads"""
+
+    def __init__(self, calls=KIE_SUBMIT_LIMIT, period=KIE_SUBMIT_PERIOD):
+        self.calls = calls
+        self.period = period
+        self._times = deque()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Block until another call fits in the window"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                while self._times and self._times[0] <= now - self.period:
+                    self._times.popleft()
+                if len(self._times) < self.calls:
+                    self._times.append(now)
+                    return
+                wait = self._times[0] + self.period - now
+            time.sleep(wait)
+
+
+class KieTaskTracker:
+    """Outstanding kie.ai tasks, updated by callbacks and one polling thread
+
+    Args:
+        fetch: Callable(task_id) -> record-info data, or None if the poll failed
+        timeout: Seconds after submission when a task is reported as TIMEOUT;
+            a task is polled at least once before that, so a task resumed
+            after a long restart still gets a result that is waiting for it
+
+    on_update(task_data) is called for each status change and once more with
+    the terminal result. It runs on the poller or a request thread, so it
+    must only record progress or queue work.
+    """
+
+    def __init__(self, fetch, timeout=KIE_TASK_TIMEOUT_SECONDS, retention=KIE_RESULT_RETENTION_SECONDS):
+        self.fetch = fetch
+        self.timeout = timeout
+        self.retention = retention
+        self.polls = 0
+        self.callbacks = 0
+        self._tasks = {}    # task id -> {'listeners', 'started', 'next_poll', 'status', 'pushed', 'polled'}
+        self._early = {}    # task id -> (arrived, task_data) for results nobody tracks yet
+        self._cond = threading.Condition()
+        self._thread = None
+
+    def track(self, task_id, on_update, started=None, poll_now=False):
+        """Follow a task until it finishes
+
+        Tracking a task that is already followed adds on_update as another
+        listener (identical cover requests share one task).
+
+        Args:
+            started: Submission time (defaults to now)
+            poll_now: Poll right away, e.g. for a task resumed after a restart
+        """
+        now = time.time()
+        started = started or now
+        with self._cond:
+            self._prune(now)
+            task = self._tasks.get(task_id)
+            if task:
+                task['listeners'].append(on_update)
+                if poll_now:
+                    task['next_poll'] = now
+                    self._cond.notify()
+                return
+            self._tasks[task_id] = {
+                'listeners': [on_update],
+                'started': started,
+                'next_poll': now if poll_now else max(now, started + KIE_POLL_FIRST_SECONDS),
+                'status': None,
+                'pushed': False,
+                'polled': False
+            }
+            early = self._early.pop(task_id, None)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._loop, name='kie-poller', daemon=True)
+                self._thread.start()
+            self._cond.notify()
+        if early:
+            self._dispatch(task_id, early[1], pushed=True)
+
+    def tracking(self, task_id):
+        """True while a task is outstanding"""
+        with self._cond:
+            return task_id in self._tasks
+
+    def deliver(self, task_id, task_data):
+        """Apply a result pushed to /kie-callback
+
+        Returns:
+            True if the task is being tracked
+        """
+        with self._cond:
+            self.callbacks += 1
+            if task_id not in self._tasks:
+                self._prune(time.time())
+                self._early[task_id] = (time.time(), task_data)
+                return False
+        self._dispatch(task_id, task_data, pushed=True)
+        return True
+
+    def stats(self):
+        with self._cond:
+            return {'tracked': len(self._tasks), 'polls': self.polls, 'callbacks': self.callbacks}
+
+    def _dispatch(self, task_id, task_data, pushed):
+        status = task_data.get('status')
+        now = time.time()
+        with self._cond:
+            task = self._tasks.get(task_id)
+            if task is None:
+                return  # already finished by the other source
+            if status == 'SUCCESS' and not clips(task_data):
+                # Success without clips - ask record-info for the full result
+                task['next_poll'] = now if pushed else now + KIE_POLL_MIN_SECONDS
+                self._cond.notify()
+                return
+            if status in TERMINAL_STATUSES:
+                del self._tasks[task_id]
+            else:
+                task['pushed'] = task['pushed'] or pushed
+                task['next_poll'] = now + poll_interval(status, now - task['started'], task['pushed'])
+                self._cond.notify()
+                if status == task['status']:
+                    return
+                task['status'] = status
+            listeners = list(task['listeners'])
+
+        for on_update in listeners:
+            try:
+                on_update(task_data)
+            except Exception as e:
+                print(f'kie.ai task {task_id} update error: {e}')
+
+    def _loop(self):
+        while True:
+            with self._cond:
+                now = time.time()
+                expired = [t for t, task in self._tasks.items()
+                           if now - task['started'] > self.timeout and task['polled']]
+                due = [t for t, task in self._tasks.items()
+                       if task['next_poll'] <= now and t not in expired]
+                if not expired and not due:
+                    upcoming = [task['next_poll'] for task in self._tasks.values()]
+                    self._cond.wait(min(upcoming) - now if upcoming else None)
+                    continue
+                for task_id in due:
+                    # Not due again until this poll is answered
+                    self._tasks[task_id]['next_poll'] = now + KIE_POLL_MAX_SECONDS
+                    self._tasks[task_id]['polled'] = True
+
+            for task_id in expired:
+                self._dispatch(task_id, {'taskId': task_id, 'status': 'TIMEOUT'}, pushed=False)
+
+            for task_id in due:
+                with self._cond:
+                    self.polls += 1
+                try:
+                    task_data = self.fetch(task_id)
+                except Exception as e:
+                    print(f'kie.ai poll error for {task_id}: {e}')
+                    task_data = None
+                if task_data is None:
+                    with self._cond:
+                        task = self._tasks.get(task_id)
+                        if task:
+                            task['next_poll'] = time.time() + poll_interval(
+                                task['status'], time.time() - task['started'], task['pushed'])
+                    continue
+                self._dispatch(task_id, task_data, pushed=False)
+
+    def _prune(self, now):
+        """Drop unclaimed pushed results past the retention window (caller holds the lock)"""
+        for task_id in [t for t, (arrived, _) in self._early.items() if arrived < now - self.retention]:
+            del self._early[task_id]
@@ -0,0 +1,473 @@
+"""
+Library Index Module
+SQLite catalog of every channel, beat, stem and cover in storage so listing
+routes are indexed queries instead of directory walks or GitHub recursions
+Paths are relative to the storage root: channel/beat/[isolated_samples|ai_covers|previews/]file
+"""
+
+import os
+import re
+import sqlite3
+import threading
+import time
+
+from sample_search import normalize_key
+
+LIBRARY_INDEX_PATH = os.environ.get(
+    'LIBRARY_INDEX_PATH',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'library.sqlite3')
+)
+
+STEM_TYPES = ('Vocals', 'Drums', 'Bass', 'Other')
+
+# Stem filenames written by run_stem_isolation: Other_<beat>_140.0BPM_Cmin.mp3
+# (essentia names some keys with flats, e.g. Ebmin - stored as D#min)
+BPM_KEY_PATTERN = re.compile(r'_(\d+(?:\.\d+)?)BPM_([A-G][#b]?(?:maj|min))\.mp3$')
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    channel TEXT NOT NULL,
+    beat TEXT NOT NULL,
+    category TEXT NOT NULL,
+    name TEXT NOT NULL,
+    stem_type TEXT,
+    size INTEGER NOT NULL DEFAULT 0,
+    bpm REAL,
+    key TEXT,
+    url TEXT,
+    updated REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS files_category_channel ON files (category, channel, beat);
+CREATE INDEX IF NOT EXISTS files_channel_beat ON files (channel, beat, category);
+CREATE INDEX IF NOT EXISTS files_category_order ON files (category, channel, beat, name);
+CREATE INDEX IF NOT EXISTS files_category_bpm ON files (category, bpm);
+CREATE INDEX IF NOT EXISTS files_category_key ON files (category, key);
+
+-- Storage counters per channel/beat/category, kept current by the triggers below
+CREATE TABLE IF NOT EXISTS usage (
+    channel TEXT NOT NULL,
+    beat TEXT NOT NULL,
+    category TEXT NOT NULL,
+    files INTEGER NOT NULL,
+    bytes INTEGER NOT NULL,
+    PRIMARY KEY (channel, beat, category)
+);
+
+CREATE TRIGGER IF NOT EXISTS files_usage_insert AFTER INSERT ON files BEGIN
+    INSERT INTO usage (channel, beat, category, files, bytes)
+    VALUES (NEW.channel, NEW.beat, NEW.category, 1, NEW.size)
+    ON CONFLICT (channel, beat, category) DO UPDATE
+    SET files = files + 1, bytes = bytes + excluded.bytes;
+END;
+
+CREATE TRIGGER IF NOT EXISTS files_usage_delete AFTER DELETE ON files BEGIN
+    UPDATE usage SET files = files - 1, bytes = bytes - OLD.size
+    WHERE channel = OLD.channel AND beat = OLD.beat AND category = OLD.category;
+    DELETE FROM usage
+    WHERE channel = OLD.channel AND beat = OLD.beat AND category = OLD.category AND files <= 0;
+END;
+
+CREATE TRIGGER IF NOT EXISTS files_usage_update AFTER UPDATE OF size ON files BEGIN
+    UPDATE usage SET bytes = bytes - OLD.size + NEW.size
+    WHERE channel = NEW.channel AND beat = NEW.beat AND category = NEW.category;
+END;
+
+-- Covers generated per cover request (stem content + prompt + options), so an
+-- identical request reuses them instead of paying for another kie.ai task
+CREATE TABLE IF NOT EXISTS cover_results (
+    request_key TEXT NOT NULL,
+    task_id TEXT NOT NULL,
+    path TEXT NOT NULL,
+    created REAL NOT NULL,
+    PRIMARY KEY (request_key, path)
+);
+
+-- Public URLs of uploaded cover sources (stems and mixes) by content digest,
+-- so repeat covers skip the mixdown and the upload
+CREATE TABLE IF NOT EXISTS cover_sources (
+    digest TEXT PRIMARY KEY,
+    path TEXT NOT NULL,
+    url TEXT NOT NULL,
+    created REAL NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS meta (
+    name TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+'''
+
+
+def classify(path):
+    """Work out what a storage path is
+
+    Returns:
+        Dict with channel, beat, category ('original', 'stem', 'cover', 'preview'),
+        name, stem_type, bpm and key - or None for files the library ignores
+    """
+    parts = path.split('/')
+    if len(parts) < 3 or any(part.startswith('.') for part in parts):
+        return None
+
+    channel, beat, name = parts[0], parts[1], parts[-1]
+    info = {'channel': channel, 'beat': beat, 'name': name,
+            'stem_type': None, 'bpm': None, 'key': None}
+
+    if len(parts) == 3 and name.endswith(('.mp3', '.mp4')):
+        info['category'] = 'original'
+    elif len(parts) == 4 and parts[2] == 'isolated_samples' and name.endswith('.mp3'):
+        info['category'] = 'stem'
+        info['stem_type'] = stem_type_from_name(name)
+        match = BPM_KEY_PATTERN.search(name)
+        if match:
+            info['bpm'] = float(match.group(1))
+            info['key'] = normalize_key(match.group(2))
+    elif len(parts) == 4 and parts[2] == 'ai_covers' and name.endswith('.mp3'):
+        info['category'] = 'cover'
+    elif len(parts) == 4 and parts[2] == 'previews' and name.endswith(('.preview.mp3', '.peaks.json')):
+        info['category'] = 'preview'
+    else:
+        return None
+
+    return info
+
+
+def stem_type_from_name(name):
+    """Stem type from the filename prefix, e.g. 'Drums_Beat.mp3' -> 'Drums'"""
+    for stem_type in STEM_TYPES:
+        if name.startswith(stem_type + '_'):
+            return stem_type
+    return 'Unknown'
+
+
+class LibraryIndex:
+    """Thread-safe SQLite catalog of the sample library"""
+
+    def __init__(self, path=LIBRARY_INDEX_PATH):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.executescript(SCHEMA)
+        self._lock = threading.Lock()
+        self._version = int(self._meta('version') or 0)
+        self._usage_cache = (None, None)  # (version, summary)
+
+        # Catalogs created before the usage counters existed: count them once
+        if not self._conn.execute('SELECT 1 FROM usage LIMIT 1').fetchall():
+            self._conn.execute(
+                'INSERT INTO usage (channel, beat, category, files, bytes) '
+                'SELECT channel, beat, category, COUNT(*), SUM(size) FROM files GROUP BY channel, beat, category'
+            )
+
+    def _query(self, sql, args=()):
+        with self._lock:
+            return self._conn.execute(sql, args).fetchall()
+
+    def _meta(self, name):
+        rows = self._conn.execute('SELECT value FROM meta WHERE name = ?', (name,)).fetchall()
+        return rows[0][0] if rows else None
+
+    def _bump(self):
+        """Advance the library version (caller holds the lock)"""
+        self._version += 1
+        self._conn.execute("INSERT OR REPLACE INTO meta (name, value) VALUES ('version', ?)",
+                           (str(self._version),))
+
+    @property
+    def version(self):
+        """Increases on every change - cheap change detection for callers"""
+        return self._version
+
+    def is_empty(self):
+        return not self._query('SELECT 1 FROM files LIMIT 1')
+
+    def _insert(self, path, size, url, updated):
+        info = classify(path)
+        if not info:
+            return False
+        # Upsert rather than INSERT OR REPLACE so the usage triggers see an UPDATE
+        self._conn.execute(
+            'INSERT INTO files (path, channel, beat, category, name, stem_type, size, bpm, key, url, updated) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?) '
+            'ON CONFLICT (path) DO UPDATE SET size = excluded.size, '
+            'url = COALESCE(excluded.url, url), updated = excluded.updated',
+            (path, info['channel'], info['beat'], info['category'], info['name'], info['stem_type'],
+             size or 0, info['bpm'], info['key'], url, updated or time.time())
+        )
+        return True
+
+    def add_file(self, path, size, url=None, updated=None):
+        """Record a file that was written to storage
+
+        Returns:
+            True if the path belongs in the library, False if it was ignored
+        """
+        with self._lock:
+            added = self._insert(path, size, url, updated)
+            if added:
+                self._bump()
+            return added
+
+    def remove(self, path):
+        """Forget a file, or everything under a folder path (channel or channel/beat)"""
+        with self._lock:
+            self._conn.execute(
+                "DELETE FROM cover_sources WHERE path = ? OR path LIKE ? ESCAPE '\\'",
+                (path, _like_prefix(path))
+            )
+            cursor = self._conn.execute(
+                "DELETE FROM files WHERE path = ? OR path LIKE ? ESCAPE '\\'",
+                (path, _like_prefix(path))
+            )
+            if cursor.rowcount:
+                self._bump()
+            return cursor.rowcount
+
+    def rebuild(self, files):
+        """Replace the whole catalog from a storage listing
+
+        Args:
+            files: Iterable of dicts with 'path', 'size' and optional 'url'/'updated'
+        """
+        with self._lock:
+            self._conn.execute('BEGIN')
+            try:
+                self._conn.execute('DELETE FROM files')
+                count = sum(1 for f in files
+                            if self._insert(f['path'], f.get('size'), f.get('url'), f.get('updated')))
+                self._bump()
+                self._conn.execute('COMMIT')
+            except Exception:
+                self._conn.execute('ROLLBACK')
+                raise
+        return count
+
+    def usage(self):
+        """Bytes and file counts per channel, beat and category
+
+        Read from the trigger-maintained counters and cached per library
+        version, so the cost does not depend on the number of files.
+
+        Returns:
+            {'bytes', 'files', 'categories': {...}, 'channels': {channel: {'bytes', 'files',
+            'categories': {category: {'bytes', 'files'}}, 'beats': {beat: {'bytes', 'files'}}}}}
+        """
+        version, summary = self._usage_cache
+        if version == self._version:
+            return summary
+
+        version = self._version
+        summary = {'bytes': 0, 'files': 0, 'categories': {}, 'channels': {}}
+        for channel, beat, category, files, size in self._query(
+                'SELECT channel, beat, category, files, bytes FROM usage'):
+            totals = summary['channels'].setdefault(
+                channel, {'bytes': 0, 'files': 0, 'categories': {}, 'beats': {}})
+            for bucket in (summary, totals, totals['beats'].setdefault(beat, {'bytes': 0, 'files': 0}),
+                           summary['categories'].setdefault(category, {'bytes': 0, 'files': 0}),
+                           totals['categories'].setdefault(category, {'bytes': 0, 'files': 0})):
+                bucket['bytes'] += size
+                bucket['files'] += files
+
+        self._usage_cache = (version, summary)
+        return summary
+
+    def channels(self):
+        """[{'name', 'count', 'hasIsolated'}] - beat count is beats with an original"""
+        rows = self._query(
+            "SELECT channel, "
+            "COUNT(DISTINCT CASE WHEN category = 'original' THEN beat END), "
+            "MAX(category = 'stem') "
+            "FROM files GROUP BY channel ORDER BY channel"
+        )
+        return [{'name': channel, 'count': count, 'hasIsolated': bool(has_stems)}
+                for channel, count, has_stems in rows]
+
+    def beats(self, channel):
+        """[{'name', 'hasIsolated'}] for one channel"""
+        rows = self._query(
+            "SELECT beat, MAX(category = 'stem') FROM files WHERE channel = ? GROUP BY beat ORDER BY beat",
+            (channel,)
+        )
+        return [{'name': beat, 'hasIsolated': bool(has_stems)} for beat, has_stems in rows]
+
+    def beats_page(self, channel, after=None, limit=100):
+        """One page of beats for a channel, ordered by name
+
+        Returns:
+            (items, next_after) - pass next_after back to get the following page
+        """
+        rows = self._query(
+            "SELECT beat, MAX(category = 'stem') FROM files WHERE channel = ? AND beat > ? "
+            "GROUP BY beat ORDER BY beat LIMIT ?",
+            (channel, after or '', limit + 1)
+        )
+        items = [{'name': beat, 'hasIsolated': bool(has_stems)} for beat, has_stems in rows[:limit]]
+        next_after = items[-1]['name'] if len(rows) > limit else None
+        return items, next_after
+
+    def stems_page(self, channel=None, stem_type=None, bpm_min=None, bpm_max=None, key=None,
+                   after=None, limit=100):
+        """One page of stems matching the filters, ordered by channel, beat, name
+
+        Args:
+            after: (channel, beat, name) of the last stem on the previous page
+
+        Returns:
+            (items, next_after) - pass next_after back to get the following page
+        """
+        sql = ('SELECT path, channel, beat, name, stem_type, size, bpm, key, url, updated '
+               "FROM files WHERE category = 'stem'")
+        args = []
+        for clause, value in (('channel = ?', channel), ('stem_type = ?', stem_type),
+                              ('bpm >= ?', bpm_min), ('bpm <= ?', bpm_max), ('key = ?', key)):
+            if value is not None:
+                sql += f' AND {clause}'
+                args.append(value)
+        if after:
+            sql += ' AND (channel, beat, name) > (?, ?, ?)'
+            args.extend(after)
+        sql += ' ORDER BY channel, beat, name LIMIT ?'
+        args.append(limit + 1)
+
+        columns = ('path', 'channel', 'beat', 'name', 'type', 'size', 'bpm', 'key', 'url', 'updated')
+        rows = [dict(zip(columns, row)) for row in self._query(sql, args)]
+        items = rows[:limit]
+        next_after = [items[-1]['channel'], items[-1]['beat'], items[-1]['name']] if len(rows) > limit else None
+        return items, next_after
+
+    def search_stems(self, bpm_ranges=None, keys=None, channel=None, stem_type=None, limit=5000, score=None):
+        """Stems in any of the BPM ranges and/or with one of the keys
+
+        Uses the (category, bpm) and (category, key) indexes, so only the
+        candidates are read - final ranking is left to the caller. With
+        score, candidates are ordered best first before the limit applies,
+        so the limit only ever drops the worst matches.
+
+        Args:
+            bpm_ranges: [(low, high)] inclusive BPM windows
+            keys: Normalized key names, e.g. ['Amin', 'Cmaj']
+            score: sample_search.score_terms() of the search
+        """
+        sql = ('SELECT path, channel, beat, name, stem_type, size, bpm, key, url, updated '
+               "FROM files WHERE category = 'stem'")
+        args = []
+        if bpm_ranges:
+            sql += ' AND (' + ' OR '.join('bpm BETWEEN ? AND ?' for _ in bpm_ranges) + ')'
+            for low, high in bpm_ranges:
+                args.extend((low, high))
+        if keys:
+            sql += f" AND key IN ({', '.join('?' for _ in keys)})"
+            args.extend(keys)
+        for clause, value in (('channel = ?', channel), ('stem_type = ?', stem_type)):
+            if value is not None:
+                sql += f' AND {clause}'
+                args.append(value)
+        if score:
+            order, order_args = _score_sql(score)
+            sql += f' ORDER BY {order}, channel, beat, name'
+            args.extend(order_args)
+        sql += ' LIMIT ?'
+        args.append(limit)
+
+        columns = ('path', 'channel', 'beat', 'name', 'type', 'size', 'bpm', 'key', 'url', 'updated')
+        return [dict(zip(columns, row)) for row in self._query(sql, args)]
+
+    def rows(self, paths):
+        """Rows for specific paths (any category), in no particular order"""
+        paths = list(paths)
+        columns = ('path', 'channel', 'beat', 'name', 'type', 'size', 'bpm', 'key', 'url', 'updated')
+        found = []
+        for start in range(0, len(paths), 500):
+            chunk = paths[start:start + 500]
+            found.extend(dict(zip(columns, row)) for row in self._query(
+                'SELECT path, channel, beat, name, stem_type, size, bpm, key, url, updated FROM files '
+                f"WHERE path IN ({', '.join('?' for _ in chunk)})", chunk))
+        return found
+
+    def add_cover_result(self, request_key, task_id, path):
+        """Remember that a cover file was generated for a request"""
+        with self._lock:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO cover_results (request_key, task_id, path, created) VALUES (?, ?, ?, ?)',
+                (request_key, task_id, path, time.time())
+            )
+
+    def cover_results(self, request_key, task_id=None):
+        """Covers of the latest task (or a given task) for a request
+
+        Only files still in the library count - deleted covers are not reused.
+
+        Returns:
+            [{'path', 'name', 'url', 'taskId'}]
+        """
+        sql = ('SELECT f.path, f.name, f.url, r.task_id FROM cover_results r JOIN files f ON f.path = r.path '
+               'WHERE r.request_key = ?')
+        args = [request_key]
+        if task_id is not None:
+            sql += ' AND r.task_id = ?'
+            args.append(task_id)
+        rows = self._query(sql + ' ORDER BY r.created DESC', args)
+        latest = rows[0][3] if rows else None
+        return [{'path': path, 'name': name, 'url': url, 'taskId': task}
+                for path, name, url, task in sorted(rows, key=lambda row: row[1]) if task == latest]
+
+    def add_cover_source(self, digest, path, url):
+        """Remember where an uploaded cover source can be fetched"""
+        with self._lock:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO cover_sources (digest, path, url, created) VALUES (?, ?, ?, ?)',
+                (digest, path, url, time.time())
+            )
+
+    def cover_source_url(self, digest):
+        """Public URL of an uploaded cover source, or None"""
+        rows = self._query('SELECT url FROM cover_sources WHERE digest = ?', (digest,))
+        return rows[0][0] if rows else None
+
+    def cover_source_paths(self, channel, beat=None):
+        """Paths of uploaded cover sources under a channel or beat"""
+        folder = f'{channel}/{beat}' if beat is not None else channel
+        return [row[0] for row in self._query(
+            "SELECT path FROM cover_sources WHERE path LIKE ? ESCAPE '\\' ORDER BY path",
+            (_like_prefix(folder),))]
+
+    def files(self, category, channel=None, beat=None):
+        """Rows for one category, optionally limited to a channel or beat"""
+        sql = ('SELECT path, channel, beat, name, stem_type, size, bpm, key, url, updated '
+               'FROM files WHERE category = ?')
+        args = [category]
+        if channel is not None:
+            sql += ' AND channel = ?'
+            args.append(channel)
+        if beat is not None:
+            sql += ' AND beat = ?'
+            args.append(beat)
+        sql += ' ORDER BY channel, beat, name'
+
+        columns = ('path', 'channel', 'beat', 'name', 'type', 'size', 'bpm', 'key', 'url', 'updated')
+        return [dict(zip(columns, row)) for row in self._query(sql, args)]
+
+
+def _score_sql(score):
+    """SQL expression computing sample_search.rank()'s score (lower is better)"""
+    terms, args = [], []
+    if score.get('tempo'):
+        tempo = []
+        for factor, penalty in score['tempo']:
+            tempo.append('CASE WHEN abs(bpm * ? - ?) <= ? THEN abs(bpm * ? - ?) / ? + ? ELSE 1e9 END')
+            args.extend((factor, score['bpm'], score['tolerance'], factor, score['bpm'], score['tolerance'], penalty))
+        terms.append(tempo[0] if len(tempo) == 1 else f"min({', '.join(tempo)})")
+    if score.get('keys'):
+        terms.append('CASE key ' + ' '.join('WHEN ? THEN ?' for _ in score['keys']) + ' ELSE 1e9 END')
+        for key, penalty in score['keys'].items():
+            args.extend((key, penalty))
+    return ('(' + ' + '.join(terms) + ')' if terms else '0'), args
+
+
+def _like_prefix(path):
+    """LIKE pattern matching everything below a folder path"""
+    escaped = path.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return escaped.rstrip('/') + '/%'
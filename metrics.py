@@ -0,0 +1,220 @@
+"""
+Metrics Module
+Structured timing for the pipeline's stages. A span times one stage (a yt-dlp
+run, a BPM analysis, a GitHub upload, a kie.ai wait) and counts the bytes it
+moved, the retries it needed and whether it failed. Every span feeds
+process-wide Prometheus histograms and counters, rendered by /metrics, and
+the timing summary of the job it ran for, which is attached to the job's
+final 'complete' event:
+    {'timing': {'totalSeconds', 'stages': {'separate': {'seconds', 'count', 'bytes', 'retries'}},
+                'peakRssBytes': {'self', 'children'}}}
+
+Job runners are bound to their job for the duration of the run, so spans in
+library code (github_storage, audio_download) only name their stage.
+"""
+
+import sys
+import time
+import resource
+import threading
+import contextlib
+import functools
+
+PREFIX = 'ytaicover'
+
+# Histogram buckets for stage durations (seconds) - from an API call to a channel download
+BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800)
+
+_lock = threading.Lock()
+_durations = {}     # stage -> [count per bucket..., sum, count]
+_counters = {}      # (metric, stage) -> value
+_collectors = []    # callables adding gauges/counters owned by other modules
+_local = threading.local()
+
+
+def peak_rss():
+    """Peak resident set size in bytes of this process and of its waited-for children"""
+    scale = 1 if sys.platform == 'darwin' else 1024
+    return {'self': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale,
+            'children': resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * scale}
+
+
+class JobTiming:
+    """Per-stage totals for one job"""
+
+    def __init__(self):
+        self.stages = {}
+        self._lock = threading.Lock()
+
+    def add(self, stage, seconds, size=0, retries=0):
+        with self._lock:
+            totals = self.stages.setdefault(stage, {'seconds': 0.0, 'count': 0, 'bytes': 0, 'retries': 0})
+            totals['seconds'] += seconds
+            totals['count'] += 1
+            totals['bytes'] += size
+            totals['retries'] += retries
+
+    def summary(self, total_seconds):
+        with self._lock:
+            stages = {stage: dict(totals, seconds=round(totals['seconds'], 3))
+                      for stage, totals in self.stages.items()}
+        return {'totalSeconds': round(total_seconds, 3), 'stages': stages, 'peakRssBytes': peak_rss()}
+
+
+class Span:
+    """One timed stage; add_bytes/retry/fail describe what happened in it"""
+
+    def __init__(self, stage, job):
+        self.stage = stage
+        self.job = job
+        self.bytes = 0
+        self.retries = 0
+        self.failed = False
+
+    def add_bytes(self, size):
+        self.bytes += size or 0
+
+    def retry(self):
+        self.retries += 1
+
+    def fail(self):
+        self.failed = True
+
+
+def _spans():
+    if not hasattr(_local, 'spans'):
+        _local.spans = []
+    return _local.spans
+
+
+@contextlib.contextmanager
+def bind(job):
+    """Attribute spans opened on this thread to job (used by the job runner)"""
+    previous = getattr(_local, 'job', None)
+    _local.job = job
+    try:
+        yield
+    finally:
+        _local.job = previous
+
+
+@contextlib.contextmanager
+def span(stage, job=None):
+    """Time a stage; job defaults to the one bound to this thread"""
+    current = Span(stage, job or getattr(_local, 'job', None))
+    spans = _spans()
+    spans.append(current)
+    started = time.perf_counter()
+    try:
+        yield current
+    except Exception:
+        current.failed = True
+        raise
+    finally:
+        spans.pop()
+        observe(stage, time.perf_counter() - started, current.job,
+                current.bytes, current.retries, current.failed)
+
+
+def timed(stage, ok=None):
+    """Decorator running a function in a span; ok(result) False counts as a failure"""
+    def wrap(fn):
+        @functools.wraps(fn)
+        def run(*args, **kwargs):
+            with span(stage) as current:
+                result = fn(*args, **kwargs)
+                if ok is not None and not ok(result):
+                    current.fail()
+                return result
+        return run
+    return wrap
+
+
+def add_bytes(size):
+    """Count bytes moved by the innermost span on this thread"""
+    spans = _spans()
+    if spans:
+        spans[-1].add_bytes(size)
+
+
+def retry():
+    """Count a retry of the innermost span on this thread"""
+    spans = _spans()
+    if spans:
+        spans[-1].retry()
+
+
+def observe(stage, seconds, job=None, size=0, retries=0, failed=False):
+    """Record a stage measured by hand, e.g. a kie.ai wait spanning threads"""
+    with _lock:
+        buckets = _durations.setdefault(stage, [0] * (len(BUCKETS) + 2))
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                buckets[i] += 1
+        buckets[-2] += seconds
+        buckets[-1] += 1
+        for metric, value in (('bytes', size), ('retries', retries), ('errors', int(failed))):
+            if value:
+                _counters[(metric, stage)] = _counters.get((metric, stage), 0) + value
+    timing = getattr(job, 'timing', None)
+    if timing is not None:
+        timing.add(stage, seconds, size, retries)
+
+
+def register_collector(fn):
+    """Add metrics owned elsewhere to /metrics
+
+    fn() returns [(name, type, help, [(labels dict, value)])], names without PREFIX.
+    """
+    _collectors.append(fn)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{k}="{_escape(v)}"' for k, v in sorted(labels.items())) + '}'
+
+
+def _family(lines, name, kind, help_text, samples):
+    lines.append(f'# HELP {PREFIX}_{name} {help_text}')
+    lines.append(f'# TYPE {PREFIX}_{name} {kind}')
+    for labels, value in samples:
+        lines.append(f'{PREFIX}_{name}{_labels(labels)} {value}')
+
+
+def render():
+    """All metrics in the Prometheus text exposition format"""
+    with _lock:
+        durations = {stage: list(buckets) for stage, buckets in _durations.items()}
+        counters = dict(_counters)
+
+    lines = [f'# HELP {PREFIX}_stage_seconds Time spent in each pipeline stage',
+             f'# TYPE {PREFIX}_stage_seconds histogram']
+    for stage, buckets in sorted(durations.items()):
+        for bound, count in zip(BUCKETS, buckets):
+            lines.append(f'{PREFIX}_stage_seconds_bucket{_labels({"stage": stage, "le": bound})} {count}')
+        lines.append(f'{PREFIX}_stage_seconds_bucket{_labels({"stage": stage, "le": "+Inf"})} {buckets[-1]}')
+        lines.append(f'{PREFIX}_stage_seconds_sum{_labels({"stage": stage})} {buckets[-2]:.6f}')
+        lines.append(f'{PREFIX}_stage_seconds_count{_labels({"stage": stage})} {buckets[-1]}')
+
+    for metric, help_text in (('bytes', 'Bytes moved by each pipeline stage'),
+                              ('retries', 'Retries within each pipeline stage'),
+                              ('errors', 'Failed runs of each pipeline stage')):
+        _family(lines, f'stage_{metric}_total', 'counter', help_text,
+                [({'stage': stage}, value) for (name, stage), value in sorted(counters.items()) if name == metric])
+
+    rss = peak_rss()
+    _family(lines, 'peak_rss_bytes', 'gauge', 'Peak resident set size of the server and of its subprocesses',
+            [({'process': process}, value) for process, value in sorted(rss.items())])
+
+    for collect in _collectors:
+        try:
+            for name, kind, help_text, samples in collect():
+                _family(lines, name, kind, help_text, samples)
+        except Exception as e:
+            print(f'Metrics collector error: {e}')
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,108 @@
+"""
+Previews Module
+Waveform peaks and a short low-bitrate preview clip per stem, so browsing a
+beat costs kilobytes instead of the full-quality MP3s.
+
+Each stem is decoded once to PCM with ffmpeg; the peaks are min/max per
+bucket from one NumPy reshape, and the preview is re-encoded from the same
+PCM starting at the loudest stretch. Files are stored next to the stems:
+    channel/beat/previews/<stem>.peaks.json
+    channel/beat/previews/<stem>.preview.mp3
+"""
+
+import os
+import json
+import subprocess
+
+PREVIEW_SECONDS = float(os.environ.get('PREVIEW_SECONDS', 30))
+PREVIEW_BITRATE = os.environ.get('PREVIEW_BITRATE', '48k')
+PEAK_COUNT = int(os.environ.get('PEAK_COUNT', 1000))
+SAMPLE_RATE = 22050
+
+
+def preview_names(stem_name):
+    """('<stem>.peaks.json', '<stem>.preview.mp3') for a stem filename"""
+    base = os.path.splitext(stem_name)[0]
+    return f'{base}.peaks.json', f'{base}.preview.mp3'
+
+
+def compute_peaks(samples, count=PEAK_COUNT):
+    """Min/max per bucket of int16 samples, scaled to -127..127
+
+    Returns:
+        (mins, maxs, energy) arrays with one value per bucket
+    """
+    import numpy as np
+
+    count = max(1, min(count, len(samples)))
+    bucket = len(samples) // count
+    if not bucket:
+        zeros = np.zeros(count, dtype=np.int64)
+        return zeros, zeros, zeros.astype(np.float64)
+
+    frames = samples[:bucket * count].reshape(count, bucket)
+    scale = 127 / 32768
+    mins = np.round(frames.min(axis=1) * scale).astype(np.int64)
+    maxs = np.round(frames.max(axis=1) * scale).astype(np.int64)
+    energy = np.square(frames, dtype=np.float64).sum(axis=1)
+    return mins, maxs, energy
+
+
+def loudest_start(energy, duration, window):
+    """Start time (seconds) of the loudest window, from per-bucket energy"""
+    import numpy as np
+
+    if duration <= window or not len(energy):
+        return 0.0
+    buckets = max(1, int(len(energy) * window / duration))
+    sums = np.convolve(energy, np.ones(buckets), mode='valid')
+    return round(float(np.argmax(sums)) * duration / len(energy), 2)
+
+
+def make_preview(stem_path, preview_dir):
+    """Write the peaks JSON and preview MP3 for one stem
+
+    Returns:
+        [peaks filename, preview filename]
+
+    Raises:
+        RuntimeError if ffmpeg cannot decode or encode the stem
+    """
+    import numpy as np
+
+    os.makedirs(preview_dir, exist_ok=True)
+    peaks_name, preview_name = preview_names(os.path.basename(stem_path))
+
+    decoded = subprocess.run(
+        ['ffmpeg', '-v', 'error', '-i', stem_path, '-ac', '1', '-ar', str(SAMPLE_RATE), '-f', 's16le', '-'],
+        capture_output=True, timeout=120
+    )
+    if decoded.returncode != 0 or not decoded.stdout:
+        raise RuntimeError(f'ffmpeg decode failed: {decoded.stderr.decode(errors="replace")[-200:]}')
+
+    samples = np.frombuffer(decoded.stdout, dtype=np.int16)
+    duration = len(samples) / SAMPLE_RATE
+    mins, maxs, energy = compute_peaks(samples)
+    start = loudest_start(energy, duration, PREVIEW_SECONDS)
+
+    first = int(start * SAMPLE_RATE)
+    clip = samples[first:first + int(PREVIEW_SECONDS * SAMPLE_RATE)]
+    preview_path = os.path.join(preview_dir, preview_name)
+    encoded = subprocess.run(
+        ['ffmpeg', '-v', 'error', '-y', '-f', 's16le', '-ar', str(SAMPLE_RATE), '-ac', '1', '-i', '-',
+         '-b:a', PREVIEW_BITRATE, preview_path],
+        input=clip.tobytes(), capture_output=True, timeout=120
+    )
+    if encoded.returncode != 0:
+        raise RuntimeError(f'ffmpeg encode failed: {encoded.stderr.decode(errors="replace")[-200:]}')
+
+    with open(os.path.join(preview_dir, peaks_name), 'w') as f:
+        json.dump({
+            'duration': round(duration, 2),
+            'previewStart': start,
+            'previewSeconds': round(len(clip) / SAMPLE_RATE, 2),
+            'min': mins.tolist(),
+            'max': maxs.tolist()
+        }, f, separators=(',', ':'))
+
+    return [peaks_name, preview_name]
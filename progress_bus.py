@@ -0,0 +1,191 @@
+"""
+Progress Bus Module
+Append-only event log behind every job's progress stream. Chatty progress
+updates are coalesced to the latest value per item within PROGRESS_INTERVAL
+seconds; status, error and completion messages are never dropped.
+
+Held-back progress is released by the next publish or by a timer, never by
+readers, and on_append runs outside the bus lock, so a slow store write
+never stalls the streams reading the bus. Async streams listen() for new
+events instead of polling.
+"""
+
+import os
+import threading
+import time
+
+# Minimum seconds between two progress events for the same item
+PROGRESS_INTERVAL = float(os.environ.get('PROGRESS_INTERVAL', 0.5))
+
+# Keys a message may carry and still count as a coalescible progress update
+PROGRESS_KEYS = {'progress', 'item'}
+
+# Queue position updates (item 'queue') replace each other the same way
+QUEUE_KEYS = {'queued', 'position', 'eta', 'startAt', 'status', 'item'}
+
+
+def is_progress(msg):
+    """True for pure progress updates like {'progress': 42.0, 'item': 'Beat'}
+    and for queue positions like {'queued': True, 'position': 3, 'item': 'queue', ...}"""
+    if msg.get('queued'):
+        return msg.get('item') == 'queue' and set(msg) <= QUEUE_KEYS
+    return 'progress' in msg and set(msg) <= PROGRESS_KEYS
+
+
+class ProgressBus:
+    """Thread-safe event log with per-item progress coalescing
+
+    Args:
+        interval: Coalescing window in seconds (0 disables coalescing)
+        on_append: Optional callback(seq, msg) for every event that lands in the
+            log, called in order on the producer's (or the release timer's)
+            thread after the bus lock is released
+    """
+
+    def __init__(self, interval=PROGRESS_INTERVAL, on_append=None):
+        self.interval = interval
+        self.on_append = on_append
+        self.events = []
+        self.published = 0      # messages offered, including coalesced ones
+        self._pending = {}      # item -> latest unsent progress message
+        self._last_sent = {}    # item -> time of last progress event
+        self._unsaved = []      # (seq, msg) appended but not yet handed to on_append
+        self._timer = None      # releases held-back progress when no publish follows
+        self._listeners = []    # callbacks woken when events land or the bus closes
+        self._wake_pending = False
+        self._closed = False
+        self._cond = threading.Condition()
+        self._save_lock = threading.Lock()
+
+    def publish(self, msg):
+        """Offer a message; progress may be held back, everything else is appended"""
+        with self._cond:
+            if self._closed:
+                return
+            self.published += 1
+            now = time.time()
+
+            if is_progress(msg) and self.interval > 0:
+                item = msg.get('item')
+                self._pending[item] = msg
+                if now - self._last_sent.get(item, 0) < self.interval:
+                    self._flush_due(now)
+                    self._schedule_release()
+                else:
+                    self._flush(now)
+                    self._cond.notify_all()
+            else:
+                # Keep ordering: pending progress goes out before the status that follows it
+                self._flush(now)
+                self._append(msg)
+                self._cond.notify_all()
+        self._save()
+        self._wake()
+
+    @property
+    def closed(self):
+        """True once the job finished - no more events will arrive"""
+        return self._closed
+
+    def close(self):
+        """Flush pending progress and stop accepting messages"""
+        with self._cond:
+            self._flush(time.time())
+            self._closed = True
+            if self._timer:
+                self._timer.cancel()
+                self._timer = None
+            self._wake_pending = True
+            self._cond.notify_all()
+        self._save()
+        self._wake()
+
+    def read(self, index, timeout=None):
+        """Return events after index, waiting up to timeout for new ones"""
+        with self._cond:
+            if index >= len(self.events) and not self._closed:
+                self._cond.wait(timeout)
+            return self.events[index:]
+
+    def listen(self, callback):
+        """Call callback() whenever events land or the bus closes
+
+        The call comes from the producer's thread, outside the bus lock, and
+        only says "look again" - a listener reads the new events itself.
+
+        Returns:
+            Function that stops the calls
+        """
+        with self._cond:
+            self._listeners.append(callback)
+
+        def stop():
+            with self._cond:
+                if callback in self._listeners:
+                    self._listeners.remove(callback)
+        return stop
+
+    def _append(self, msg):
+        self.events.append(msg)
+        self._wake_pending = True
+        if self.on_append:
+            self._unsaved.append((len(self.events), msg))
+
+    def _save(self):
+        """Hand appended events to on_append in order, outside the bus lock"""
+        if not self.on_append:
+            return
+        with self._save_lock:
+            with self._cond:
+                unsaved, self._unsaved = self._unsaved, []
+            for seq, msg in unsaved:
+                try:
+                    self.on_append(seq, msg)
+                except Exception as e:
+                    print(f'Progress event {seq} could not be saved: {e}')
+
+    def _wake(self):
+        """Tell listeners about events appended since the last wake, outside the bus lock"""
+        with self._cond:
+            if not self._wake_pending:
+                return
+            self._wake_pending = False
+            listeners = list(self._listeners)
+        for listener in listeners:
+            try:
+                listener()
+            except Exception as e:
+                print(f'Progress listener error: {e}')
+
+    def _schedule_release(self):
+        """Make sure held-back progress goes out even if nothing else is published (caller holds the lock)"""
+        if self._timer is None:
+            due = min(self._last_sent.get(item, 0) for item in self._pending) + self.interval
+            self._timer = threading.Timer(max(0.01, due - time.time()), self._release)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _release(self):
+        with self._cond:
+            self._timer = None
+            if self._closed:
+                return
+            self._flush_due(time.time())
+            if self._pending:
+                self._schedule_release()
+        self._save()
+        self._wake()
+
+    def _flush(self, now):
+        for item, msg in self._pending.items():
+            self._append(msg)
+            self._last_sent[item] = now
+        self._pending.clear()
+
+    def _flush_due(self, now):
+        due = [item for item in self._pending if now - self._last_sent.get(item, 0) >= self.interval]
+        for item in due:
+            self._append(self._pending.pop(item))
+            self._last_sent[item] = now
+        if due:
+            self._cond.notify_all()
@@ -0,0 +1,139 @@
+"""
+Sample Search Module
+Musical matching for /search: key normalization, Camelot-wheel compatibility
+and half/double-tempo BPM ranges. Candidate stems come from the library
+index's BPM and key indexes; this module ranks them.
+"""
+
+PITCH_CLASSES = ['C', 'C#', 'D', 'D#', 'E', 'F', 'F#', 'G', 'G#', 'A', 'A#', 'B']
+FLATS = {'Db': 'C#', 'Eb': 'D#', 'Gb': 'F#', 'Ab': 'G#', 'Bb': 'A#'}
+
+# How far a key may be from the target, by search mode
+KEY_MODES = ('exact', 'relative', 'compatible')
+
+# Ranking penalties - lower scores rank first
+KEY_PENALTY = {'exact': 0.0, 'relative': 0.5, 'adjacent': 1.0}
+TEMPO_PENALTY = {'same': 0.0, 'half': 0.5, 'double': 0.5}
+
+DEFAULT_TOLERANCE = 3.0
+
+
+def normalize_key(key):
+    """'Ebmin' -> 'D#min', 'cmaj' -> 'Cmaj'; None if it is not a key"""
+    if not key or len(key) < 4 or key[-3:].lower() not in ('maj', 'min'):
+        return None
+    root = key[:-3]
+    root = root[0].upper() + root[1:]
+    root = FLATS.get(root, root)
+    if root not in PITCH_CLASSES:
+        return None
+    return root + key[-3:].lower()
+
+
+def camelot(key):
+    """Camelot wheel position of a normalized key, e.g. 'Amin' -> (8, 'A')"""
+    pitch = PITCH_CLASSES.index(key[:-3])
+    if key.endswith('maj'):
+        # Cmaj = 8B, each fifth up is one step clockwise
+        return (7 + 7 * pitch) % 12 + 1, 'B'
+    # Amin = 8A
+    return (7 + 7 * (pitch - 9)) % 12 + 1, 'A'
+
+
+def key_at(number, letter):
+    """Inverse of camelot()"""
+    for pitch in PITCH_CLASSES:
+        key = pitch + ('maj' if letter == 'B' else 'min')
+        if camelot(key) == (number, letter):
+            return key
+
+
+def matching_keys(key, mode='compatible'):
+    """Keys that mix with key, mapped to how they relate to it
+
+    exact - the same key
+    relative - plus the relative major/minor (same Camelot number)
+    compatible - plus a fifth up or down (Camelot number +/- 1)
+    """
+    number, letter = camelot(key)
+    keys = {key: 'exact'}
+    if mode in ('relative', 'compatible'):
+        keys[key_at(number, 'A' if letter == 'B' else 'B')] = 'relative'
+    if mode == 'compatible':
+        for step in (-1, 1):
+            keys.setdefault(key_at((number - 1 + step) % 12 + 1, letter), 'adjacent')
+    return keys
+
+
+def tempo_ranges(bpm, tolerance=DEFAULT_TOLERANCE, half_double=True):
+    """[(relation, low, high)] BPM windows a matching stem may fall in"""
+    ranges = [('same', bpm - tolerance, bpm + tolerance)]
+    if half_double:
+        ranges.append(('half', (bpm - tolerance) / 2, (bpm + tolerance) / 2))
+        ranges.append(('double', (bpm - tolerance) * 2, (bpm + tolerance) * 2))
+    return ranges
+
+
+# Stem tempo multiplied by the factor is compared with the target tempo
+TEMPO_FACTORS = (('same', 1), ('half', 2), ('double', 0.5))
+
+
+def score_terms(bpm=None, tolerance=DEFAULT_TOLERANCE, keys=None, half_double=True):
+    """The parts of rank()'s score, for ordering candidates before they are read
+
+    Returns:
+        {'bpm', 'tolerance', 'tempo': [(factor, penalty)], 'keys': {key: penalty}};
+        tempo and keys are None when they don't count
+    """
+    tempo = None
+    if bpm is not None:
+        tempo = [(factor, TEMPO_PENALTY[relation]) for relation, factor in TEMPO_FACTORS
+                 if relation == 'same' or half_double]
+    return {'bpm': bpm, 'tolerance': tolerance, 'tempo': tempo,
+            'keys': {k: KEY_PENALTY[relation] for k, relation in keys.items()} if keys is not None else None}
+
+
+def rank(stems, bpm=None, tolerance=DEFAULT_TOLERANCE, keys=None, half_double=True):
+    """Score and sort candidate stems, best match first
+
+    Args:
+        stems: Library rows with 'bpm' and 'key'
+        bpm: Target tempo, or None to ignore tempo
+        keys: matching_keys() result, or None to ignore key
+
+    Returns:
+        The stems that match, each with 'score' and 'match' added
+    """
+    ranked = []
+    for stem in stems:
+        match = {}
+        score = 0.0
+
+        if bpm is not None:
+            if stem['bpm'] is None:
+                continue
+            best = None
+            for relation, factor in TEMPO_FACTORS:
+                if relation != 'same' and not half_double:
+                    continue
+                diff = abs(stem['bpm'] * factor - bpm)
+                if diff <= tolerance:
+                    candidate = (diff / tolerance + TEMPO_PENALTY[relation], relation, diff)
+                    best = min(best, candidate) if best else candidate
+            if not best:
+                continue
+            score += best[0]
+            match['tempo'] = best[1]
+            match['bpmDiff'] = round(best[2], 1)
+
+        if keys is not None:
+            relation = keys.get(stem['key'])
+            if not relation:
+                continue
+            score += KEY_PENALTY[relation]
+            match['key'] = relation
+
+        ranked.append(dict(stem, score=round(score, 3), match=match))
+
+    ranked.sort(key=lambda stem: (stem['score'], stem['channel'], stem['beat'], stem['name']))
+    return ranked
@@ -0,0 +1,168 @@
+"""
+Job Scheduler Module
+Admission control for background jobs. Each resource pool runs a fixed number
+of worker threads and holds a bounded, prioritized backlog:
+    network - yt-dlp downloads
+    cpu     - BPM/key analysis and stem separation
+    remote  - waiting on remote APIs (kie.ai cover generation)
+"""
+
+import os
+import heapq
+import itertools
+import threading
+import time
+from collections import deque
+
+# Priorities - lower runs first
+PRIORITY_HIGH = 0
+PRIORITY_NORMAL = 1
+PRIORITY_LOW = 2
+PRIORITY_NAMES = {'high': PRIORITY_HIGH, 'normal': PRIORITY_NORMAL, 'low': PRIORITY_LOW}
+
+# Worker counts per pool - tuned for a single small Render instance
+POOL_WORKERS = {
+    'network': int(os.environ.get('SCHEDULER_NETWORK_WORKERS', 2)),
+    'cpu': int(os.environ.get('SCHEDULER_CPU_WORKERS', 1)),
+    'remote': int(os.environ.get('SCHEDULER_REMOTE_WORKERS', 4)),
+}
+
+# Jobs waiting beyond this many per pool are rejected
+MAX_QUEUED = int(os.environ.get('SCHEDULER_MAX_QUEUED', 20))
+
+# Duration guess (seconds) until a pool has finished a few jobs of its own
+DEFAULT_JOB_SECONDS = {'network': 120, 'cpu': 300, 'remote': 120}
+
+
+class QueueFull(Exception):
+    """Raised when a pool's backlog is at MAX_QUEUED"""
+
+
+class Pool:
+    """Fixed-size worker pool with a priority backlog"""
+
+    def __init__(self, name, workers, max_queued=MAX_QUEUED):
+        self.name = name
+        self.workers = max(1, workers)
+        self.max_queued = max_queued
+        self.running = 0
+        self._heap = []
+        self._seq = itertools.count()
+        self._durations = deque(maxlen=20)
+        self._positions = {}    # job id -> queue position last announced
+        self._threads = []
+        self._cond = threading.Condition()
+
+    def submit(self, job, fn, priority=PRIORITY_NORMAL, force=False):
+        """Queue fn(job) to run when a worker is free
+
+        force skips admission control (used for jobs resumed after a restart).
+
+        Raises:
+            QueueFull if the backlog is already at max_queued
+        """
+        with self._cond:
+            if len(self._heap) >= self.max_queued and not force:
+                raise QueueFull(f'{self.name} queue is full ({self.max_queued} jobs waiting)')
+            heapq.heappush(self._heap, (priority, next(self._seq), job, fn))
+            job.set_status('queued')
+            if len(self._threads) < self.workers:
+                thread = threading.Thread(target=self._worker, name=f'{self.name}-worker-{len(self._threads)}')
+                thread.daemon = True
+                self._threads.append(thread)
+                thread.start()
+            self._cond.notify()
+        self._announce()
+
+    def average_duration(self):
+        if not self._durations:
+            return DEFAULT_JOB_SECONDS.get(self.name, 120)
+        return sum(self._durations) / len(self._durations)
+
+    def expected_wait(self, position):
+        """Seconds until the job at a 1-based queue position should start"""
+        ahead = self.running + position - 1
+        return int(self.average_duration() * (ahead // self.workers))
+
+    def stats(self):
+        with self._cond:
+            return {
+                'workers': self.workers,
+                'running': self.running,
+                'queued': len(self._heap),
+                'maxQueued': self.max_queued,
+                'avgSeconds': round(self.average_duration(), 1)
+            }
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                while not self._heap:
+                    self._cond.wait()
+                _, _, job, fn = heapq.heappop(self._heap)
+                self._positions.pop(job.id, None)
+                self.running += 1
+            self._announce()
+
+            job.set_status('running')
+            start = time.time()
+            try:
+                fn(job)
+            except Exception as e:
+                print(f'Scheduler {self.name} job {job.id} error: {e}')
+            finally:
+                with self._cond:
+                    self.running -= 1
+                    self._durations.append(time.time() - start)
+
+    def _announce(self):
+        """Tell every waiting job whose place changed its queue position and expected start time
+
+        The update is a coalescible progress message (item 'queue'), so a job's
+        log keeps about one position per PROGRESS_INTERVAL rather than one per
+        queue change.
+        """
+        with self._cond:
+            waiting = [entry[2] for entry in sorted(self._heap)]
+            moved = [(position, job) for position, job in enumerate(waiting, 1)
+                     if self._positions.get(job.id) != position]
+            for position, job in moved:
+                self._positions[job.id] = position
+        now = time.time()
+        for position, job in moved:
+            eta = self.expected_wait(position)
+            job.put({
+                'queued': True,
+                'item': 'queue',
+                'position': position,
+                'eta': eta,
+                'startAt': int(now + eta),
+                'status': f'Queued (position {position}, starts in ~{eta}s)'
+            })
+
+
+class Scheduler:
+    """Routes jobs to the resource pool they are bound by"""
+
+    def __init__(self, pool_workers=None, max_queued=MAX_QUEUED):
+        pool_workers = pool_workers or POOL_WORKERS
+        self.pools = {name: Pool(name, workers, max_queued) for name, workers in pool_workers.items()}
+
+    def submit(self, pool, job, fn, priority=PRIORITY_NORMAL, force=False):
+        self.pools[pool].submit(job, fn, priority, force)
+
+    def stats(self):
+        return {name: pool.stats() for name, pool in self.pools.items()}
+
+
+def parse_priority(value, default=PRIORITY_NORMAL):
+    """Accept 'high'/'normal'/'low' or an int from request JSON
+
+    Ints are clamped to PRIORITY_HIGH..PRIORITY_LOW so no client can jump
+    ahead of every job; JSON true/false is not a priority.
+    """
+    if isinstance(value, bool):
+        return default
+    if isinstance(value, int):
+        return min(max(value, PRIORITY_HIGH), PRIORITY_LOW)
+    return PRIORITY_NAMES.get(str(value).lower(), default) if value else default
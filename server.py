@@ -16,20 +16,41 @@ Folder Structure:
                         [AI Generated Cover].mp3
 """
 
-from flask import Flask, request, jsonify, Response, send_from_directory
+from flask import Flask, request, jsonify, Response, send_from_directory, send_file
+from werkzeug.utils import safe_join
+from urllib.parse import quote
 from flask_cors import CORS
 import subprocess
 import threading
-import queue
 import os
 import sys
 import re
 import json
+import base64
+import hashlib
 import shutil
 import requests
 import time
 import tempfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+import audio_cache
+import audio_download
+import audio_serving
+import cover_sources
+import exporter
 import github_storage
+import jobs
+import library_index
+import job_store
+import kie_tasks
+import metrics
+import sample_search
+import previews
+import scheduler
+import similarity
+import storage_watcher
+import yue_worker
 
 # Heavy imports - lazy load to speed up startup
 librosa = None
@@ -43,15 +64,18 @@ def get_librosa():
     return librosa, np
 
 app = Flask(__name__)
+app.use_x_sendfile = audio_serving.USE_X_SENDFILE
 CORS(app)
 
-DOWNLOADS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'downloads')
+DOWNLOADS_DIR = os.environ.get('DOWNLOADS_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'downloads'))
 PORT = int(os.environ.get('PORT', 8080))
 
 # GitHub Storage Configuration
 GITHUB_ENABLED = github_storage.USE_GITHUB
 KIE_API_KEY = os.environ.get('KIE_API_KEY', '')
-KIE_API_BASE = 'https://api.kie.ai/api/v1'
+KIE_API_BASE = os.environ.get('KIE_API_BASE', 'https://api.kie.ai/api/v1')
+# Shared secret in the callBackUrl so only kie.ai can complete our tasks
+KIE_CALLBACK_TOKEN = os.environ.get('KIE_CALLBACK_TOKEN') or hashlib.sha256(f'kie-callback:{KIE_API_KEY}'.encode()).hexdigest()[:32]
 os.makedirs(DOWNLOADS_DIR, exist_ok=True)
 
 # Public URL for the deployed service
@@ -75,6 +99,173 @@ def get_channel_name(url):
     return 'unknown_channel'
 
 
+library = library_index.LibraryIndex()
+
+
+def library_add(local_path, rel_path, url=None, job=None):
+    """Record a file in the library index once it is in storage
+
+    Passing the job keeps the local copy pinned in the cache until it ends.
+    """
+    try:
+        size = os.path.getsize(local_path)
+    except OSError:
+        size = 0
+    library.add_file(rel_path, size, url)
+    # The local copy of an uploaded file is now a cache entry that may be evicted
+    if file_cache and url and os.path.abspath(local_path) == os.path.abspath(os.path.join(DOWNLOADS_DIR, rel_path)):
+        file_cache.add(rel_path, owner=job.id if job else None)
+
+
+similarity_index = similarity.SimilarityIndex()
+
+
+def library_remove(rel_path):
+    """Forget a file or folder in the library, the similarity index and the cache"""
+    library.remove(rel_path)
+    similarity_index.remove(rel_path)
+    if file_cache:
+        file_cache.forget(rel_path)
+
+
+# GitHub mode: DOWNLOADS_DIR is a bounded LRU cache of repo files
+file_cache = audio_cache.DiskCache(DOWNLOADS_DIR, github_storage.download_from_github) if GITHUB_ENABLED else None
+
+
+def fetch_storage_file(rel_path, job=None):
+    """Local path of a stored file, fetched from GitHub on a cache miss
+
+    Passing the job pins the file until the job finishes.
+
+    Returns:
+        Local path, or None if the file is not in storage
+    """
+    if file_cache:
+        return file_cache.get(rel_path, owner=job.id if job else None)
+    local_path = os.path.join(DOWNLOADS_DIR, rel_path)
+    return local_path if os.path.exists(local_path) else None
+
+
+def release_storage_file(rel_path, job):
+    """Unpin a file fetched with fetch_storage_file(rel_path, job) before the job ends"""
+    if file_cache:
+        file_cache.unpin(rel_path, job.id)
+
+
+def release_job_files(fn):
+    """Wrap a job runner so files it pinned in the cache are released when it ends"""
+    def run(job, params):
+        try:
+            return fn(job, params)
+        finally:
+            if file_cache:
+                file_cache.release(job.id)
+    return run
+
+
+def index_stem_features(local_path, rel_path):
+    """Analyze a stem and add it to the similarity index
+
+    Returns:
+        True on success - failures are logged and never fail the caller
+    """
+    with metrics.span('similarity') as span:
+        try:
+            similarity_index.add(rel_path, similarity.stem_features(local_path))
+            return True
+        except Exception as e:
+            span.fail()
+            print(f'Similarity analysis failed for {rel_path}: {e}')
+            return False
+
+
+def scan_storage():
+    """List every file in the active storage backend for a library rebuild
+
+    Returns:
+        List of dicts with 'path' (relative to the storage root), 'size' and
+        optionally 'url'/'updated', or None if GitHub could not be listed
+    """
+    if GITHUB_ENABLED:
+        return github_storage.list_github_tree()
+
+    if local_watcher.mode:
+        return local_watcher.files()
+
+    files = []
+    for root, dirs, filenames in os.walk(DOWNLOADS_DIR):
+        # Skip in-progress .temp_download_* folders
+        dirs[:] = [d for d in dirs if not d.startswith('.')]
+        for filename in filenames:
+            full_path = os.path.join(root, filename)
+            try:
+                stat = os.stat(full_path)
+            except OSError:
+                continue
+            files.append({
+                'path': os.path.relpath(full_path, DOWNLOADS_DIR).replace(os.sep, '/'),
+                'size': stat.st_size,
+                'updated': stat.st_mtime
+            })
+    return files
+
+
+# Follow DOWNLOADS_DIR for changes instead of walking it per request. In local
+# mode it is the library's storage, so changes (including files dropped in by
+# hand and audio-separator output) are fed to the index. With GitHub it only
+# holds working files and the watcher just keeps the local byte counts.
+if GITHUB_ENABLED:
+    local_watcher = storage_watcher.StorageWatcher(DOWNLOADS_DIR)
+else:
+    local_watcher = storage_watcher.StorageWatcher(
+        DOWNLOADS_DIR,
+        on_file=lambda path, size, mtime: library.add_file(path, size, updated=mtime),
+        on_remove=library_remove
+    )
+
+
+def start_local_watcher():
+    """Initial scan of DOWNLOADS_DIR, reconcile the library with it, then watch"""
+    local_watcher.start()
+    if not GITHUB_ENABLED:
+        rebuild_library()
+    else:
+        # Copies left from before a restart count against the cache budget
+        on_disk = [f['path'] for f in local_watcher.files()]
+        file_cache.adopt([row['path'] for row in library.rows(on_disk)])
+
+
+# Seconds between background refreshes of the GitHub repo size
+REPO_SIZE_REFRESH_SECONDS = int(os.environ.get('REPO_SIZE_REFRESH_SECONDS', 600))
+
+repo_size = {'kb': None, 'updated': None}
+
+
+def refresh_repo_size():
+    """Keep repo_size current so /storage-info never waits on the GitHub API"""
+    while True:
+        size_kb = github_storage.get_repo_size()
+        if size_kb is not None:
+            repo_size['kb'] = size_kb
+            repo_size['updated'] = time.time()
+        time.sleep(REPO_SIZE_REFRESH_SECONDS)
+
+
+def rebuild_library():
+    """Rebuild the library index from storage
+
+    Returns:
+        Number of files indexed, or None if storage could not be listed
+    """
+    files = scan_storage()
+    if files is None:
+        print('Library rebuild skipped: storage listing failed')
+        return None
+    count = library.rebuild(files)
+    print(f'Library index rebuilt: {count} files')
+    return count
+
+
 def detect_bpm_and_key(audio_file):
     """Detect BPM and musical key from audio file"""
     # Try essentia first (more accurate), fallback to librosa
@@ -170,7 +361,7 @@ def detect_bpm_and_key(audio_file):
             return None, None
 
 
-def run_ytdlp(url, channel_dir, to_mp3, progress_queue, mode='channel'):
+def run_ytdlp(url, channel_dir, to_mp3, job, mode='channel'):
     try:
         cmd = ['yt-dlp', '--no-warnings', '--ignore-errors', '--progress']
 
@@ -191,40 +382,50 @@ def run_ytdlp(url, channel_dir, to_mp3, progress_queue, mode='channel'):
         else:  # channel
             mode_label = 'Entire Channel'
 
-        # Download to temporary location first
-        temp_dir = os.path.join(channel_dir, '.temp_download')
+        # Download to a per-job temporary location first so concurrent
+        # downloads into the same channel don't organize each other's files.
+        # The folder and its download archive survive restarts, so a resumed
+        # job skips videos yt-dlp already finished.
+        channel_name = os.path.basename(channel_dir)
+        temp_dir = os.path.join(channel_dir, f'.temp_download_{job.id}')
         os.makedirs(temp_dir, exist_ok=True)
+        cmd.extend(['--download-archive', os.path.join(temp_dir, 'archive.txt')])
         cmd.extend(['-o', os.path.join(temp_dir, '%(title)s.%(ext)s'), url])
 
-        progress_queue.put({'status': f'Starting {mode_label.lower()} download...'})
-
-        process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
-                                universal_newlines=True, bufsize=1)
+        job.put({'status': f'Starting {mode_label.lower()} download...'})
 
         beat_names = []
+        current_item = None
 
-        for line in process.stdout:
-            line = line.strip()
-            if '[download]' in line and '%' in line:
-                match = re.search(r'(\d+\.?\d*)%', line)
-                if match:
-                    progress_queue.put({'progress': float(match.group(1))})
-                if 'Destination:' in line:
+        with metrics.span('ytdlp') as span:
+            process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                                       universal_newlines=True, bufsize=1)
+
+            for line in process.stdout:
+                line = line.strip()
+                if '[download]' in line and 'Destination:' in line:
                     filename = line.split('Destination:')[-1].strip()
-                    beat_name = os.path.basename(filename).replace('.mp3', '').replace('.mp4', '')
-                    progress_queue.put({'download': beat_name})
+                    beat_name = os.path.splitext(os.path.basename(filename))[0]
+                    current_item = beat_name
                     if beat_name not in beat_names:
+                        job.put({'download': beat_name})
                         beat_names.append(beat_name)
-            if '[download] 100%' in line:
-                progress_queue.put({'progress': 100})
-
-        process.wait()
+                elif '[download]' in line and '%' in line:
+                    # Progress lines arrive many times per second - the job's
+                    # progress bus keeps only the latest value per item
+                    match = re.search(r'(\d+\.?\d*)%', line)
+                    if match:
+                        job.put({'progress': float(match.group(1)), 'item': current_item})
+
+            process.wait()
+            span.add_bytes(sum(entry.stat().st_size for entry in os.scandir(temp_dir) if entry.is_file()))
+            if process.returncode != 0:
+                span.fail()
 
         # After download, organize files into proper beat folder structure
         # Expected: downloads/@ChannelName/BeatName/BeatName.mp3/isolated_samples/
-        progress_queue.put({'status': 'Organizing downloaded files...'})
+        job.put({'status': 'Organizing downloaded files...'})
 
-        organized_count = 0
         for filename in os.listdir(temp_dir):
             file_path = os.path.join(temp_dir, filename)
             if os.path.isfile(file_path) and (filename.endswith('.mp3') or filename.endswith('.mp4')):
@@ -244,19 +445,34 @@ def run_ytdlp(url, channel_dir, to_mp3, progress_queue, mode='channel'):
                 iso_dir = os.path.join(beat_folder, 'isolated_samples')
                 os.makedirs(iso_dir, exist_ok=True)
 
-                # Upload to GitHub if enabled
-                if GITHUB_ENABLED:
-                    repo_path = f'{channel_name}/{beat_name}/{filename}'
-                    progress_queue.put({'status': f'Uploading to GitHub: {filename}...'})
-                    public_url = github_storage.upload_to_github(target_path, repo_path)
-                    if public_url:
-                        progress_queue.put({'status': f'✓ Uploaded to GitHub: {filename}'})
-                    else:
-                        progress_queue.put({'error': f'Failed to upload {filename} to GitHub. Check environment variables.'})
+                job.mark_step(beat_name, 'downloaded', {'filename': filename})
+
+        # Upload everything this job organized, including files moved by a
+        # previous run that was interrupted before uploading them
+        downloaded = [(item, steps['downloaded']['filename'])
+                      for item, steps in job.steps.items() if 'downloaded' in steps]
+        for beat_name, filename in downloaded:
+            if job.step_done(beat_name, 'uploaded'):
+                continue
+
+            # Upload to GitHub if enabled
+            if GITHUB_ENABLED:
+                target_path = os.path.join(channel_dir, beat_name, filename)
+                repo_path = f'{channel_name}/{beat_name}/{filename}'
+                job.put({'status': f'Uploading to GitHub: {filename}...'})
+                public_url = github_storage.upload_to_github(target_path, repo_path)
+                if public_url:
+                    job.put({'status': f'✓ Uploaded to GitHub: {filename}'})
+                    library_add(target_path, repo_path, public_url)
+                    job.mark_step(beat_name, 'uploaded', {'url': public_url})
                 else:
-                    progress_queue.put({'status': f'Note: GitHub storage not enabled. Files stored locally only.'})
+                    job.put({'error': f'Failed to upload {filename} to GitHub. Check environment variables.'})
+            else:
+                job.put({'status': f'Note: GitHub storage not enabled. Files stored locally only.'})
+                library_add(os.path.join(channel_dir, beat_name, filename), f'{channel_name}/{beat_name}/{filename}')
+                job.mark_step(beat_name, 'uploaded')
 
-                organized_count += 1
+        organized_count = len(downloaded)
 
         # Remove the temp download folder
         try:
@@ -267,12 +483,12 @@ def run_ytdlp(url, channel_dir, to_mp3, progress_queue, mode='channel'):
         if process.returncode == 0:
             count = organized_count if organized_count > 0 else len(beat_names)
             msg = f'{count} video{"s" if count != 1 else ""} downloaded!' if count > 0 else 'Download complete!'
-            progress_queue.put({'complete': True, 'message': msg, 'count': count})
+            job.put({'complete': True, 'message': msg, 'count': count})
         else:
-            progress_queue.put({'complete': True, 'message': 'Download finished with warnings.'})
+            job.put({'complete': True, 'message': 'Download finished with warnings.'})
 
     except Exception as e:
-        progress_queue.put({'error': str(e), 'complete': True})
+        job.put({'error': str(e), 'complete': True})
 
 
 def scan_for_mp3s(folder_path):
@@ -284,18 +500,18 @@ def scan_for_mp3s(folder_path):
     return mp3_files
 
 
-def run_stem_isolation(channel, progress_queue, beat=None):
+def run_stem_isolation(channel, job, beat=None):
     try:
         channel_dir = os.path.join(DOWNLOADS_DIR, channel)
 
         # For GitHub: Download file if not present locally
         if GITHUB_ENABLED:
-            progress_queue.put({'status': 'Checking cloud storage...'})
+            job.put({'status': 'Checking cloud storage...'})
 
         # Migrate any old files from downloads subfolder to proper structure
         old_downloads_dir = os.path.join(channel_dir, 'downloads')
         if os.path.exists(old_downloads_dir):
-            progress_queue.put({'status': 'Migrating old files to new structure...'})
+            job.put({'status': 'Migrating old files to new structure...'})
             for filename in os.listdir(old_downloads_dir):
                 file_path = os.path.join(old_downloads_dir, filename)
                 if os.path.isfile(file_path) and (filename.endswith('.mp3') or filename.endswith('.mp4')):
@@ -323,32 +539,23 @@ def run_stem_isolation(channel, progress_queue, beat=None):
             )
 
             if not local_has_files:
-                progress_queue.put({'status': 'No local files found, checking GitHub...'})
+                job.put({'status': 'No local files found, checking GitHub...'})
                 # List all beat files from GitHub for this channel
                 all_files = github_storage.list_github_files(channel)
 
-                # Group by beat folder
-                beats = {}
+                # Originals are fetched one beat at a time in the loop below
                 for file_info in all_files:
                     parts = file_info['path'].split('/')
                     if len(parts) >= 3:
-                        beat = parts[1]
+                        beat_dir = parts[1]
                         filename = parts[2]
                         # Only get original MP3s (not isolated samples or covers)
                         if filename.endswith('.mp3') and 'isolated_samples' not in file_info['path'] and 'ai_covers' not in file_info['path']:
-                            if beat not in beats:
-                                beats[beat] = filename
                             # If specific beat requested, only include that one
-                            if beat is None or beat == beat:
-                                # Download the file
-                                repo_path = f'{channel}/{beat}/{filename}'
-                                local_path = os.path.join(channel_dir, beat, filename)
-                                os.makedirs(os.path.dirname(local_path), exist_ok=True)
-
-                                progress_queue.put({'status': f'Downloading {beat} from GitHub...'})
-                                if github_storage.download_from_github(repo_path, local_path):
-                                    progress_queue.put({'status': f'Downloaded: {beat}'})
-                                    mp3_files.append((beat, local_path))
+                            if beat is None or beat_dir == beat:
+                                repo_path = f'{channel}/{beat_dir}/{filename}'
+                                local_path = os.path.join(channel_dir, beat_dir, filename)
+                                mp3_files.append((beat_dir, local_path, repo_path))
 
         # Also scan local filesystem for any additional files
         if os.path.exists(channel_dir):
@@ -361,77 +568,116 @@ def run_stem_isolation(channel, progress_queue, beat=None):
                     # Look for MP3 with same name as folder
                     mp3_path = os.path.join(beat_folder, item + '.mp3')
 
-                    # If GitHub enabled and file doesn't exist locally, try to download it
-                    if GITHUB_ENABLED and not os.path.exists(mp3_path):
-                        repo_path = f'{channel}/{item}/{item}.mp3'
-                        if github_storage.file_exists_in_github(repo_path):
-                            progress_queue.put({'status': f'Downloading {item} from GitHub...'})
-                            if github_storage.download_from_github(repo_path, mp3_path):
-                                progress_queue.put({'status': f'Downloaded: {item}'})
-
-                    if os.path.exists(mp3_path):
-                        # If specific beat requested, only include that one (avoid duplicates)
-                        if beat is None or item == beat:
-                            if not any(item == b for b, _ in mp3_files):
-                                mp3_files.append((item, mp3_path))
+                    # If specific beat requested, only include that one (avoid duplicates)
+                    if beat is None or item == beat:
+                        if any(item == b for b, _, _ in mp3_files):
+                            continue
+                        if GITHUB_ENABLED:
+                            # In storage even if evicted locally - fetched when its turn comes
+                            mp3_files.append((item, mp3_path, f'{channel}/{item}/{item}.mp3'))
+                        elif os.path.exists(mp3_path):
+                            mp3_files.append((item, mp3_path, None))
 
         if not mp3_files:
-            progress_queue.put({'error': 'No MP3 files found', 'complete': True})
+            job.put({'error': 'No MP3 files found', 'complete': True})
             return
 
         model = 'htdemucs.yaml'
         total = len(mp3_files)
-        
-        for i, (beat_name, mp3_file) in enumerate(mp3_files, 1):
-            progress_queue.put({'status': f'[{i}/{total}] Analyzing {beat_name}...'})
 
-            # Detect BPM and key from original audio
-            progress_queue.put({'status': f'Detecting BPM and key...'})
-            bpm, key = detect_bpm_and_key(mp3_file)
-            bpm_key_tag = f"{bpm}BPM_{key}" if bpm and key else ""
+        # Rename stems to desired format: StemType_[Beat Name]_XXXBPM_Xmaj.mp3
+        stem_prefix_map = {
+            '(Vocals)': 'Vocals',
+            '(Instrumental)': 'Other',
+            '(Drums)': 'Drums',
+            '(Other)': 'Other',
+            '(Bass)': 'Bass'
+        }
+
+        pinned = []
+        for i, (beat_name, mp3_file, repo_path) in enumerate(mp3_files, 1):
+            # Only the current beat's original and stems are pinned in the
+            # cache, so a channel larger than CACHE_MAX_BYTES is still bounded by it
+            for rel_path in pinned:
+                release_storage_file(rel_path, job)
+            pinned = []
+
+            # Resumed jobs skip beats a previous run already finished
+            if job.step_done(beat_name, 'uploaded'):
+                job.put({'status': f'[{i}/{total}] Already done: {beat_name}'})
+                continue
+
+            if repo_path:
+                if not os.path.exists(mp3_file):
+                    job.put({'status': f'[{i}/{total}] Downloading {beat_name} from GitHub...'})
+                if not fetch_storage_file(repo_path, job):
+                    job.put({'status': f'[{i}/{total}] Skipped {beat_name}: original not found in storage'})
+                    continue
+                pinned.append(repo_path)
+            job.mark_step(beat_name, 'downloaded')
 
             # Create isolated_samples folder in beat folder
             beat_folder = os.path.join(channel_dir, beat_name)
             iso_dir = os.path.join(beat_folder, 'isolated_samples')
             os.makedirs(iso_dir, exist_ok=True)
 
-            if bpm_key_tag:
-                progress_queue.put({'status': f'Detected: {bpm} BPM, Key: {key}'})
+            if job.step_done(beat_name, 'analyzed'):
+                analysis = job.step_data(beat_name, 'analyzed')
+                bpm, key = analysis['bpm'], analysis['key']
+            else:
+                job.put({'status': f'[{i}/{total}] Analyzing {beat_name}...'})
 
-            cmd = [
-                'audio-separator',
-                mp3_file,
-                '-m', model,
-                '--output_dir', iso_dir,
-                '--output_format', 'mp3',
-            ]
+                # Detect BPM and key from original audio
+                job.put({'status': f'Detecting BPM and key...'})
+                with metrics.span('detect_bpm_and_key'):
+                    bpm, key = detect_bpm_and_key(mp3_file)
+                job.mark_step(beat_name, 'analyzed', {'bpm': bpm, 'key': key})
+            bpm_key_tag = f"{bpm}BPM_{key}" if bpm and key else ""
 
-            progress_queue.put({'status': f'Starting AI stem isolation (~30-60s per beat)...'})
+            if bpm_key_tag:
+                job.put({'status': f'Detected: {bpm} BPM, Key: {key}'})
 
-            result = subprocess.run(cmd, capture_output=True, text=True, timeout=300)
+            separated = job.step_data(beat_name, 'separated')
+            fresh = False
+            if separated and all(os.path.exists(os.path.join(iso_dir, name)) for name in separated['stems']):
+                stem_names = separated['stems']
+                job.put({'status': f'Stems already separated for {beat_name}'})
+            else:
+                fresh = True
+                cmd = [
+                    'audio-separator',
+                    mp3_file,
+                    '-m', model,
+                    '--output_dir', iso_dir,
+                    '--output_format', 'mp3',
+                ]
+
+                job.put({'status': f'Starting AI stem isolation (~30-60s per beat)...'})
+
+                with metrics.span('separate') as span:
+                    result = subprocess.run(cmd, capture_output=True, text=True, timeout=300)
+                    span.add_bytes(os.path.getsize(mp3_file))
+                    if result.returncode != 0:
+                        span.fail()
+
+                # Check for errors in stderr even if returncode is 0
+                if result.stderr and ('ERROR' in result.stderr or 'Failed' in result.stderr):
+                    job.put({'error': f"audio-separator error: {result.stderr[-500:]}"})
+                    continue
 
-            # Check for errors in stderr even if returncode is 0
-            if result.stderr and ('ERROR' in result.stderr or 'Failed' in result.stderr):
-                progress_queue.put({'error': f"audio-separator error: {result.stderr[-500:]}"})
-                continue
+                # Check if stem files were actually created
+                stem_files = [f for f in os.listdir(iso_dir) if f.endswith('.mp3')] if os.path.exists(iso_dir) else []
 
-            # Check if stem files were actually created
-            stem_files = [f for f in os.listdir(iso_dir) if f.endswith('.mp3')] if os.path.exists(iso_dir) else []
+                if not stem_files:
+                    error_msg = result.stderr[-500:] if result.stderr else "No output files created. Check audio-separator installation."
+                    job.put({'error': f"No stem files created for {beat_name}. Error: {error_msg}"})
+                    continue
 
-            if not stem_files:
-                error_msg = result.stderr[-500:] if result.stderr else "No output files created. Check audio-separator installation."
-                progress_queue.put({'error': f"No stem files created for {beat_name}. Error: {error_msg}"})
-                continue
+                if result.returncode != 0:
+                    job.put({'error': f"Failed: {beat_name} - {result.stderr[-200:] if result.stderr else 'Unknown error'}"})
+                    continue
 
-            if result.returncode == 0 and stem_files:
-                # Rename stems to desired format: StemType_[Beat Name]_XXXBPM_Xmaj_htdemucs.mp3
-                stem_prefix_map = {
-                    '(Vocals)': 'Vocals',
-                    '(Instrumental)': 'Other',
-                    '(Drums)': 'Drums',
-                    '(Other)': 'Other',
-                    '(Bass)': 'Bass'
-                }
+                stem_names = []
                 for f in stem_files:
                     new_name = f
                     # Find stem type from audio-separator output
@@ -444,29 +690,112 @@ def run_stem_isolation(channel, progress_queue, beat=None):
                                 new_name = f'{prefix}_{beat_name}.mp3'
                             break
                     if new_name != f:
-                        src = os.path.join(iso_dir, f)
-                        dst = os.path.join(iso_dir, new_name)
-                        os.rename(src, dst)
-                        progress_queue.put({'status': f'Created: {new_name}'})
+                        os.rename(os.path.join(iso_dir, f), os.path.join(iso_dir, new_name))
+                        job.put({'status': f'Created: {new_name}'})
+                        stem_names.append(new_name)
+
+                job.mark_step(beat_name, 'separated', {'stems': stem_names})
+
+            # Waveform peaks and a low-bitrate preview per stem for browsing
+            preview_dir = os.path.join(beat_folder, 'previews')
+            preview_files = []
+            for new_name in stem_names:
+                names = previews.preview_names(new_name)
+                if not fresh and all(os.path.exists(os.path.join(preview_dir, n)) for n in names):
+                    preview_files.extend(names)
+                    continue
+                with metrics.span('preview') as span:
+                    try:
+                        preview_files.extend(previews.make_preview(os.path.join(iso_dir, new_name), preview_dir))
+                    except Exception as e:
+                        span.fail()
+                        job.put({'status': f'Preview skipped for {new_name}: {e}'})
+
+            # Upload stems and previews to GitHub if enabled
+            uploaded_all = True
+            outputs = [(iso_dir, 'isolated_samples', name) for name in stem_names]
+            outputs += [(preview_dir, 'previews', name) for name in preview_files]
+            for folder, subdir, new_name in outputs:
+                stem_path = os.path.join(folder, new_name)
+                repo_path = f'{channel}/{beat_name}/{subdir}/{new_name}'
+                if GITHUB_ENABLED:
+                    job.put({'status': f'Uploading {new_name} to GitHub...'})
+                    upload_url = github_storage.upload_to_github(stem_path, repo_path)
+                    if upload_url:
+                        job.put({'status': f'✓ Uploaded: {new_name}'})
+                        library_add(stem_path, repo_path, upload_url, job)
+                        pinned.append(repo_path)
+                    else:
+                        job.put({'error': f'Failed to upload {new_name} to GitHub'})
+                        uploaded_all = False
+                else:
+                    library_add(stem_path, repo_path)
 
-                        # Upload stem to GitHub if enabled
-                        if GITHUB_ENABLED:
-                            repo_path = f'{channel}/{beat_name}/isolated_samples/{new_name}'
-                            progress_queue.put({'status': f'Uploading {new_name} to GitHub...'})
-                            upload_url = github_storage.upload_to_github(dst, repo_path)
-                            if upload_url:
-                                progress_queue.put({'status': f'✓ Uploaded: {new_name}'})
-                            else:
-                                progress_queue.put({'error': f'Failed to upload {new_name} to GitHub'})
+            # Feature vectors for /similar - new stems replace any older analysis
+            for new_name in stem_names:
+                repo_path = f'{channel}/{beat_name}/isolated_samples/{new_name}'
+                if fresh or repo_path not in similarity_index:
+                    job.put({'status': f'Analyzing {new_name} for similarity search...'})
+                    index_stem_features(os.path.join(iso_dir, new_name), repo_path)
 
-                progress_queue.put({'status': f'Completed: {beat_name}'})
-            else:
-                progress_queue.put({'error': f"Failed: {beat_name} - {result.stderr[-200:] if result.stderr else 'Unknown error'}"})
+            if uploaded_all:
+                job.mark_step(beat_name, 'uploaded')
+            job.put({'status': f'Completed: {beat_name}'})
+
+        job.put({'complete': True, 'message': f'Stem isolation complete! ({total}/{total} beats processed)'})
 
-        progress_queue.put({'complete': True, 'message': f'Stem isolation complete! ({total}/{total} beats processed)'})
+    except Exception as e:
+        job.put({'error': str(e), 'complete': True})
+
+
+def run_similarity_backfill(job):
+    """Analyze every library stem that has no feature vector yet"""
+    try:
+        pending = [stem for stem in library.files('stem') if stem['path'] not in similarity_index]
+        total = len(pending)
+        job.put({'status': f'{total} stems to analyze'})
+
+        analyzed = 0
+        for i, stem in enumerate(pending, 1):
+            local_path = fetch_storage_file(stem['path'], job)
+            if local_path and index_stem_features(local_path, stem['path']):
+                analyzed += 1
+            if file_cache:
+                file_cache.release(job.id)
+            job.put({'progress': round(i / total * 100, 1), 'item': stem['name']})
+
+        job.put({'complete': True, 'message': f'Analyzed {analyzed}/{total} stems'})
 
     except Exception as e:
-        progress_queue.put({'error': str(e), 'complete': True})
+        job.put({'error': str(e), 'complete': True})
+
+
+job_scheduler = scheduler.Scheduler()
+job_registry = jobs.JobRegistry(job_scheduler, job_store.JobStore())
+job_registry.register('download', lambda job, p: run_ytdlp(p['url'], p['channel_dir'], p['toMp3'], job, p['mode']), 'network')
+job_registry.register('isolate', release_job_files(lambda job, p: run_stem_isolation(p['folder'], job, p['beat'])), 'cpu')
+job_registry.register('cover', release_job_files(lambda job, p: run_kie_cover(p['channel'], p['beat'], p['stems'], p['genre'], job, p.get('fresh', False), p.get('reduced', False))), 'remote')
+job_registry.register('yue-cover', lambda job, p: run_yue_cover(p['channel'], p['beat'], p['stems'], p['genre'], job), 'cpu')
+job_registry.register('cover-batch', lambda job, p: run_cover_batch(p['channel'], p['pairs'], p['stems'], job, p.get('fresh', False), p.get('reduced', False)), 'remote')
+job_registry.register('similarity', release_job_files(lambda job, p: run_similarity_backfill(job)), 'cpu')
+
+
+def submit_job(kind, key, params, priority):
+    """Submit to the registry, turning a full queue into a 503 response"""
+    try:
+        job, created = job_registry.submit(kind, key, params, priority)
+    except scheduler.QueueFull as e:
+        response = jsonify({'error': f'Server busy: {e}. Please try again later.'})
+        response.headers['Retry-After'] = '60'
+        return response, 503
+
+    return jsonify({
+        'jobId': job.id,
+        'attached': not created,
+        'status': job.status,
+        'statusUrl': f'/jobs/{job.id}',
+        'eventsUrl': f'/jobs/{job.id}/events'
+    }), 202
 
 
 @app.route('/')
@@ -488,22 +817,12 @@ def download():
     channel_dir = os.path.join(DOWNLOADS_DIR, channel_name)
     os.makedirs(channel_dir, exist_ok=True)
 
-    progress_queue = queue.Queue()
-    thread = threading.Thread(target=run_ytdlp, args=(url, channel_dir, to_mp3, progress_queue, mode))
-    thread.daemon = True
-    thread.start()
-
-    def generate():
-        while True:
-            try:
-                msg = progress_queue.get(timeout=1)
-                yield f"data: {json.dumps(msg)}\n\n"
-                if msg.get('complete'):
-                    break
-            except queue.Empty:
-                yield ": keepalive\n\n"
+    # Single videos jump ahead of whole-channel downloads
+    default_priority = {'video': scheduler.PRIORITY_HIGH, 'playlist': scheduler.PRIORITY_NORMAL}.get(mode, scheduler.PRIORITY_LOW)
+    priority = scheduler.parse_priority(data.get('priority'), default_priority)
 
-    return Response(generate(), mimetype='text/event-stream')
+    return submit_job('download', jobs.download_key(url, mode, to_mp3),
+                      {'url': url, 'channel_dir': channel_dir, 'toMp3': to_mp3, 'mode': mode}, priority)
 
 
 @app.route('/isolate', methods=['POST'])
@@ -515,541 +834,874 @@ def isolate():
     if not folder:
         return jsonify({'error': 'No folder'}), 400
 
-    progress_queue = queue.Queue()
-    thread = threading.Thread(target=run_stem_isolation, args=(folder, progress_queue, beat))
-    thread.daemon = True
-    thread.start()
+    default_priority = scheduler.PRIORITY_HIGH if beat else scheduler.PRIORITY_LOW
+    priority = scheduler.parse_priority(data.get('priority'), default_priority)
 
-    def generate():
-        while True:
-            try:
-                msg = progress_queue.get(timeout=1)
-                yield f"data: {json.dumps(msg)}\n\n"
-                if msg.get('complete'):
-                    break
-            except queue.Empty:
-                yield ": keepalive\n\n"
-
-    return Response(generate(), mimetype='text/event-stream')
+    return submit_job('isolate', jobs.isolate_key(folder, beat), {'folder': folder, 'beat': beat}, priority)
 
 
 @app.route('/downloads')
 def list_downloads():
-    """List all channels with beat counts - reads from GitHub when enabled"""
-    folders = {}
-
+    """List all channels with beat counts from the library index"""
     try:
-        if GITHUB_ENABLED:
-            # Read from GitHub storage
-            all_files = github_storage.list_github_files('')
-
-            # Filter to only get actual beat MP3 files (not test files, isolated samples, etc.)
-            beat_files = [f for f in all_files if f['name'].endswith('.mp3')
-                         and 'isolated_samples' not in f['path']
-                         and 'ai_covers' not in f['path']]
-
-            for file_info in beat_files:
-                # Path format: channel/beat/beat.mp3
-                parts = file_info['path'].split('/')
-                if len(parts) >= 3:
-                    channel = parts[0]
-                    beat = parts[1]  # beat folder name
-
-                    if channel not in folders:
-                        folders[channel] = {'name': channel, 'count': 0, 'hasIsolated': False, '_beats': set()}
-
-                    # Count unique beats
-                    folders[channel]['_beats'].add(beat)
-
-            # Check if has isolated samples for this channel
-            if any('isolated_samples' in f['path'] for f in all_files):
-                folders[channel]['hasIsolated'] = True
-
-            # Build result
-            result = []
-            for channel, data in folders.items():
-                result.append({
-                    'name': data['name'],
-                    'count': len(data['_beats']),
-                    'hasIsolated': data['hasIsolated']
-                })
-            return jsonify(result)
-
-        else:
-            # Local filesystem fallback
-            for item in os.listdir(DOWNLOADS_DIR):
-                item_path = os.path.join(DOWNLOADS_DIR, item)
-                if os.path.isdir(item_path):
-                    beat_count = 0
-                    has_isolated = False
-                    for beat_folder in os.listdir(item_path):
-                        if beat_folder == 'downloads':
-                            continue
-                        beat_path = os.path.join(item_path, beat_folder)
-                        if os.path.isdir(beat_path):
-                            mp3_file = os.path.join(beat_path, beat_folder + '.mp3')
-                            if os.path.exists(mp3_file):
-                                beat_count += 1
-                                iso_dir = os.path.join(beat_path, 'isolated_samples')
-                                if os.path.exists(iso_dir) and os.listdir(iso_dir):
-                                    has_isolated = True
-                    folders[item] = {'name': item, 'count': beat_count, 'hasIsolated': has_isolated}
-
-            return jsonify(list(folders.values()))
+        return jsonify(library.channels())
 
     except Exception as e:
         print(f"Error listing downloads: {e}")
         return jsonify([])
 
 
-@app.route('/beats/<channel>')
-def list_beats(channel):
-    """List beats for a channel - reads from GitHub when enabled"""
-    beats = {}
+# Page size limits for paginated listings
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
 
-    try:
-        if GITHUB_ENABLED:
-            # Read from GitHub storage
-            all_files = github_storage.list_github_files(channel)
 
-            for file_info in all_files:
-                # Path format: channel/beat/file.mp3 or channel/beat/isolated_samples/file.mp3
-                parts = file_info['path'].split('/')
-                if len(parts) >= 2:
-                    beat = parts[1]
-
-                    if beat and beat not in beats:
-                        beats[beat] = {'name': beat, 'hasIsolated': False}
+def encode_cursor(after):
+    """Opaque pagination cursor for the last key of a page"""
+    if after is None:
+        return None
+    return base64.urlsafe_b64encode(json.dumps(after).encode()).decode()
 
-                    # Check if has isolated samples
-                    if len(parts) > 2 and 'isolated_samples' in file_info['path']:
-                        beats[beat]['hasIsolated'] = True
 
-            return jsonify(list(beats.values()))
+def decode_cursor(cursor, fields=1):
+    """Inverse of encode_cursor - raises ValueError for a malformed cursor
 
-        else:
-            # Local filesystem fallback
-            channel_dir = os.path.join(DOWNLOADS_DIR, channel)
-            if os.path.exists(channel_dir):
-                for item in os.listdir(channel_dir):
-                    if item == 'downloads':
-                        continue
-                    beat_folder = os.path.join(channel_dir, item)
-                    if os.path.isdir(beat_folder):
-                        mp3_path = os.path.join(beat_folder, item + '.mp3')
-                        if os.path.exists(mp3_path):
-                            iso_dir = os.path.join(beat_folder, 'isolated_samples')
-                            has_isolated = os.path.exists(iso_dir) and os.listdir(iso_dir)
-                            beats[item] = {'name': item, 'hasIsolated': has_isolated}
-
-            return jsonify(list(beats.values()))
+    fields is the shape the listing pages by: 1 for a name, more for a list
+    of that many names (e.g. channel, beat, stem).
+    """
+    if not cursor:
+        return None
+    try:
+        after = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except Exception:
+        raise ValueError('Invalid cursor')
+    if fields == 1:
+        valid = isinstance(after, str)
+    else:
+        valid = (isinstance(after, list) and len(after) == fields
+                 and all(isinstance(part, str) for part in after))
+    if not valid:
+        raise ValueError('Invalid cursor')
+    return after
 
-    except Exception as e:
-        print(f"Error listing beats for {channel}: {e}")
-        return jsonify([])
 
+def page_size(default=DEFAULT_PAGE_SIZE):
+    try:
+        limit = int(request.args.get('limit', default))
+    except ValueError:
+        limit = default
+    return max(1, min(limit, MAX_PAGE_SIZE))
 
-@app.route('/samples')
-def list_samples():
-    """List all samples grouped by channel - reads from GitHub when enabled"""
-    samples_by_channel = {}
 
+def float_arg(name):
+    value = request.args.get(name)
     try:
-        if GITHUB_ENABLED:
-            # Read from GitHub storage
-            all_files = github_storage.list_github_files('')
+        return float(value) if value not in (None, '') else None
+    except ValueError:
+        return None
 
-            for file_info in all_files:
-                path_parts = file_info['path'].split('/')
 
-                # Only include files in isolated_samples folders
-                if len(path_parts) >= 4 and path_parts[2] == 'isolated_samples' and file_info['name'].endswith('.mp3'):
-                    channel = path_parts[0]
-                    beat = path_parts[1]
-                    filename = file_info['name']
+def cached_listing(build):
+    """Serve a library listing with an ETag derived from the library version
 
-                    if channel not in samples_by_channel:
-                        samples_by_channel[channel] = {'name': channel, 'stems': [], 'count': 0}
+    An unchanged library answers If-None-Match with 304 before any query runs.
+    """
+    query_hash = hashlib.sha1(request.full_path.encode()).hexdigest()[:12]
+    etag = f'lib-{library.version}-{query_hash}'
+    if etag in request.if_none_match:
+        response = Response(status=304)
+    else:
+        try:
+            response = jsonify(build())
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
 
-                    samples_by_channel[channel]['stems'].append({
-                        'name': filename,
-                        'beat': beat,
-                        'url': file_info['url']
-                    })
-                    samples_by_channel[channel]['count'] += 1
 
-            return jsonify(list(samples_by_channel.values()))
+@app.route('/beats/<channel>')
+def list_beats(channel):
+    """One page of beats for a channel from the library index
 
-        else:
-            # Local filesystem fallback
-            for item in os.listdir(DOWNLOADS_DIR):
-                item_path = os.path.join(DOWNLOADS_DIR, item)
-                if os.path.isdir(item_path):
-                    stems = []
-                    for beat_folder in os.listdir(item_path):
-                        if beat_folder == 'downloads':
-                            continue
-                        beat_path = os.path.join(item_path, beat_folder)
-                        if os.path.isdir(beat_path):
-                            iso_dir = os.path.join(beat_path, 'isolated_samples')
-                            if os.path.exists(iso_dir):
-                                for f in os.listdir(iso_dir):
-                                    if f.endswith('.mp3'):
-                                        stems.append({'name': f, 'beat': beat_folder})
-                    if stems:
-                        samples_by_channel[item] = {'name': item, 'stems': stems, 'count': len(stems)}
-
-            return jsonify(list(samples_by_channel.values()))
+    Query: cursor, limit. Returns {'items', 'nextCursor', 'version'}.
+    """
+    def build():
+        items, after = library.beats_page(channel, decode_cursor(request.args.get('cursor')), page_size())
+        return {'items': items, 'nextCursor': encode_cursor(after), 'version': library.version}
 
-    except Exception as e:
-        print(f"Error listing samples: {e}")
-        return jsonify([])
+    return cached_listing(build)
+
+
+@app.route('/samples')
+def list_samples():
+    """One page of stems across the library, filterable server-side
+
+    Query: channel, type (Vocals/Drums/Bass/Other), bpm_min, bpm_max, key
+    (e.g. Cmin), cursor, limit. Returns {'items', 'nextCursor', 'version'}.
+    """
+    def build():
+        stems, after = library.stems_page(
+            channel=request.args.get('channel') or None,
+            stem_type=request.args.get('type') or None,
+            bpm_min=float_arg('bpm_min'),
+            bpm_max=float_arg('bpm_max'),
+            key=sample_search.normalize_key(request.args.get('key')),
+            after=decode_cursor(request.args.get('cursor'), fields=3),
+            limit=page_size()
+        )
+        items = []
+        for stem in stems:
+            entry = {'name': stem['name'], 'channel': stem['channel'], 'beat': stem['beat'],
+                     'type': stem['type'], 'bpm': stem['bpm'], 'key': stem['key']}
+            if stem['url']:
+                entry['url'] = stem['url']
+            items.append(entry)
+        return {'items': items, 'nextCursor': encode_cursor(after), 'version': library.version}
+
+    return cached_listing(build)
+
+
+@app.route('/search')
+def search_samples():
+    """Find stems that fit a project's tempo and key, best match first
+
+    Query:
+        bpm, tolerance (default 3) - tempo window, also matched at half/double
+        tempo unless halfdouble=0
+        key (e.g. Amin or Ebmaj), keys=exact|relative|compatible (default
+        compatible: relative key and a fifth up/down on the Camelot wheel)
+        channel, type, limit (default 50)
+    """
+    started = time.time()
+    bpm = float_arg('bpm')
+    tolerance = float_arg('tolerance') or sample_search.DEFAULT_TOLERANCE
+    half_double = request.args.get('halfdouble', '1') not in ('0', 'false')
+    key = sample_search.normalize_key(request.args.get('key'))
+    key_mode = request.args.get('keys', 'compatible')
+
+    if request.args.get('key') and not key:
+        return jsonify({'error': 'Unknown key - use e.g. Amin, C#maj or Ebmin'}), 400
+    if key_mode not in sample_search.KEY_MODES:
+        return jsonify({'error': f"keys must be one of {', '.join(sample_search.KEY_MODES)}"}), 400
+    if bpm is None and not key:
+        return jsonify({'error': 'Give a bpm and/or a key'}), 400
+
+    keys = sample_search.matching_keys(key, key_mode) if key else None
+    bpm_ranges = None
+    if bpm is not None:
+        bpm_ranges = [(low, high) for _, low, high in sample_search.tempo_ranges(bpm, tolerance, half_double)]
+
+    candidates = library.search_stems(
+        bpm_ranges=bpm_ranges,
+        keys=list(keys) if keys else None,
+        channel=request.args.get('channel') or None,
+        stem_type=request.args.get('type') or None,
+        score=sample_search.score_terms(bpm, tolerance, keys, half_double)
+    )
+    ranked = sample_search.rank(candidates, bpm, tolerance, keys, half_double)[:page_size(50)]
+
+    items = []
+    for stem in ranked:
+        entry = {'name': stem['name'], 'channel': stem['channel'], 'beat': stem['beat'],
+                 'type': stem['type'], 'bpm': stem['bpm'], 'key': stem['key'],
+                 'score': stem['score'], 'match': stem['match']}
+        if stem['url']:
+            entry['url'] = stem['url']
+        items.append(entry)
+
+    return jsonify({
+        'items': items,
+        'candidates': len(candidates),
+        'keys': keys,
+        'tookMs': round((time.time() - started) * 1000, 1)
+    })
+
+
+@app.route('/similar/<channel>/<beat>/<stem>')
+def similar_stems(channel, beat, stem):
+    """Stems that sound most like one stem, across all channels
+
+    stem is a stem filename or a type (Drums, Bass, Vocals, Other).
+    Query: limit (default 10), sameBeat=1 to include the stem's own beat.
+    """
+    path = f'{channel}/{beat}/isolated_samples/{stem}'
+    if stem in library_index.STEM_TYPES:
+        matches = [s for s in library.files('stem', channel, beat) if s['type'] == stem]
+        if not matches:
+            return jsonify({'error': f'No {stem} stem for {beat}'}), 404
+        path = matches[0]['path']
+
+    exclude = None if request.args.get('sameBeat') == '1' else f'{channel}/{beat}/'
+    neighbours = similarity_index.nearest(path, page_size(10), exclude)
+    if neighbours is None:
+        return jsonify({'error': 'Stem has not been analyzed yet - run POST /similar/rebuild'}), 404
+
+    rows = {row['path']: row for row in library.rows([p for p, _ in neighbours])}
+    items = []
+    for neighbour_path, score in neighbours:
+        row = rows.get(neighbour_path)
+        if not row:
+            continue  # deleted from storage but not yet from the index
+        entry = {'name': row['name'], 'channel': row['channel'], 'beat': row['beat'],
+                 'type': row['type'], 'bpm': row['bpm'], 'key': row['key'], 'similarity': score}
+        if row['url']:
+            entry['url'] = row['url']
+        items.append(entry)
+
+    return jsonify({'stem': path, 'items': items})
+
+
+@app.route('/similar/rebuild', methods=['POST'])
+def similarity_rebuild():
+    """Analyze library stems that predate the similarity index (runs as a job)"""
+    return submit_job('similarity', ('similarity',), {}, scheduler.PRIORITY_LOW)
 
 
 @app.route('/stems/<channel>/<beat>')
 def list_stems(channel, beat):
-    """List stems for a beat - reads from GitHub when enabled"""
-    stems = {}
+    """List stems for a beat from the library index"""
+    stems = []
 
     try:
-        if GITHUB_ENABLED:
-            # Read from GitHub storage
-            all_files = github_storage.list_github_files(f'{channel}/{beat}/isolated_samples')
+        preview_urls = {row['name']: row['url'] or f"/serve-audio/{quote(row['path'])}"
+                        for row in library.files('preview', channel, beat)}
+
+        for stem in library.files('stem', channel, beat):
+            entry = {'name': stem['name'], 'type': stem['type']}
+            if GITHUB_ENABLED:
+                entry['url'] = stem['url']      # GitHub raw URL
+                entry['path'] = stem['path']    # GitHub path for reference
+            else:
+                entry['path'] = os.path.join(DOWNLOADS_DIR, stem['path'])
 
-            for file_info in all_files:
-                filename = file_info['name']
-                if filename.endswith('.mp3'):
-                    # Extract stem type from filename
-                    stem_type = 'Unknown'
-                    if filename.startswith('Vocals_'): stem_type = 'Vocals'
-                    elif filename.startswith('Drums_'): stem_type = 'Drums'
-                    elif filename.startswith('Bass_'): stem_type = 'Bass'
-                    elif filename.startswith('Other_'): stem_type = 'Other'
-
-                    stems[filename] = {
-                        'name': filename,
-                        'type': stem_type,
-                        'url': file_info['url'],  # GitHub raw URL
-                        'path': file_info['path']  # GitHub path for reference
-                    }
-
-            return jsonify(list(stems.values()))
+            # Waveform peaks JSON and short preview clip, when isolation made them
+            peaks_name, preview_name = previews.preview_names(stem['name'])
+            if peaks_name in preview_urls:
+                entry['peaksUrl'] = preview_urls[peaks_name]
+            if preview_name in preview_urls:
+                entry['previewUrl'] = preview_urls[preview_name]
+            stems.append(entry)
 
-        else:
-            # Local filesystem fallback
-            beat_path = os.path.join(DOWNLOADS_DIR, channel, beat)
-            iso_dir = os.path.join(beat_path, 'isolated_samples')
-            if os.path.exists(iso_dir):
-                for f in os.listdir(iso_dir):
-                    if f.endswith('.mp3'):
-                        stem_type = 'Unknown'
-                        if f.startswith('Vocals_'): stem_type = 'Vocals'
-                        elif f.startswith('Drums_'): stem_type = 'Drums'
-                        elif f.startswith('Bass_'): stem_type = 'Bass'
-                        elif f.startswith('Other_'): stem_type = 'Other'
-                        stems[f] = {
-                            'name': f,
-                            'type': stem_type,
-                            'path': os.path.join(iso_dir, f)
-                        }
-
-            return jsonify(list(stems.values()))
+        return jsonify(stems)
 
     except Exception as e:
         print(f"Error listing stems for {channel}/{beat}: {e}")
         return jsonify([])
 
 
+@app.route('/library/rebuild', methods=['POST'])
+def library_rebuild():
+    """Rebuild the library index from storage (after manual changes to the repo or disk)"""
+    count = rebuild_library()
+    if count is None:
+        return jsonify({'error': 'Could not list storage'}), 502
+    return jsonify({'success': True, 'files': count, 'version': library.version})
+
+
 # Note: PUBLIC_BASE_URL is already defined above (line 49)
 # Keeping this comment for reference - no redeclaration needed
 
 
-def upload_file_to_temp_host(file_path, progress_queue):
+def upload_file_to_temp_host(file_path, job):
     """Get public URL for a file - uses GitHub raw URL if GitHub is enabled"""
     try:
         # If GitHub storage is enabled, the file should already be uploaded
         # Get the GitHub raw URL directly
         if GITHUB_ENABLED:
-            downloads_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'downloads')
-            rel_path = os.path.relpath(file_path, downloads_dir)
+            rel_path = os.path.relpath(file_path, DOWNLOADS_DIR)
 
             # Check if file exists in GitHub
             if github_storage.file_exists_in_github(rel_path):
-                github_url = f'https://raw.githubusercontent.com/{github_storage.GITHUB_REPO}/{github_storage.GITHUB_BRANCH}/storage/{rel_path}'
-                progress_queue.put({'status': f'Using GitHub URL for file'})
+                github_url = f'{github_storage.GITHUB_RAW_BASE}/{github_storage.GITHUB_REPO}/{github_storage.GITHUB_BRANCH}/storage/{rel_path}'
+                job.put({'status': f'Using GitHub URL for file'})
                 return github_url
             else:
                 # Try to upload to GitHub first
-                progress_queue.put({'status': f'Uploading to GitHub for kie.ai...'})
+                job.put({'status': f'Uploading to GitHub for kie.ai...'})
                 public_url = github_storage.upload_to_github(file_path, rel_path)
                 if public_url:
+                    library_add(file_path, rel_path, public_url)
                     return public_url
                 else:
-                    progress_queue.put({'error': 'Failed to upload to GitHub. File may be too large (>100MB).'})
+                    job.put({'error': 'Failed to upload to GitHub. File may be too large (>100MB).'})
                     return None
 
         # Fallback to local file serving (for non-GitHub setups)
-        downloads_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'downloads')
-        rel_path = os.path.relpath(file_path, downloads_dir)
+        rel_path = os.path.relpath(file_path, DOWNLOADS_DIR)
 
-        safe_path = rel_path.replace(' ', '%20')
-        upload_url = f'{PUBLIC_BASE_URL}/serve-audio/{safe_path}'
+        upload_url = f'{PUBLIC_BASE_URL}/serve-audio/{quote(rel_path.replace(os.sep, "/"))}'
 
-        progress_queue.put({'status': f'Using local file (server must be publicly accessible)'})
+        job.put({'status': f'Using local file (server must be publicly accessible)'})
 
         # Check if this is a localhost URL - warn the user
         if 'localhost' in PUBLIC_BASE_URL or '127.0.0.1' in PUBLIC_BASE_URL:
-            progress_queue.put({'error': 'WARNING: Your server is running locally. kie.ai needs a public URL to access your files.'})
-            progress_queue.put({'error': 'Please install ngrok (brew install ngrok) and run: ngrok http 8080'})
-            progress_queue.put({'error': 'Then set PUBLIC_BASE_URL environment variable to the ngrok URL'})
-            progress_queue.put({'error': 'Example: export PUBLIC_BASE_URL=https://abc123.ngrok.io'})
+            job.put({'error': 'WARNING: Your server is running locally. kie.ai needs a public URL to access your files.'})
+            job.put({'error': 'Please install ngrok (brew install ngrok) and run: ngrok http 8080'})
+            job.put({'error': 'Then set PUBLIC_BASE_URL environment variable to the ngrok URL'})
+            job.put({'error': 'Example: export PUBLIC_BASE_URL=https://abc123.ngrok.io'})
             return None
 
         return upload_url
 
     except Exception as e:
-        progress_queue.put({'error': f"File path error: {str(e)}"})
+        job.put({'error': f"File path error: {str(e)}"})
         return None
 
 
-def run_kie_cover(channel, beat, selected_stems, genre, progress_queue):
-    """Generate AI cover using kie.ai Suno API with the selected stems"""
+def kie_record_info(task_id):
+    """Poll a kie.ai task's record-info
+
+    Returns:
+        The task's data object, or None if it could not be fetched
+    """
     try:
-        # Get stem file paths
-        beat_folder = os.path.join(DOWNLOADS_DIR, channel, beat)
-        iso_dir = os.path.join(beat_folder, 'isolated_samples')
-        os.makedirs(iso_dir, exist_ok=True)
+        status_response = requests.get(
+            f'{KIE_API_BASE}/generate/record-info?taskId={task_id}',
+            headers={'Authorization': f'Bearer {KIE_API_KEY}'},
+            timeout=10
+        )
+        status_result = status_response.json()
+    except (requests.RequestException, ValueError) as e:
+        print(f'kie.ai record-info error for {task_id}: {e}')
+        return None
+    if status_result.get('code') != 200:
+        return None
+    return status_result.get('data') or None
 
-        # Create output directory for AI covers
-        output_dir = os.path.join(beat_folder, 'ai_covers')
-        os.makedirs(output_dir, exist_ok=True)
 
-        # If GitHub enabled and no stems locally, download from GitHub
-        if GITHUB_ENABLED:
-            local_stems = [f for f in os.listdir(iso_dir) if f.endswith('.mp3')] if os.path.exists(iso_dir) else []
-            if not local_stems:
-                progress_queue.put({'status': 'Downloading stems from GitHub...'})
-                all_files = github_storage.list_github_files(f'{channel}/{beat}/isolated_samples')
-                for file_info in all_files:
-                    if file_info['name'].endswith('.mp3'):
-                        local_path = os.path.join(iso_dir, file_info['name'])
-                        if not os.path.exists(local_path):
-                            progress_queue.put({'status': f'Downloading {file_info["name"]}...'})
-                            github_storage.download_from_github(file_info['path'], local_path)
-                progress_queue.put({'status': 'Stems downloaded from GitHub'})
+kie_tracker = kie_tasks.KieTaskTracker(kie_record_info)
+kie_submit_limit = kie_tasks.RateLimit()
 
-        # Map stem types to filename prefixes
-        stem_type_to_prefix = {
-            'Vocals': 'Vocals',
-            'Sample': 'Other',
-            'Drums': 'Drums',
-            'Bass': 'Bass',
-            'Other': 'Other'
-        }
 
-        # Get all available stems
-        available_stems = []
-        if os.path.exists(iso_dir):
-            for f in os.listdir(iso_dir):
-                if f.endswith('.mp3'):
-                    for prefix_name, prefix in [('Vocals', 'Vocals_'), ('Drums', 'Drums_'),
-                                               ('Bass', 'Bass_'), ('Other', 'Other_')]:
-                        if f.startswith(prefix):
-                            available_stems.append({
-                                'type': prefix_name,
-                                'path': os.path.join(iso_dir, f),
-                                'name': f
-                            })
-                            break
+@app.route('/kie-callback', methods=['POST'])
+def kie_callback():
+    """Receive a kie.ai task result and wake the cover job waiting on it"""
+    if request.args.get('token') != KIE_CALLBACK_TOKEN:
+        return jsonify({'error': 'Invalid callback token'}), 403
 
-        if not available_stems:
-            progress_queue.put({'error': 'No stem files found. Please isolate stems first.'})
-            progress_queue.put({'complete': True})
-            return
+    task_id, task_data = kie_tasks.from_callback(request.get_json(silent=True) or {})
+    if not task_id:
+        return jsonify({'error': 'Not a task callback'}), 400
+
+    waiting = kie_tracker.deliver(task_id, task_data)
+    print(f'kie.ai callback: {task_id} {task_data["status"]}' + ('' if waiting else ' (no job waiting)'))
+    return jsonify({'status': 'received'})
+
+
+def select_cover_source(channel, beat, selected_stems, job, reduced=False):
+    """Pick the audio a cover is generated from, fetching stems from GitHub if needed
+
+    One selected stem is used as it is; several are mixed down. With reduced,
+    the upload-sized excerpt of that audio is sent instead. Mixes and excerpts
+    are built later by cover_source_url, only if they have to be uploaded.
+
+    Returns:
+        {'name', 'path', 'digest', 'stems'}, or None after reporting the failure to the job
+    """
+    iso_dir = os.path.join(DOWNLOADS_DIR, channel, beat, 'isolated_samples')
+    os.makedirs(iso_dir, exist_ok=True)
+
+    # If GitHub enabled and no stems locally, download from GitHub
+    if GITHUB_ENABLED:
+        local_stems = [f for f in os.listdir(iso_dir) if f.endswith('.mp3')] if os.path.exists(iso_dir) else []
+        if not local_stems:
+            job.put({'status': 'Downloading stems from GitHub...'})
+            all_files = github_storage.list_github_files(f'{channel}/{beat}/isolated_samples')
+            for file_info in all_files:
+                if file_info['name'].endswith('.mp3'):
+                    local_path = os.path.join(iso_dir, file_info['name'])
+                    if not os.path.exists(local_path):
+                        job.put({'status': f'Downloading {file_info["name"]}...'})
+                    fetch_storage_file(file_info['path'], job)
+            job.put({'status': 'Stems downloaded from GitHub'})
+
+    # Map stem types to filename prefixes
+    stem_type_to_prefix = {
+        'Vocals': 'Vocals',
+        'Sample': 'Other',
+        'Drums': 'Drums',
+        'Bass': 'Bass',
+        'Other': 'Other'
+    }
 
-        # Select the first available stem for upload
-        # Prioritize Vocals, then Drums, then Bass, then Other
+    # Get all available stems
+    available_stems = []
+    if os.path.exists(iso_dir):
+        for f in os.listdir(iso_dir):
+            if f.endswith('.mp3'):
+                for prefix_name, prefix in [('Vocals', 'Vocals_'), ('Drums', 'Drums_'),
+                                           ('Bass', 'Bass_'), ('Other', 'Other_')]:
+                    if f.startswith(prefix):
+                        available_stems.append({
+                            'type': prefix_name,
+                            'path': os.path.join(iso_dir, f),
+                            'name': f
+                        })
+                        break
+
+    if not available_stems:
+        job.put({'error': 'No stem files found. Please isolate stems first.'})
+        job.put({'complete': True})
+        return None
+
+    selected_types = {stem_type_to_prefix.get(s.get('type') if isinstance(s, dict) else s)
+                      for s in selected_stems}
+    chosen = [stem for stem in available_stems if stem['type'] in selected_types]
+
+    sources_dir = os.path.join(DOWNLOADS_DIR, channel, beat, 'cover_sources')
+    if len(chosen) > 1:
+        stem_types = [stem['type'] for stem in chosen]
+        digest = cover_sources.mix_digest([audio_cache.file_digest(stem['path']) for stem in chosen])
+        name = cover_sources.mix_name(stem_types, digest)
+        job.put({'status': f'Using mix of {", ".join(sorted(stem_types))}'})
+        source = {'name': name, 'path': os.path.join(sources_dir, name), 'digest': digest, 'stems': chosen}
+    else:
+        # A single selected stem is used as it is. If none of the selected
+        # stems exist, fall back to Vocals, then Drums, then Bass, then Other
         stem_priority = ['Vocals', 'Drums', 'Bass', 'Other']
-        selected_stem = None
-        for priority_type in stem_priority:
-            for stem in available_stems:
-                if stem['type'] == priority_type:
-                    selected_stem = stem
-                    break
-            if selected_stem:
-                break
+        selected_stem = chosen[0] if chosen else next(
+            (stem for priority_type in stem_priority for stem in available_stems if stem['type'] == priority_type),
+            available_stems[0])
+
+        job.put({'status': f'Using stem: {selected_stem["name"]}'})
+        source = dict(selected_stem, digest=audio_cache.file_digest(selected_stem['path']), stems=[selected_stem])
+
+    if not reduced:
+        return source
+    digest = cover_sources.reduced_digest(source['digest'])
+    name = cover_sources.reduced_name(source['name'], digest)
+    job.put({'status': f'Sending a {cover_sources.COVER_SOURCE_SECONDS}s excerpt for a faster upload'})
+    return {'name': name, 'path': os.path.join(sources_dir, name), 'digest': digest,
+            'stems': source['stems'], 'full': source}
+
+
+def build_cover_source(source, job):
+    """Write a mix or reduced excerpt to disk unless it is already there"""
+    if os.path.exists(source['path']):
+        return
+    if 'full' in source:
+        build_cover_source(source['full'], job)
+        job.put({'status': f'Reducing {source["full"]["name"]} for upload...'})
+        cover_sources.reduce(source['full']['path'], source['path'])
+    else:
+        job.put({'status': f'Mixing {len(source["stems"])} stems...'})
+        cover_sources.mixdown([stem['path'] for stem in source['stems']], source['path'])
 
-        if not selected_stem:
-            selected_stem = available_stems[0]
 
-        progress_queue.put({'status': f'Using stem: {selected_stem["name"]}'})
+def cover_source_url(source, job):
+    """Public URL kie.ai fetches a cover source from
 
-        # Upload the stem file to temporary host
-        upload_url = upload_file_to_temp_host(selected_stem['path'], progress_queue)
-        if not upload_url:
-            progress_queue.put({'error': 'Failed to upload audio file. Please try again.'})
-            progress_queue.put({'complete': True})
-            return
+    With GitHub storage the URL is remembered per source content, so a
+    repeat cover skips the mixdown or transcode and the upload.
+    """
+    if GITHUB_ENABLED:
+        url = library.cover_source_url(source['digest'])
+        if url:
+            job.put({'status': f'Reusing uploaded {source["name"]}'})
+            return url
+
+    build_cover_source(source, job)
+    url = upload_file_to_temp_host(source['path'], job)
+    if url and GITHUB_ENABLED:
+        library.add_cover_source(source['digest'], os.path.relpath(source['path'], DOWNLOADS_DIR).replace(os.sep, '/'), url)
+    return url
+
+
+def cover_request(selected_stems, genre):
+    """kie.ai upload-cover parameters other than the audio and callback URLs"""
+    # Determine if instrumental based on selected stems
+    has_vocals = any(
+        (s.get('type') == 'Vocals' if isinstance(s, dict) else s == 'Vocals')
+        for s in selected_stems
+    )
+    instrumental = not has_vocals
+
+    # Build the prompt from genre or use default
+    prompt = genre if genre else 'A creative cover in a new style'
+
+    # Non-custom Mode (simplest) - only prompt required
+    return {
+        'prompt': prompt,
+        'customMode': False,
+        'instrumental': instrumental,
+        'model': 'V4_5'  # Use V4.5 for better quality
+    }
 
-        progress_queue.put({'status': f'File uploaded: {upload_url}'})
 
-        # Prepare the API request
-        headers = {
-            'Authorization': f'Bearer {KIE_API_KEY}',
-            'Content-Type': 'application/json'
-        }
+def submit_kie_cover(source, request, job):
+    """Upload the cover source and create a kie.ai upload-cover task
 
-        # Determine if instrumental based on selected stems
-        has_vocals = any(
-            (s.get('type') == 'Vocals' if isinstance(s, dict) else s == 'Vocals')
-            for s in selected_stems
-        )
-        instrumental = not has_vocals
-
-        # Build the prompt from genre or use default
-        prompt = genre if genre else 'A creative cover in a new style'
-
-        # Prepare request data for Non-custom Mode (simplest)
-        data = {
-            'uploadUrl': upload_url,
-            'prompt': prompt,
-            'customMode': False,  # Simple mode - only prompt required
-            'instrumental': instrumental,
-            'model': 'V4_5',  # Use V4.5 for better quality
-            'callBackUrl': f'{PUBLIC_BASE_URL}/kie-callback'  # Use public URL
-        }
+    Returns:
+        kie.ai task ID, or None after reporting the failure to the job
+    """
+    # Public URL of the source audio (uploaded once per source content)
+    with cover_request_lock(source['digest']), metrics.span('cover.source_url'):
+        upload_url = cover_source_url(source, job)
+    if not upload_url:
+        job.put({'error': 'Failed to upload audio file. Please try again.'})
+        job.put({'complete': True})
+        return None
+
+    job.put({'status': f'File uploaded: {upload_url}'})
+
+    # Prepare the API request
+    headers = {
+        'Authorization': f'Bearer {KIE_API_KEY}',
+        'Content-Type': 'application/json'
+    }
+
+    data = dict(request,
+                uploadUrl=upload_url,
+                callBackUrl=f'{PUBLIC_BASE_URL}/kie-callback?token={KIE_CALLBACK_TOKEN}')  # Use public URL
 
-        progress_queue.put({'status': 'Sending request to kie.ai Suno API...'})
+    job.put({'status': 'Sending request to kie.ai Suno API...'})
 
-        # Make the API request
+    # Make the API request (batches share kie.ai's request rate)
+    with metrics.span('kie.rate_limit'):
+        kie_submit_limit.acquire()
+    with metrics.span('kie.submit') as span:
         response = requests.post(
             f'{KIE_API_BASE}/generate/upload-cover',
             headers=headers,
             json=data,
             timeout=30
         )
-
         result = response.json()
-
         if response.status_code != 200 or result.get('code') != 200:
-            error_msg = result.get('msg', 'Unknown error')
-            progress_queue.put({'error': f'API Error: {error_msg}'})
-            progress_queue.put({'complete': True})
-            return
+            span.fail()
 
-        task_id = result['data']['taskId']
-        progress_queue.put({'status': f'Task created! ID: {task_id}. Waiting for generation...'})
+    if response.status_code != 200 or result.get('code') != 200:
+        error_msg = result.get('msg', 'Unknown error')
+        job.put({'error': f'API Error: {error_msg}'})
+        job.put({'complete': True})
+        return None
 
-        # Poll for task completion
-        max_wait = 600  # 10 minutes max
-        start_time = time.time()
-        check_interval = 10  # Check every 10 seconds
+    task_id = result['data']['taskId']
+    job.put({'status': f'Task created! ID: {task_id}. Waiting for generation...'})
+    return task_id
 
-        while time.time() - start_time < max_wait:
-            # Check task status
-            status_response = requests.get(
-                f'{KIE_API_BASE}/generate/record-info?taskId={task_id}',
-                headers={'Authorization': f'Bearer {KIE_API_KEY}'},
-                timeout=10
-            )
 
-            status_result = status_response.json()
-
-            if status_result.get('code') == 200:
-                task_data = status_result.get('data', {})
-                status = task_data.get('status')
-
-                if status == 'SUCCESS':
-                    # Get the generated audio URL
-                    suno_data = task_data.get('response', {}).get('sunoData', [])
-                    if suno_data:
-                        audio_url = suno_data[0].get('audioUrl')
-                        if audio_url:
-                            progress_queue.put({'status': 'Downloading generated audio...'})
-
-                            # Download the generated audio
-                            download_response = requests.get(audio_url, timeout=60)
-                            if download_response.status_code == 200:
-                                # Save the file
-                                genre_tag = genre.replace(' ', '_')[:30] if genre else 'cover'
-                                timestamp = int(time.time())
-                                output_filename = f'AI_Cover_{genre_tag}_{timestamp}.mp3'
-                                output_path = os.path.join(output_dir, output_filename)
-
-                                with open(output_path, 'wb') as f:
-                                    f.write(download_response.content)
-
-                                progress_queue.put({'status': f'Created: {output_filename}'})
-
-                                # Upload to GitHub if enabled
-                                if GITHUB_ENABLED:
-                                    repo_path = f'{channel}/{beat}/ai_covers/{output_filename}'
-                                    github_url = github_storage.upload_to_github(output_path, repo_path)
-                                    if github_url:
-                                        progress_queue.put({'status': f'Uploaded to GitHub: {output_filename}'})
-
-                                progress_queue.put({'complete': True,
-                                                  'message': f'AI Cover generated successfully!'})
-                                return
-                            else:
-                                progress_queue.put({'error': 'Failed to download generated audio'})
-                                progress_queue.put({'complete': True})
-                                return
-
-                elif status == 'PENDING':
-                    progress_queue.put({'status': 'Generating... (this may take 1-2 minutes)'})
-                elif status == 'FIRST_SUCCESS':
-                    progress_queue.put({'status': 'First track complete...'})
-                elif status in ['CREATE_TASK_FAILED', 'GENERATE_AUDIO_FAILED']:
-                    error_msg = task_data.get('errorMessage', 'Generation failed')
-                    progress_queue.put({'error': f'Generation failed: {error_msg}'})
-                    progress_queue.put({'complete': True})
-                    return
-                elif status == 'SENSITIVE_WORD_ERROR':
-                    progress_queue.put({'error': 'Content filtered due to sensitive words'})
-                    progress_queue.put({'complete': True})
+# Identical cover requests in flight: request key -> kie.ai task ID
+kie_inflight = {}
+cover_request_locks = {}   # request key -> [lock, holders and waiters]
+cover_request_locks_lock = threading.Lock()
+
+
+@contextmanager
+def cover_request_lock(request_key):
+    """Serialize work on one cover request key
+
+    Entries are refcounted and dropped when the last user leaves, so the
+    dict holds only keys in use.
+    """
+    with cover_request_locks_lock:
+        entry = cover_request_locks.setdefault(request_key, [threading.Lock(), 0])
+        entry[1] += 1
+    try:
+        with entry[0]:
+            yield
+    finally:
+        with cover_request_locks_lock:
+            entry[1] -= 1
+            if not entry[1]:
+                del cover_request_locks[request_key]
+
+
+def run_kie_cover(channel, beat, selected_stems, genre, job, fresh=False, reduced=False):
+    """Submit an AI cover to kie.ai and hand the task to the shared tracker
+
+    A request identical to an earlier one (same stem content, prompt and
+    options) reuses its covers unless fresh is set, and joins its task while
+    that is still generating. reduced sends an upload-sized excerpt of the
+    source (a different request, memoized separately). Otherwise the job leaves its worker while kie.ai
+    generates; kie_cover_update reports progress and queues finish_kie_cover
+    once the task ends.
+    """
+    try:
+        # A resumed job keeps following the task it already paid for
+        submitted = job.step_data(beat, 'submitted')
+        resumed = bool(submitted)
+        if resumed:
+            task_id, request_key = submitted['taskId'], submitted.get('requestKey')
+            job.put({'status': f'Resuming kie.ai task {task_id}...'})
+            if request_key:
+                kie_inflight.setdefault(request_key, task_id)
+        else:
+            with metrics.span('cover.select_source'):
+                source = select_cover_source(channel, beat, selected_stems, job, reduced)
+            if not source:
+                return
+            request = cover_request(selected_stems, genre)
+            request_key = kie_tasks.request_key(source['digest'], request)
+
+            with cover_request_lock(request_key):
+                cached = [] if fresh else library.cover_results(request_key)
+                if cached:
+                    names = ', '.join(row['name'] for row in cached)
+                    job.put({'status': f'Identical cover already generated: {names}',
+                             'covers': [row['path'] for row in cached]})
+                    job.put({'complete': True,
+                             'message': 'AI Cover already generated - reused (ask for a fresh variation for a new one)'})
                     return
 
-            time.sleep(check_interval)
+                task_id = None if fresh else kie_inflight.get(request_key)
+                if task_id:
+                    job.put({'status': f'Identical cover already generating - joining task {task_id}...'})
+                else:
+                    task_id = submit_kie_cover(source, request, job)
+                    if not task_id:
+                        return
+                    kie_inflight[request_key] = task_id
 
-        # Timeout
-        progress_queue.put({'error': 'Generation timeout. The task may still be processing.'})
-        progress_queue.put({'complete': True})
+            submitted = {'taskId': task_id, 'submitted': time.time(), 'requestKey': request_key}
+            job.mark_step(beat, 'submitted', submitted)
+
+        job.set_status('waiting')
+        kie_tracker.track(task_id, lambda task_data: kie_cover_update(job, task_data, request_key),
+                          started=submitted.get('submitted'), poll_now=resumed)
+        return jobs.DETACHED
 
     except Exception as e:
-        progress_queue.put({'error': f'AI Cover generation failed: {str(e)}'})
-        progress_queue.put({'complete': True})
+        job.put({'error': f'AI Cover generation failed: {str(e)}'})
+        job.put({'complete': True})
+
+
+def kie_cover_update(job, task_data, request_key=None):
+    """Tracker callback: report a cover's progress, or queue its last step once the task ends"""
+    status = task_data.get('status')
+    if status in kie_tasks.TERMINAL_STATUSES:
+        job_registry.continue_job(job, lambda job, p: finish_kie_cover(p['channel'], p['beat'], p['genre'],
+                                                                       task_data, job, request_key))
+    elif status == 'FIRST_SUCCESS':
+        job.put({'status': 'First track complete...'})
+    else:
+        job.put({'status': 'Generating... (this may take 1-2 minutes)'})
 
 
-def run_yue_cover(channel, beat, selected_stems, genre, progress_queue):
-    """Generate AI cover using YuE with the selected stems as prompts"""
+def finish_kie_cover(channel, beat, genre, task_data, job, request_key=None):
+    """Download and store a finished kie.ai cover, or report why it failed
+
+    Jobs sharing a task take turns on the request key: the first stores the
+    covers, the others reuse them.
+    """
+    # Jobs stored before submit times were recorded only have the taskId
+    submitted = (job.step_data(beat, 'submitted') or {}).get('submitted')
+    if submitted:
+        metrics.observe('kie.wait', time.time() - submitted, job,
+                        failed=task_data.get('status') != 'SUCCESS')
+
+    if not request_key:
+        return store_kie_cover(channel, beat, genre, task_data, job)
+
+    task_id = task_data.get('taskId')
+    with cover_request_lock(request_key):
+        try:
+            cached = library.cover_results(request_key, task_id) if task_id else []
+            if cached:
+                for row in cached:
+                    job.put({'status': f'Created: {row["name"]}'})
+                job.put({'complete': True, 'message': 'AI Cover generated successfully!' if len(cached) == 1
+                         else f'{len(cached)} AI Cover variations generated successfully!'})
+                return
+            store_kie_cover(channel, beat, genre, task_data, job, request_key)
+        finally:
+            if kie_inflight.get(request_key) == task_id:
+                del kie_inflight[request_key]
+
+
+def store_kie_cover(channel, beat, genre, task_data, job, request_key=None):
+    """Download and store a finished kie.ai cover, or report why it failed"""
     try:
-        import importlib
-        import torch
+        status = task_data.get('status')
+
+        if status == 'SENSITIVE_WORD_ERROR':
+            job.put({'error': 'Content filtered due to sensitive words'})
+            job.put({'complete': True})
+            return
+        if status == 'TIMEOUT':
+            job.put({'error': 'Generation timeout. The task may still be processing.'})
+            job.put({'complete': True})
+            return
+        if status != 'SUCCESS':
+            error_msg = task_data.get('errorMessage') or 'Generation failed'
+            job.put({'error': f'Generation failed: {error_msg}'})
+            job.put({'complete': True})
+            return
 
+        # Create output directory for AI covers
+        output_dir = os.path.join(DOWNLOADS_DIR, channel, beat, 'ai_covers')
+        os.makedirs(output_dir, exist_ok=True)
+
+        # kie.ai generates two variations - fetch every clip at once
+        clips = kie_tasks.clips(task_data)
+        genre_tag = genre.replace(' ', '_')[:30] if genre else 'cover'
+        timestamp = int(time.time())
+        job.put({'status': f'Downloading {len(clips)} generated track(s)...'})
+
+        def download_clip(numbered):
+            index, clip = numbered
+            suffix = f'_{index + 1}' if index else ''
+            output_filename = f'AI_Cover_{genre_tag}_{timestamp}{suffix}.mp3'
+            output_path = os.path.join(output_dir, output_filename)
+            with metrics.span('cover.download', job):
+                audio_download.download_audio(clip['audioUrl'], output_path, clip.get('duration'))
+            return output_filename, output_path
+
+        # Each file is stored as soon as it is complete, while the other downloads
+        saved = []
+        with ThreadPoolExecutor(max_workers=len(clips)) as pool:
+            for future in as_completed([pool.submit(download_clip, numbered) for numbered in enumerate(clips)]):
+                try:
+                    output_filename, output_path = future.result()
+                except audio_download.DownloadError as e:
+                    job.put({'error': f'Failed to download generated audio: {e}'})
+                    continue
+                saved.append(output_filename)
+                job.put({'status': f'Created: {output_filename}'})
+
+                # Upload to GitHub if enabled
+                repo_path = f'{channel}/{beat}/ai_covers/{output_filename}'
+                if GITHUB_ENABLED:
+                    github_url = github_storage.upload_to_github(output_path, repo_path)
+                    if github_url:
+                        job.put({'status': f'Uploaded to GitHub: {output_filename}'})
+                        library_add(output_path, repo_path, github_url)
+                else:
+                    library_add(output_path, repo_path)
+                if request_key:
+                    library.add_cover_result(request_key, task_data.get('taskId'), repo_path)
+
+        if not saved:
+            job.put({'complete': True})
+            return
+
+        job.put({'complete': True,
+                 'message': f'AI Cover generated successfully!' if len(saved) == 1
+                 else f'{len(saved)} AI Cover variations generated successfully!'})
+
+    except Exception as e:
+        job.put({'error': f'AI Cover generation failed: {str(e)}'})
+        job.put({'complete': True})
+
+
+# Covers of one batch generating at once (each holds a kie.ai task)
+COVER_BATCH_CONCURRENCY = int(os.environ.get('COVER_BATCH_CONCURRENCY', 10))
+COVER_BATCH_MAX = int(os.environ.get('COVER_BATCH_MAX', 200))
+
+
+def run_cover_batch(channel, pairs, selected_stems, job, fresh=False, reduced=False):
+    """Generate a cover per (beat, genre) pair, COVER_BATCH_CONCURRENCY at a time
+
+    Each pair runs as an ordinary cover job (deduplicated and resumable on its
+    own). The batch only submits them and follows their completion, so it
+    holds no worker while kie.ai generates.
+    """
+    total = len(pairs)
+    state = {'pending': [], 'running': 0, 'done': 0, 'failed': 0}
+    lock = threading.Lock()
+
+    for beat, genre in pairs:
+        finished = job.step_data(f'{beat} | {genre}', 'finished')
+        if finished is None:
+            state['pending'].append((beat, genre))
+        else:
+            state['done'] += 1
+            state['failed'] += finished.get('status') != 'complete'
+
+    def summarize(job, params):
+        if state['failed'] == total:
+            job.put({'error': 'All covers failed', 'complete': True})
+        else:
+            job.put({'complete': True,
+                     'message': f'{total - state["failed"]} of {total} covers generated'})
+
+    def record(beat, genre, status):
+        """Count a finished cover; True when it was the last one"""
+        job.mark_step(f'{beat} | {genre}', 'finished', {'status': status})
+        with lock:
+            state['running'] -= 1
+            state['done'] += 1
+            state['failed'] += status != 'complete'
+            done, failed = state['done'], state['failed']
+        job.put({'status': f'[{done}/{total}] {beat} / {genre}: {status}', 'batch': {
+            'done': done, 'failed': failed, 'total': total}})
+        job.put({'progress': round(100 * done / total, 1), 'item': 'batch'})
+        if done == total:
+            job_registry.continue_job(job, summarize)
+            return True
+        return False
+
+    def child_finished(beat, genre, status):
+        if not record(beat, genre, status):
+            submit_next()
+
+    def submit_next():
+        while True:
+            with lock:
+                if not state['pending'] or state['running'] >= COVER_BATCH_CONCURRENCY:
+                    return
+                beat, genre = state['pending'].pop(0)
+                state['running'] += 1
+            try:
+                child, _ = job_registry.submit(
+                    'cover', jobs.cover_key(channel, beat, selected_stems, genre, fresh, reduced),
+                    {'channel': channel, 'beat': beat, 'stems': selected_stems, 'genre': genre,
+                     'fresh': fresh, 'reduced': reduced},
+                    job.priority, force=True)
+            except Exception as e:
+                job.put({'status': f'Could not start {beat} / {genre}: {e}'})
+                if record(beat, genre, 'failed'):
+                    return
+                continue
+            job.put({'status': f'Generating {beat} / {genre}', 'jobId': child.id})
+            child.on_finish(lambda child, beat=beat, genre=genre: child_finished(beat, genre, child.status))
+
+    if not state['pending']:
+        summarize(job, job.params)
+        return
+
+    job.put({'status': f'Generating {total} covers, {COVER_BATCH_CONCURRENCY} at a time...'})
+    job.set_status('waiting')
+    submit_next()
+    return jobs.DETACHED
+
+
+YUE_INFERENCE_DIR = os.environ.get('YUE_INFERENCE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'YuEGP', 'inference'))
+
+yue_workers = yue_worker.YueWorkerPool()
+
+
+def run_yue_cover(channel, beat, selected_stems, genre, job):
+    """Generate AI cover using YuE with the selected stems as prompts
+
+    The inference is queued on the persistent YuE worker (models stay loaded
+    between covers); the job leaves its worker meanwhile and finish_yue_cover
+    stores the result.
+    """
+    try:
         # Check if YuE inference module is available
-        yue_inference_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'YuEGP', 'inference')
-        infer_module_path = os.path.join(yue_inference_path, 'infer.py')
+        infer_module_path = os.path.join(YUE_INFERENCE_DIR, 'infer.py')
 
         if not os.path.exists(infer_module_path):
-            progress_queue.put({'error': 'YuE inference module not found. Please ensure YuEGP is properly installed.'})
-            progress_queue.put({'complete': True})
+            job.put({'error': 'YuE inference module not found. Please ensure YuEGP is properly installed.'})
+            job.put({'complete': True})
             return
 
         # Check for required models
-        xcodec_path = os.path.join(yue_inference_path, 'xcodec_mini_infer')
+        xcodec_path = os.path.join(YUE_INFERENCE_DIR, 'xcodec_mini_infer')
         if not os.path.exists(xcodec_path):
-            progress_queue.put({'error': 'xcodec_mini_infer models not found. Download from: https://huggingface.co/m-a-p/xcodec_mini_infer'})
-            progress_queue.put({'error': 'Run: cd YuEGP/inference && git clone https://huggingface.co/m-a-p/xcodec_mini_infer'})
-            progress_queue.put({'complete': True})
+            job.put({'error': 'xcodec_mini_infer models not found. Download from: https://huggingface.co/m-a-p/xcodec_mini_infer'})
+            job.put({'error': 'Run: cd YuEGP/inference && git clone https://huggingface.co/m-a-p/xcodec_mini_infer'})
+            job.put({'complete': True})
             return
 
         # Get stem file paths
         beat_folder = os.path.join(DOWNLOADS_DIR, channel, beat)
         iso_dir = os.path.join(beat_folder, 'isolated_samples')
 
-        # Create output directory for AI covers
-        output_dir = os.path.join(beat_folder, 'ai_covers')
+        # Each run writes to its own folder, so only its output is picked up
+        output_dir = os.path.join(beat_folder, 'ai_covers', f'.yue-{job.id}')
         os.makedirs(output_dir, exist_ok=True)
 
         # Map stem types to filename prefixes
@@ -1117,14 +1769,8 @@ def run_yue_cover(channel, beat, selected_stems, genre, progress_queue):
         with open(lyrics_file, 'w') as f:
             f.write('[Verse]\nGenerated from stem prompts\n\n[Chorus]\nAI music generation\n')
 
-        progress_queue.put({'status': 'Initializing YuE AI model...'})
-
-        # Prepare YuE command
-        import subprocess
-
-        cmd = [
-            sys.executable,  # Use same Python interpreter
-            infer_module_path,
+        # YuE arguments (the worker adds --cuda_idx -1 when there is no GPU)
+        args = [
             '--icl',  # Use ICL mode for audio prompts (doesn't require lyrics)
             '--use_dual_tracks_prompt',
             '--vocal_track_prompt_path', vocal_path or '',
@@ -1136,111 +1782,260 @@ def run_yue_cover(channel, beat, selected_stems, genre, progress_queue):
             '--max_new_tokens', '1000',
         ]
 
-        # Check if CUDA is available, otherwise CPU
-        if not torch.cuda.is_available():
-            cmd.extend(['--cuda_idx', '-1'])  # Use CPU
-            progress_queue.put({'status': 'Using CPU for inference (slower)...'})
+        try:
+            submitted = time.time()
+            ahead = yue_workers.submit(args, YUE_INFERENCE_DIR,
+                                       lambda event: yue_cover_update(job, event, channel, beat, genre,
+                                                                      output_dir, submitted))
+        except yue_worker.QueueFull as e:
+            shutil.rmtree(output_dir, ignore_errors=True)
+            job.put({'error': f'Server busy: {e}. Please try again later.'})
+            job.put({'complete': True})
+            return
 
-        progress_queue.put({'status': 'Generating AI cover (this may take several minutes)...'})
+        job.put({'status': 'Generating AI cover (this may take several minutes)...' if not ahead
+                 else f'Waiting for the YuE worker ({ahead} cover(s) ahead)...'})
+        job.set_status('waiting')
+        return jobs.DETACHED
 
-        # Run YuE inference
-        process = subprocess.Popen(
-            cmd,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.STDOUT,
-            universal_newlines=True,
-            cwd=yue_inference_path
-        )
+    except Exception as e:
+        job.put({'error': f'AI Cover generation failed: {str(e)}'})
+        job.put({'complete': True})
 
-        # Monitor output for progress
-        for line in process.stdout:
-            line = line.strip()
-            if line:
-                progress_queue.put({'status': line[:200]})  # Truncate long lines
 
-        process.wait()
+def yue_cover_update(job, event, channel, beat, genre, output_dir, submitted):
+    """YuE worker callback: report progress, or queue the last step once inference ends"""
+    if event.get('event') == 'done':
+        metrics.observe('yue.inference', time.time() - submitted, job, failed=event.get('returncode') != 0)
+        job_registry.continue_job(job, lambda job, p: finish_yue_cover(channel, beat, genre, output_dir, event, job))
+        return
 
+    update = {'status': event['line']}
+    if event.get('percent') is not None:
+        update.update(progress=event['percent'], item=f'Stage {event["stage"]}' if event.get('stage') else 'YuE')
+    job.put(update)
+
+
+def finish_yue_cover(channel, beat, genre, output_dir, result, job):
+    """Move a finished YuE cover into ai_covers, or report why it failed"""
+    try:
         # Find generated output file
-        output_files = []
-        for f in os.listdir(output_dir):
-            if f.endswith('.mp3') and f != 'genre.txt':
-                output_files.append(f)
+        output_files = [f for f in os.listdir(output_dir) if f.endswith('.mp3')] if os.path.isdir(output_dir) else []
 
-        if output_files and process.returncode == 0:
+        if output_files and result.get('returncode') == 0:
             # Rename output to include genre info
+            covers_dir = os.path.dirname(output_dir)
             genre_tag = genre.replace(' ', '_')[:30] if genre else 'cover'
             timestamp = int(time.time())
-            for output_file in output_files:
-                old_path = os.path.join(output_dir, output_file)
-                new_name = f'AI_Cover_{genre_tag}_{timestamp}.mp3'
-                new_path = os.path.join(output_dir, new_name)
-                os.rename(old_path, new_path)
-                progress_queue.put({'status': f'Created: {new_name}'})
-
-            progress_queue.put({'complete': True, 'message': f'AI Cover generated! ({len(output_files)} file(s))'})
+            for i, output_file in enumerate(sorted(output_files)):
+                suffix = f'_{i + 1}' if i else ''
+                new_name = f'AI_Cover_{genre_tag}_{timestamp}{suffix}.mp3'
+                new_path = os.path.join(covers_dir, new_name)
+                os.replace(os.path.join(output_dir, output_file), new_path)
+                job.put({'status': f'Created: {new_name}'})
+
+                # Upload to GitHub if enabled
+                repo_path = f'{channel}/{beat}/ai_covers/{new_name}'
+                if GITHUB_ENABLED:
+                    github_url = github_storage.upload_to_github(new_path, repo_path)
+                    if github_url:
+                        job.put({'status': f'Uploaded to GitHub: {new_name}'})
+                        library_add(new_path, repo_path, github_url)
+                else:
+                    library_add(new_path, repo_path)
+
+            job.put({'complete': True, 'message': f'AI Cover generated! ({len(output_files)} file(s))'})
         else:
-            progress_queue.put({'error': 'YuE generation failed. Check console for details.'})
-            progress_queue.put({'complete': True})
+            if result.get('error'):
+                job.put({'error': f'YuE error: {result["error"]}'})
+            job.put({'error': 'YuE generation failed. Check console for details.'})
+            job.put({'complete': True})
 
-    except ImportError as e:
-        progress_queue.put({'error': f'Missing dependency: {str(e)}'})
-        progress_queue.put({'error': 'Install required packages: pip install torch torchaudio transformers'})
-        progress_queue.put({'complete': True})
     except Exception as e:
-        progress_queue.put({'error': f'AI Cover generation failed: {str(e)}'})
-        progress_queue.put({'complete': True})
+        job.put({'error': f'AI Cover generation failed: {str(e)}'})
+        job.put({'complete': True})
+    finally:
+        shutil.rmtree(output_dir, ignore_errors=True)
 
 
-@app.route('/serve-audio/<path:filepath>')
-def serve_audio(filepath):
-    """Serve audio files for external access (needed for kie.ai API)"""
-    # Decode URL-encoded path
-    from urllib.parse import unquote
-    filepath = unquote(filepath)
+def resolve_audio_path(rel_path):
+    """Local path for a storage path, filling the cache in GitHub mode
 
-    # Security: ensure the path is within downloads directory
-    safe_path = os.path.basename(filepath)
-    for part in filepath.split('/'):
-        if part and part != safe_path:
-            safe_path = os.path.join(part, safe_path)
+    Returns:
+        Absolute path, or None if the path escapes DOWNLOADS_DIR or the file
+        is not in storage
+    """
+    full_path = safe_join(DOWNLOADS_DIR, rel_path)
+    if full_path is None:
+        return None
+    # Only paths the library knows are fetched - a probe for a missing file
+    # must not cost a GitHub API call
+    if not os.path.isfile(full_path) and file_cache and library.rows([rel_path]):
+        fetch_storage_file(rel_path)
+    return full_path if os.path.isfile(full_path) else None
 
-    full_path = os.path.join(DOWNLOADS_DIR, safe_path)
 
-    if not os.path.exists(full_path):
+@app.route('/serve-audio/<path:filepath>')
+def serve_audio(filepath):
+    """Serve stored audio by storage path (channel/beat/...), e.g. for kie.ai
+
+    Byte ranges for seeking, ETag/Last-Modified revalidation (304) and
+    long-lived cache headers. Under gunicorn the file goes out through
+    wsgi.file_wrapper (sendfile); with USE_X_SENDFILE or AUDIO_ACCEL_REDIRECT
+    the fronting server sends it instead. Under uvicorn asgi.py serves this
+    path without a worker thread.
+    """
+    full_path = resolve_audio_path(filepath)
+    if not full_path:
         return jsonify({'error': 'File not found'}), 404
 
-    return send_from_directory(os.path.dirname(full_path), os.path.basename(full_path))
+    stat = os.stat(full_path)
+    accel = audio_serving.accel_redirect(filepath, stat.st_size)
+    if accel:
+        response = Response(mimetype=audio_serving.content_type(full_path))
+        response.headers.update(audio_serving.cache_headers(stat))
+        response.headers['X-Accel-Redirect'] = accel
+        return response
+
+    return send_file(full_path, mimetype=audio_serving.content_type(full_path), conditional=True,
+                     etag=audio_serving.file_etag(stat), last_modified=stat.st_mtime,
+                     max_age=audio_serving.AUDIO_MAX_AGE)
+
+
+# /export ?include= names -> library categories
+EXPORT_CATEGORIES = {'original': 'original', 'stems': 'stem', 'covers': 'cover', 'previews': 'preview'}
+
+
+@app.route('/export/<channel>')
+@app.route('/export/<channel>/<beat>')
+def export_archive(channel, beat=None):
+    """Stream a zip or tar of a channel's or beat's files as it is built
+
+    Query: format=zip|tar (default zip), include=original,stems,covers,previews
+    (default stems), type=Drums,Bass to export only some stem types
+    """
+    fmt = request.args.get('format', 'zip')
+    if fmt not in exporter.FORMATS:
+        return jsonify({'error': f"format must be one of {', '.join(exporter.FORMATS)}"}), 400
+
+    include = [name for name in request.args.get('include', 'stems').split(',') if name]
+    unknown = [name for name in include if name not in EXPORT_CATEGORIES]
+    if unknown or not include:
+        return jsonify({'error': f"include must be some of {', '.join(EXPORT_CATEGORIES)}"}), 400
+    types = {t for t in request.args.get('type', '').split(',') if t}
+
+    members = []
+    for name in include:
+        for row in library.files(EXPORT_CATEGORIES[name], channel, beat):
+            if types and name == 'stems' and row['type'] not in types:
+                continue
+            # Prefer the local copy's size - it is what will be read if it is still there
+            local_path = os.path.join(DOWNLOADS_DIR, row['path'])
+            size = os.path.getsize(local_path) if os.path.isfile(local_path) else row['size']
+            members.append({'name': row['path'], 'size': size, 'mtime': row['updated']})
+
+    if not members:
+        return jsonify({'error': 'Nothing to export'}), 404
+
+    def open_member(member):
+        """Local (cached) copy if present, otherwise stream it from GitHub"""
+        local_path = os.path.join(DOWNLOADS_DIR, member['name'])
+        if os.path.isfile(local_path) and os.path.getsize(local_path) == member['size']:
+            return open(local_path, 'rb')
+        if GITHUB_ENABLED:
+            remote = github_storage.open_github_file(member['name'])
+            if remote:
+                return remote
+        print(f"Export: skipping unavailable {member['name']}")
+        return None
+
+    filename = '-'.join(filter(None, [channel, beat] + include)) + f'.{fmt}'
+    return Response(
+        exporter.stream_archive(members, fmt, open_member),
+        mimetype=exporter.FORMATS[fmt],
+        headers={'Content-Disposition': f"attachment; filename*=UTF-8''{quote(filename)}",
+                 'X-Accel-Buffering': 'no'}
+    )
 
 
 @app.route('/storage-info', methods=['GET'])
 def storage_info():
-    """Get storage information including GitHub repo size"""
+    """Get storage information including GitHub repo size
+
+    Everything comes from maintained counters: the library index usage table,
+    the DOWNLOADS_DIR watcher and the background repo size refresh.
+    """
     info = {
         'github_enabled': GITHUB_ENABLED,
         'local_path': DOWNLOADS_DIR,
         'github_repo': github_storage.GITHUB_REPO if GITHUB_ENABLED else None,
-        'github_branch': github_storage.GITHUB_BRANCH if GITHUB_ENABLED else None
+        'github_branch': github_storage.GITHUB_BRANCH if GITHUB_ENABLED else None,
+        'cover_source_reduce': cover_sources.COVER_SOURCE_REDUCE  # the UI's default for "Short source"
     }
 
     if GITHUB_ENABLED:
-        repo_size_kb = github_storage.get_repo_size()
-        info['repo_size_mb'] = round(repo_size_kb / 1024, 2) if repo_size_kb else None
-
-    # Calculate local storage size
-    total_size = 0
-    for dirpath, dirnames, filenames in os.walk(DOWNLOADS_DIR):
-        for f in filenames:
-            fp = os.path.join(dirpath, f)
-            if os.path.exists(fp):
-                total_size += os.path.getsize(fp)
-    info['local_size_mb'] = round(total_size / (1024 * 1024), 2)
+        info['repo_size_mb'] = round(repo_size['kb'] / 1024, 2) if repo_size['kb'] is not None else None
+        info['repo_size_updated'] = repo_size['updated']
+        info['cache'] = file_cache.stats()
+
+    local = local_watcher.usage()
+    info['local_size_mb'] = round(local['bytes'] / (1024 * 1024), 2)
+    info['local_channels_mb'] = {channel: round(size / (1024 * 1024), 2)
+                                 for channel, size in sorted(local['channels'].items())}
+
+    # Library breakdown - names match the /delete types
+    category_names = {'original': 'original', 'stem': 'stems', 'cover': 'covers', 'preview': 'previews'}
+    usage = library.usage()
+    info['library'] = {
+        'bytes': usage['bytes'],
+        'files': usage['files'],
+        'categories': {category_names.get(c, c): v for c, v in usage['categories'].items()},
+        'channels': {
+            channel: {
+                'bytes': totals['bytes'],
+                'files': totals['files'],
+                'categories': {category_names.get(c, c): v for c, v in totals['categories'].items()},
+                'beats': totals['beats']
+            }
+            for channel, totals in sorted(usage['channels'].items())
+        }
+    }
 
     return jsonify(info)
 
 
+# What each /delete type covers - stems take their previews and cover source mixes along
+DELETE_CATEGORIES = {'all': ('original', 'stem', 'cover', 'preview'), 'original': ('original',),
+                     'stems': ('stem', 'preview'), 'covers': ('cover',)}
+
+
+def stored_paths(channel, beat, file_type):
+    """Library paths a /delete of file_type covers, for a channel or one beat"""
+    categories = DELETE_CATEGORIES[file_type]
+    paths = [row['path'] for category in categories for row in library.files(category, channel, beat)]
+    if 'stem' in categories:
+        paths += library.cover_source_paths(channel, beat)
+    return paths
+
+
+def delete_local_copy(rel_path):
+    """Delete the local copy of a stored file or folder, through the cache in GitHub mode
+
+    Returns:
+        True if anything was on disk
+    """
+    if file_cache:
+        return file_cache.remove(rel_path)
+    return audio_cache.remove_local(os.path.join(DOWNLOADS_DIR, rel_path))
+
+
 @app.route('/delete', methods=['POST'])
 def delete_files():
-    """Delete files from local storage and optionally from GitHub"""
+    """Delete files from storage, or only their local copies
+
+    What to delete comes from the library index: in GitHub mode DOWNLOADS_DIR
+    is an evicting cache, so a beat's local folder may be partly or wholly gone.
+    """
     data = request.json
     channel = data.get('channel', '')
     beat = data.get('beat', None)        # Optional: specific beat
@@ -1249,93 +2044,55 @@ def delete_files():
 
     if not channel:
         return jsonify({'error': 'Channel required'}), 400
+    if file_type not in DELETE_CATEGORIES:
+        return jsonify({'error': f'type must be one of {", ".join(DELETE_CATEGORIES)}'}), 400
+
+    # The library index mirrors storage, so it only changes when storage does
+    removed_from_storage = delete_from_github or not GITHUB_ENABLED
+    from_github = GITHUB_ENABLED and delete_from_github
 
     try:
         channel_dir = os.path.join(DOWNLOADS_DIR, channel)
         deleted_count = 0
         deleted_github_count = 0
-
-        # Determine what to delete
-        if beat:
-            # Delete specific beat folder
-            beat_dir = os.path.join(channel_dir, beat)
-            if os.path.exists(beat_dir):
-                # Delete from GitHub first if enabled
-                if GITHUB_ENABLED and delete_from_github:
-                    # Delete original file
-                    github_storage.delete_from_github(f'{channel}/{beat}/{beat}.mp3')
-                    deleted_github_count += 1
-
-                    # Delete stems
-                    stem_files = os.listdir(os.path.join(beat_dir, 'isolated_samples')) if os.path.exists(os.path.join(beat_dir, 'isolated_samples')) else []
-                    for stem in stem_files:
-                        if github_storage.delete_from_github(f'{channel}/{beat}/isolated_samples/{stem}'):
-                            deleted_github_count += 1
-
-                    # Delete AI covers
-                    covers_dir = os.path.join(beat_dir, 'ai_covers')
-                    if os.path.exists(covers_dir):
-                        for cover in os.listdir(covers_dir):
-                            if github_storage.delete_from_github(f'{channel}/{beat}/ai_covers/{cover}'):
-                                deleted_github_count += 1
-
-                # Delete local folder
-                shutil.rmtree(beat_dir)
-                deleted_count += 1
-        else:
-            # Delete entire channel or specific file types
-            for item in os.listdir(channel_dir) if os.path.exists(channel_dir) else []:
-                if item == 'downloads':
+        failed = []
+
+        # A beat delete takes everything in the beat
+        delete_type = 'all' if beat else file_type
+        for rel_path in stored_paths(channel, beat, delete_type):
+            if from_github:
+                if not github_storage.delete_from_github(rel_path):
+                    failed.append(rel_path)
                     continue
-
-                item_path = os.path.join(channel_dir, item)
-
-                if file_type == 'all':
-                    # Delete entire item
-                    if os.path.isdir(item_path):
-                        # Delete from GitHub first
-                        if GITHUB_ENABLED and delete_from_github:
-                            github_storage.delete_from_github(f'{channel}/{item}/{item}.mp3')
-                            deleted_github_count += 1
-
-                        shutil.rmtree(item_path)
-                        deleted_count += 1
-                else:
-                    # Delete specific file types within beat folders
-                    if os.path.isdir(item_path):
-                        if file_type == 'stems':
-                            iso_dir = os.path.join(item_path, 'isolated_samples')
-                            if os.path.exists(iso_dir):
-                                for stem in os.listdir(iso_dir):
-                                    if GITHUB_ENABLED and delete_from_github:
-                                        if github_storage.delete_from_github(f'{channel}/{item}/isolated_samples/{stem}'):
-                                            deleted_github_count += 1
-                                    os.remove(os.path.join(iso_dir, stem))
-                                    deleted_count += 1
-                        elif file_type == 'covers':
-                            covers_dir = os.path.join(item_path, 'ai_covers')
-                            if os.path.exists(covers_dir):
-                                for cover in os.listdir(covers_dir):
-                                    if GITHUB_ENABLED and delete_from_github:
-                                        if github_storage.delete_from_github(f'{channel}/{item}/ai_covers/{cover}'):
-                                            deleted_github_count += 1
-                                    os.remove(os.path.join(covers_dir, cover))
-                                    deleted_count += 1
-                        elif file_type == 'original':
-                            original_file = os.path.join(item_path, f'{item}.mp3')
-                            if os.path.exists(original_file):
-                                if GITHUB_ENABLED and delete_from_github:
-                                    if github_storage.delete_from_github(f'{channel}/{item}/{item}.mp3'):
-                                        deleted_github_count += 1
-                                os.remove(original_file)
-                                deleted_count += 1
-
-        return jsonify({
-            'success': True,
+                deleted_github_count += 1
+            if delete_local_copy(rel_path):
+                deleted_count += 1
+            if removed_from_storage:
+                library_remove(rel_path)
+
+        # Local files the index doesn't list: cover source mixes, unfinished uploads
+        leftovers = {'all': '', 'stems': 'cover_sources'}.get(delete_type)
+        if leftovers is not None and not failed:
+            if beat:
+                beats = [beat]
+            else:
+                beats = [name for name in os.listdir(channel_dir)
+                         if name != 'downloads' and os.path.isdir(os.path.join(channel_dir, name))] \
+                    if os.path.isdir(channel_dir) else []
+            for name in beats:
+                delete_local_copy('/'.join(part for part in (channel, name, leftovers) if part))
+
+        result = {
+            'success': not failed,
             'deleted_local': deleted_count,
             'deleted_github': deleted_github_count,
             'message': f'Deleted {deleted_count} local file(s) and {deleted_github_count} GitHub file(s)'
-        })
+        }
+        if failed:
+            # Their index rows stay, so the library still lists what GitHub still has
+            result['failed'] = failed
+            result['error'] = f'{len(failed)} file(s) could not be deleted from GitHub: {", ".join(failed[:5])}'
+        return jsonify(result)
 
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -1355,22 +2112,150 @@ def generate_cover():
     if not selected_stems:
         return jsonify({'error': 'Please select at least one stem'}), 400
 
-    progress_queue = queue.Queue()
-    thread = threading.Thread(target=run_kie_cover, args=(channel, beat, selected_stems, genre, progress_queue))
-    thread.daemon = True
-    thread.start()
+    engine = data.get('engine', 'kie')
+    if engine not in ('kie', 'yue'):
+        return jsonify({'error': 'engine must be "kie" or "yue"'}), 400
 
-    def generate():
-        while True:
-            try:
-                msg = progress_queue.get(timeout=1)
-                yield f"data: {json.dumps(msg)}\n\n"
-                if msg.get('complete'):
-                    break
-            except queue.Empty:
-                yield ": keepalive\n\n"
+    priority = scheduler.parse_priority(data.get('priority'))
+
+    if engine == 'yue':
+        # Local YuE model, queued on the persistent YuE worker
+        return submit_job('yue-cover', jobs.cover_key(channel, beat, selected_stems, genre, engine='yue'),
+                          {'channel': channel, 'beat': beat, 'stems': selected_stems, 'genre': genre},
+                          priority)
+
+    fresh = bool(data.get('fresh'))  # new variation even if this exact cover exists
+    reduced = bool(data.get('reduced', cover_sources.COVER_SOURCE_REDUCE))  # upload an excerpt, not the full track
+
+    return submit_job('cover', jobs.cover_key(channel, beat, selected_stems, genre, fresh, reduced),
+                      {'channel': channel, 'beat': beat, 'stems': selected_stems, 'genre': genre,
+                       'fresh': fresh, 'reduced': reduced},
+                      priority)
+
+
+@app.route('/cover/batch', methods=['POST'])
+def generate_cover_batch():
+    """Generate covers for many beats and genres as one job
 
-    return Response(generate(), mimetype='text/event-stream')
+    Body: channel, stems, and either pairs [{beat, genre}] or genres with
+    optional beats (default: every beat of the channel that has stems);
+    fresh and reduced as for /cover.
+    The job's stream reports each cover as it finishes and the ID of each
+    cover job.
+    """
+    data = request.json
+    channel = data.get('channel', '')
+    selected_stems = data.get('stems', [])
+
+    if not channel:
+        return jsonify({'error': 'Channel required'}), 400
+    if not selected_stems:
+        return jsonify({'error': 'Please select at least one stem'}), 400
+
+    if 'pairs' in data:
+        if not isinstance(data['pairs'], list) or not all(isinstance(p, dict) for p in data['pairs']):
+            return jsonify({'error': 'pairs must be a list of {beat, genre} objects'}), 400
+        pairs = [(p.get('beat') or '', p.get('genre') or '') for p in data['pairs']]
+    else:
+        if not all(isinstance(data.get(name) or [], list) for name in ('beats', 'genres')):
+            return jsonify({'error': 'beats and genres must be lists'}), 400
+        beats = data.get('beats') or [b['name'] for b in library.beats(channel) if b['hasIsolated']]
+        pairs = [(beat, genre or '') for beat in beats for genre in data.get('genres') or ['']]
+
+    if not all(isinstance(beat, str) and isinstance(genre, str) for beat, genre in pairs):
+        return jsonify({'error': 'Beats and genres must be strings'}), 400
+    pairs = list(dict.fromkeys((beat, genre.strip()) for beat, genre in pairs if beat))
+    if not pairs:
+        return jsonify({'error': 'No beats with stems to cover'}), 400
+    if len(pairs) > COVER_BATCH_MAX:
+        return jsonify({'error': f'Too many covers in one batch ({len(pairs)}, max {COVER_BATCH_MAX})'}), 400
+
+    priority = scheduler.parse_priority(data.get('priority'), scheduler.PRIORITY_LOW)
+
+    fresh = bool(data.get('fresh'))
+    reduced = bool(data.get('reduced', cover_sources.COVER_SOURCE_REDUCE))
+    return submit_job('cover-batch', jobs.cover_batch_key(channel, pairs, selected_stems, fresh, reduced),
+                      {'channel': channel, 'pairs': pairs, 'stems': selected_stems,
+                       'fresh': fresh, 'reduced': reduced}, priority)
+
+
+def collect_service_metrics():
+    """Jobs, pools, kie.ai tracking and the YuE worker for /metrics"""
+    job_counts = {}
+    for job in job_registry.list():
+        job_counts[(job.kind, job.status)] = job_counts.get((job.kind, job.status), 0) + 1
+    pools = job_scheduler.stats()
+    kie = kie_tracker.stats()
+    yue = yue_workers.stats()
+    return [
+        ('jobs', 'gauge', 'Jobs held by the registry by kind and status',
+         [({'kind': kind, 'status': status}, count) for (kind, status), count in sorted(job_counts.items())]),
+        ('pool_running', 'gauge', 'Jobs running per scheduler pool',
+         [({'pool': name}, pool['running']) for name, pool in pools.items()]),
+        ('pool_queued', 'gauge', 'Jobs waiting per scheduler pool',
+         [({'pool': name}, pool['queued']) for name, pool in pools.items()]),
+        ('kie_tasks_tracked', 'gauge', 'kie.ai tasks still generating', [({}, kie['tracked'])]),
+        ('kie_polls_total', 'counter', 'kie.ai record-info polls', [({}, kie['polls'])]),
+        ('kie_callbacks_total', 'counter', 'kie.ai callbacks received', [({}, kie['callbacks'])]),
+        ('yue_queued', 'gauge', 'YuE covers waiting for a worker', [({}, yue['queued'])]),
+        ('yue_processes', 'gauge', 'YuE worker processes with models loaded', [({}, yue['processes'])]),
+    ]
+
+
+metrics.register_collector(collect_service_metrics)
+
+
+@app.route('/metrics')
+def prometheus_metrics():
+    """Stage timings and service state in the Prometheus text format"""
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+
+@app.route('/jobs')
+def list_jobs():
+    """Status of all running and recently finished jobs"""
+    status = request.args.get('status')
+    return jsonify([job.to_dict() for job in job_registry.list(status)])
+
+
+@app.route('/jobs/<job_id>')
+def job_status(job_id):
+    """Status of a single job"""
+    job = job_registry.get(job_id)
+    if not job:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job.to_dict())
+
+
+@app.route('/jobs/<job_id>/events')
+def job_events(job_id):
+    """Job progress as an SSE stream, resumable with Last-Event-ID
+
+    When served through asgi.py this route is handled asynchronously there;
+    this WSGI version ends each stream after JOB_EVENTS_MAX_SECONDS so a
+    watcher never holds a request thread for a whole job.
+    """
+    job = job_registry.get(job_id)
+    if not job:
+        return jsonify({'error': 'Job not found'}), 404
+
+    since = jobs.parse_last_event_id(request.headers.get('Last-Event-ID', request.args.get('lastEventId')))
+    return Response(job.stream(since, max_seconds=jobs.JOB_EVENTS_MAX_SECONDS),
+                    mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+# Watch DOWNLOADS_DIR (local mode: keeps the library in sync with it).
+# GitHub mode: build the library index on first start (or a wiped data dir)
+# and refresh the repo size in the background.
+threading.Thread(target=start_local_watcher, daemon=True).start()
+if GITHUB_ENABLED:
+    if library.is_empty():
+        threading.Thread(target=rebuild_library, daemon=True).start()
+    threading.Thread(target=refresh_repo_size, daemon=True).start()
+
+# Pick up jobs interrupted by the last restart or redeploy
+job_registry.resume_unfinished()
 
 
 if __name__ == '__main__':
@@ -0,0 +1,235 @@
+"""
+Similarity Module
+Compact audio feature vectors per stem and a nearest-neighbour index over
+them, for "more samples like this one".
+
+Vectors live in one append-only float32 array (SIMILARITY_DIR/features.f32)
+with a JSON-lines log mapping rows to library paths (features.jsonl). Stems
+are added as run_stem_isolation produces them; re-analyzed or deleted stems
+leave dead rows that are compacted away once they outnumber the live ones.
+"""
+
+import os
+import json
+import threading
+
+SIMILARITY_DIR = os.environ.get(
+    'SIMILARITY_DIR',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'similarity')
+)
+
+# Seconds of audio analyzed per stem - enough to characterise a loop
+SIMILARITY_SECONDS = float(os.environ.get('SIMILARITY_SECONDS', 60))
+
+SAMPLE_RATE = 22050
+N_MFCC = 20
+# MFCC + chroma + 6 spectral curves, each summarised by mean and std
+FEATURE_DIM = 2 * (N_MFCC + 12 + 6)
+
+
+def stem_features(audio_file):
+    """Feature vector for one audio file (FEATURE_DIM float32 values)
+
+    One STFT feeds every descriptor; each frame-wise curve is reduced to its
+    mean and standard deviation.
+    """
+    import librosa
+    import numpy as np
+
+    y, sr = librosa.load(audio_file, sr=SAMPLE_RATE, mono=True, duration=SIMILARITY_SECONDS)
+    if not len(y):
+        raise ValueError(f'No audio in {audio_file}')
+
+    S = np.abs(librosa.stft(y, n_fft=2048, hop_length=512))
+    power = S ** 2
+    mfcc = librosa.feature.mfcc(S=librosa.power_to_db(librosa.feature.melspectrogram(S=power, sr=sr)),
+                                n_mfcc=N_MFCC)
+    chroma = librosa.feature.chroma_stft(S=power, sr=sr)
+    spectral = np.vstack([
+        np.log1p(librosa.feature.spectral_centroid(S=S, sr=sr)),
+        np.log1p(librosa.feature.spectral_bandwidth(S=S, sr=sr)),
+        np.log1p(librosa.feature.spectral_rolloff(S=S, sr=sr)),
+        librosa.feature.spectral_flatness(S=S),
+        librosa.feature.zero_crossing_rate(y, frame_length=2048, hop_length=512)[:, :S.shape[1]],
+        np.log1p(librosa.feature.rms(S=S)),
+    ])
+
+    frames = np.vstack([mfcc, chroma, spectral[:, :mfcc.shape[1]]])
+    return np.concatenate([frames.mean(axis=1), frames.std(axis=1)]).astype(np.float32)
+
+
+class SimilarityIndex:
+    """Thread-safe cosine nearest-neighbour index over stem feature vectors
+
+    Features are standardised per dimension over the live rows, so MFCCs and
+    spectral curves weigh in equally. Queries are one float32 matrix-vector
+    product plus a partial sort (argpartition) of the top k.
+    """
+
+    def __init__(self, directory=SIMILARITY_DIR):
+        self.directory = directory
+        self.array_path = os.path.join(directory, 'features.f32')
+        self.log_path = os.path.join(directory, 'features.jsonl')
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._rows = 0          # rows in the array file, live or dead
+        self._paths = {}        # library path -> row
+        self._vectors = None    # (capacity, FEATURE_DIM) array, first _rows rows used
+        self._normalized = None # (paths, matrix) cache for queries
+
+    def _load(self):
+        """Read the array and replay the log (caller holds the lock)"""
+        if self._loaded:
+            return
+        import numpy as np
+
+        os.makedirs(self.directory, exist_ok=True)
+        vectors = np.zeros((0, FEATURE_DIM), dtype=np.float32)
+        if os.path.exists(self.array_path):
+            raw = np.fromfile(self.array_path, dtype=np.float32)
+            if raw.size % FEATURE_DIM == 0:
+                vectors = raw.reshape(-1, FEATURE_DIM)
+            else:
+                print('Similarity index: feature size changed, starting over')
+                os.remove(self.array_path)
+                if os.path.exists(self.log_path):
+                    os.remove(self.log_path)
+
+        paths = {}
+        if os.path.exists(self.log_path):
+            with open(self.log_path) as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue  # torn last line after a crash
+                    if 'remove' in entry:
+                        prefix = entry['remove'].rstrip('/') + '/'
+                        for path in [p for p in paths if p == entry['remove'] or p.startswith(prefix)]:
+                            del paths[path]
+                    elif entry.get('row', len(vectors)) < len(vectors):
+                        paths[entry['path']] = entry['row']
+
+        self._vectors = vectors
+        self._rows = len(vectors)
+        self._paths = paths
+        self._loaded = True
+
+    def __contains__(self, path):
+        with self._lock:
+            self._load()
+            return path in self._paths
+
+    def __len__(self):
+        with self._lock:
+            self._load()
+            return len(self._paths)
+
+    def add(self, path, vector):
+        """Store the vector for a library path, replacing any previous one"""
+        import numpy as np
+
+        vector = np.asarray(vector, dtype=np.float32).reshape(1, FEATURE_DIM)
+        with self._lock:
+            self._load()
+            with open(self.array_path, 'ab') as f:
+                vector.tofile(f)
+            self._log({'path': path, 'row': self._rows})
+            if self._rows == len(self._vectors):
+                # Grow by doubling so a backfill of n stems copies O(n) rows, not O(n^2)
+                grown = np.zeros((max(64, 2 * len(self._vectors)), FEATURE_DIM), dtype=np.float32)
+                grown[:self._rows] = self._vectors[:self._rows]
+                self._vectors = grown
+            self._vectors[self._rows] = vector[0]
+            self._paths[path] = self._rows
+            self._rows += 1
+            self._normalized = None
+            # Re-analyzed stems leave their old rows behind
+            if self._rows > 2 * len(self._paths) + 100:
+                self._compact()
+
+    def remove(self, path):
+        """Forget a stem, or every stem under a channel or beat folder"""
+        with self._lock:
+            self._load()
+            prefix = path.rstrip('/') + '/'
+            gone = [p for p in self._paths if p == path or p.startswith(prefix)]
+            if not gone:
+                return 0
+            for p in gone:
+                del self._paths[p]
+            self._log({'remove': path})
+            self._normalized = None
+            if self._rows > 2 * len(self._paths) + 100:
+                self._compact()
+            return len(gone)
+
+    def nearest(self, path, k=10, exclude_prefix=None):
+        """The k stems most similar to an indexed stem
+
+        Args:
+            exclude_prefix: Skip results under this path (e.g. the query's own beat)
+
+        Returns:
+            [(path, similarity)] best first, or None if path has no vector
+        """
+        import numpy as np
+
+        with self._lock:
+            self._load()
+            if path not in self._paths:
+                return None
+            if self._normalized is None:
+                self._normalized = self._normalize()
+            paths, matrix, positions = self._normalized
+
+        scores = matrix @ matrix[positions[path]]
+        count = len(paths)
+        # Sort only the best few; widen the window if exclusions used it up
+        wanted = min(count, k + 1)
+        while True:
+            if wanted < count:
+                top = np.argpartition(-scores, wanted - 1)[:wanted]
+            else:
+                top = np.arange(count)
+            top = top[np.argsort(-scores[top], kind='stable')]
+            results = []
+            for i in top:
+                candidate = paths[i]
+                if candidate == path or (exclude_prefix and candidate.startswith(exclude_prefix)):
+                    continue
+                results.append((candidate, round(float(scores[i]), 4)))
+                if len(results) == k:
+                    return results
+            if wanted == count:
+                return results
+            wanted = min(count, wanted * 2)
+
+    def _normalize(self):
+        """Standardise live vectors and scale rows to unit length for cosine"""
+        import numpy as np
+
+        paths = list(self._paths)
+        matrix = self._vectors[[self._paths[p] for p in paths]].astype(np.float32)
+        if len(matrix):
+            matrix = (matrix - matrix.mean(axis=0)) / (matrix.std(axis=0) + 1e-6)
+            matrix /= np.linalg.norm(matrix, axis=1, keepdims=True) + 1e-9
+        return paths, matrix, {p: i for i, p in enumerate(paths)}
+
+    def _log(self, entry):
+        with open(self.log_path, 'a') as f:
+            f.write(json.dumps(entry) + '\n')
+
+    def _compact(self):
+        """Rewrite the array and log with live rows only (caller holds the lock)"""
+        paths = list(self._paths)
+        vectors = self._vectors[[self._paths[p] for p in paths]]
+        vectors.tofile(self.array_path + '.tmp')
+        with open(self.log_path + '.tmp', 'w') as f:
+            for row, path in enumerate(paths):
+                f.write(json.dumps({'path': path, 'row': row}) + '\n')
+        os.replace(self.array_path + '.tmp', self.array_path)
+        os.replace(self.log_path + '.tmp', self.log_path)
+        self._vectors = vectors
+        self._rows = len(paths)
+        self._paths = {path: row for row, path in enumerate(paths)}
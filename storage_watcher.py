@@ -0,0 +1,181 @@
+"""
+Storage Watcher Module
+Keeps an in-memory view of the local downloads folder (file sizes plus
+per-channel byte totals) up to date from filesystem change notifications, so
+local-mode listings and storage stats never walk the disk per request.
+Uses watchdog (inotify on Linux) when it is installed, otherwise polls.
+"""
+
+import os
+import threading
+
+# Seconds between directory scans when watchdog is not installed
+WATCH_POLL_INTERVAL = float(os.environ.get('WATCH_POLL_INTERVAL', 5))
+
+# Seconds to gather notifications before applying them - files being written
+# fire many modify events, this applies one per file
+WATCH_SETTLE_SECONDS = float(os.environ.get('WATCH_SETTLE_SECONDS', 1))
+
+try:
+    from watchdog.observers import Observer
+    WATCHDOG_AVAILABLE = True
+except ImportError:
+    WATCHDOG_AVAILABLE = False
+
+
+def _ignored(rel_path):
+    """Hidden files and in-progress .temp_download_* folders are not storage"""
+    return any(part.startswith('.') for part in rel_path.split('/'))
+
+
+class StorageWatcher:
+    """In-memory view of a storage folder kept current in the background
+
+    Args:
+        root: Folder to watch
+        on_file: Optional callback(rel_path, size, mtime) for new or changed files
+        on_remove: Optional callback(rel_path) for deleted files
+    """
+
+    def __init__(self, root, on_file=None, on_remove=None, poll_interval=WATCH_POLL_INTERVAL):
+        self.root = root
+        self.on_file = on_file
+        self.on_remove = on_remove
+        self.poll_interval = poll_interval
+        self.mode = None
+        self._files = {}            # rel path -> (size, mtime)
+        self._channel_bytes = {}
+        self._total_bytes = 0
+        self._dirty = set()         # rel paths notified since the last apply
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._observer = None
+
+    def start(self):
+        """Scan the folder once, then follow changes in a background thread"""
+        with self._lock:
+            for rel_path, stat in self._walk('').items():
+                self._set(rel_path, stat)
+
+        if WATCHDOG_AVAILABLE:
+            self._observer = Observer()
+            self._observer.schedule(self, self.root, recursive=True)
+            self._observer.daemon = True
+            self._observer.start()
+            self.mode = 'inotify'
+        else:
+            self.mode = 'poll'
+
+        thread = threading.Thread(target=self._loop, name='storage-watcher', daemon=True)
+        thread.start()
+        print(f'Storage watcher started ({self.mode}): {len(self._files)} files')
+
+    def stop(self):
+        self._stop.set()
+        if self._observer:
+            self._observer.stop()
+
+    def files(self):
+        """[{'path', 'size', 'updated'}] for every file in the view"""
+        with self._lock:
+            return [{'path': path, 'size': size, 'updated': mtime}
+                    for path, (size, mtime) in self._files.items()]
+
+    def usage(self):
+        """Total bytes, file count and bytes per channel"""
+        with self._lock:
+            return {
+                'bytes': self._total_bytes,
+                'files': len(self._files),
+                'channels': dict(self._channel_bytes)
+            }
+
+    def dispatch(self, event):
+        """watchdog callback - remember which paths changed, apply them later"""
+        for attr in ('src_path', 'dest_path'):
+            path = getattr(event, attr, None)
+            if path:
+                rel_path = os.path.relpath(path, self.root).replace(os.sep, '/')
+                if not rel_path.startswith('..') and not _ignored(rel_path):
+                    with self._lock:
+                        self._dirty.add(rel_path)
+
+    def _loop(self):
+        interval = WATCH_SETTLE_SECONDS if self.mode == 'inotify' else self.poll_interval
+        while not self._stop.wait(interval):
+            try:
+                if self.mode == 'inotify':
+                    with self._lock:
+                        dirty, self._dirty = self._dirty, set()
+                    for rel_path in sorted(dirty):
+                        self._refresh(rel_path)
+                else:
+                    self._refresh('')
+            except Exception as e:
+                print(f'Storage watcher error: {e}')
+
+    def _refresh(self, rel_path):
+        """Bring the view in line with the disk for one file or folder ('' = everything)"""
+        on_disk = self._walk(rel_path)
+        prefix = rel_path + '/' if rel_path else ''
+        changed, removed = [], []
+        with self._lock:
+            for path in list(self._files):
+                if (path == rel_path or path.startswith(prefix)) and path not in on_disk:
+                    self._drop(path)
+                    removed.append(path)
+            for path, stat in on_disk.items():
+                if self._files.get(path) != stat:
+                    self._set(path, stat)
+                    changed.append((path, stat))
+
+        for path in removed:
+            if self.on_remove:
+                self.on_remove(path)
+        for path, (size, mtime) in changed:
+            if self.on_file:
+                self.on_file(path, size, mtime)
+
+    def _walk(self, rel_path):
+        """{rel path: (size, mtime)} for a file or everything below a folder"""
+        full_path = os.path.join(self.root, rel_path) if rel_path else self.root
+        found = {}
+        if os.path.isfile(full_path):
+            try:
+                stat = os.stat(full_path)
+                found[rel_path] = (stat.st_size, stat.st_mtime)
+            except OSError:
+                pass
+            return found
+
+        for root, dirs, filenames in os.walk(full_path):
+            dirs[:] = [d for d in dirs if not d.startswith('.')]
+            for filename in filenames:
+                if filename.startswith('.'):
+                    continue
+                path = os.path.join(root, filename)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                found[os.path.relpath(path, self.root).replace(os.sep, '/')] = (stat.st_size, stat.st_mtime)
+        return found
+
+    def _set(self, rel_path, stat):
+        """Add or update a file (caller holds the lock)"""
+        self._drop(rel_path)
+        self._files[rel_path] = stat
+        channel = rel_path.split('/')[0]
+        self._channel_bytes[channel] = self._channel_bytes.get(channel, 0) + stat[0]
+        self._total_bytes += stat[0]
+
+    def _drop(self, rel_path):
+        """Forget a file (caller holds the lock)"""
+        stat = self._files.pop(rel_path, None)
+        if stat is None:
+            return
+        channel = rel_path.split('/')[0]
+        self._channel_bytes[channel] -= stat[0]
+        if self._channel_bytes[channel] <= 0:
+            del self._channel_bytes[channel]
+        self._total_bytes -= stat[0]
@@ -0,0 +1,154 @@
+"""
+Test setup: a throwaway library and a local kie.ai stand-in.
+
+The server reads its configuration when it is imported, so the environment
+is pointed at temporary paths and at the stand-in here, before any test
+imports it.
+"""
+
+import os
+import sys
+import json
+import shutil
+import tempfile
+import threading
+import time
+from itertools import count
+from urllib.parse import urlparse, parse_qs
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+CLIP_AUDIO = b'ID3' + bytes(4096)
+
+
+class KieStandIn:
+    """upload-cover, record-info and clip downloads of kie.ai on a local port
+
+    Tasks stay PENDING until a test calls finish(); record-info then returns
+    their clips. Nothing is pushed to callback URLs - tests post callbacks
+    themselves.
+    """
+
+    def __init__(self):
+        self.tasks = {}     # task id -> {'status', 'callBackUrl', 'uploadUrl'}
+        self.polls = []     # task ids asked for by record-info
+        self._ids = count(1)
+        self._lock = threading.Lock()
+        stand_in = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def reply(self, status, body, content_type='application/json'):
+                data = body if isinstance(body, bytes) else json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers.get('Content-Length') or 0)) or b'{}')
+                if self.path != '/api/v1/generate/upload-cover':
+                    return self.reply(404, {'code': 404, 'msg': 'Not found'})
+                task_id = stand_in.create(body)
+                self.reply(200, {'code': 200, 'msg': 'success', 'data': {'taskId': task_id}})
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                if url.path == '/api/v1/generate/record-info':
+                    task_id = parse_qs(url.query).get('taskId', [''])[0]
+                    record = stand_in.record(task_id)
+                    if record is None:
+                        return self.reply(200, {'code': 404, 'msg': 'Task not found'})
+                    return self.reply(200, {'code': 200, 'msg': 'success', 'data': record})
+                if url.path.startswith('/audio/'):
+                    return self.reply(200, CLIP_AUDIO, 'audio/mpeg')
+                self.reply(404, {'code': 404, 'msg': 'Not found'})
+
+        self._http = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self._http.daemon_threads = True
+        self.base_url = f'http://127.0.0.1:{self._http.server_address[1]}'
+        threading.Thread(target=self._http.serve_forever, daemon=True).start()
+
+    def create(self, body):
+        with self._lock:
+            task_id = f'task{next(self._ids):04d}'
+            self.tasks[task_id] = {'status': 'PENDING', 'callBackUrl': body.get('callBackUrl'),
+                                   'uploadUrl': body.get('uploadUrl')}
+        return task_id
+
+    def clips(self, task_id):
+        return [{'id': f'{task_id}-{n}', 'audioUrl': f'{self.base_url}/audio/{task_id}-{n}.mp3'}
+                for n in (1, 2)]
+
+    def record(self, task_id):
+        with self._lock:
+            self.polls.append(task_id)
+            task = self.tasks.get(task_id)
+            if task is None:
+                return None
+            status = task['status']
+        return {'taskId': task_id, 'status': status,
+                'response': {'sunoData': self.clips(task_id) if status == 'SUCCESS' else []}}
+
+    def finish(self, task_id):
+        with self._lock:
+            self.tasks[task_id]['status'] = 'SUCCESS'
+
+    def callback(self, task_id, callback_type='complete'):
+        """Body kie.ai POSTs to callBackUrl for a task stage"""
+        clips = [{'id': clip['id'], 'audio_url': clip['audioUrl'], 'duration': 1.0}
+                 for clip in self.clips(task_id)] if callback_type != 'error' else None
+        return {'code': 200, 'msg': 'All generated successfully.',
+                'data': {'callbackType': callback_type, 'task_id': task_id, 'data': clips}}
+
+
+WORK_DIR = tempfile.mkdtemp(prefix='ytaicover-tests-')
+KIE = KieStandIn()
+
+os.environ.update({
+    'DOWNLOADS_DIR': os.path.join(WORK_DIR, 'downloads'),
+    'LIBRARY_INDEX_PATH': os.path.join(WORK_DIR, 'library.sqlite3'),
+    'JOB_STORE_PATH': os.path.join(WORK_DIR, 'jobs.sqlite3'),
+    'SIMILARITY_DIR': os.path.join(WORK_DIR, 'similarity'),
+    'KIE_API_KEY': 'test',
+    'KIE_API_BASE': f'{KIE.base_url}/api/v1',
+    'KIE_CALLBACK_TOKEN': 'test-token',
+    'KIE_POLL_FIRST_SECONDS': '1',
+    'KIE_POLL_MIN_SECONDS': '1',
+    'KIE_POLL_MAX_SECONDS': '1',
+    'PUBLIC_BASE_URL': 'https://ytaicover.test',
+})
+for name in ('GITHUB_TOKEN', 'GITHUB_REPO'):
+    os.environ.pop(name, None)
+
+
+def pytest_sessionfinish(session, exitstatus):
+    shutil.rmtree(WORK_DIR, ignore_errors=True)
+
+
+@pytest.fixture
+def kie():
+    return KIE
+
+
+@pytest.fixture(scope='session')
+def server():
+    import server
+
+    # Let the startup scan rebuild the (empty) library before tests add to it
+    deadline = time.time() + 10
+    while any('start_local_watcher' in thread.name for thread in threading.enumerate()):
+        assert time.time() < deadline, 'startup library scan did not finish'
+        time.sleep(0.01)
+    return server
+
+
+@pytest.fixture
+def client(server):
+    return server.app.test_client()
@@ -0,0 +1,52 @@
+"""DiskCache pinning and eviction"""
+
+import os
+
+import audio_cache
+
+
+def make_cache(tmp_path, max_bytes):
+    def fetch(rel_path, local_path):
+        os.makedirs(os.path.dirname(local_path), exist_ok=True)
+        with open(local_path, 'wb') as f:
+            f.write(bytes(100))
+        return True
+
+    return audio_cache.DiskCache(str(tmp_path), fetch, max_bytes=max_bytes)
+
+
+def test_unpin_releases_one_file(tmp_path):
+    cache = make_cache(tmp_path, max_bytes=150)
+    first = cache.get('c/a/a.mp3', owner='job')
+    second = cache.get('c/b/b.mp3', owner='job')
+    assert os.path.exists(first) and os.path.exists(second)
+
+    cache.unpin('c/a/a.mp3', 'job')
+    assert not os.path.exists(first)
+    assert os.path.exists(second)
+    assert cache.stats()['pinned'] == 1
+
+    cache.release('job')
+    assert cache.stats()['pinned'] == 0
+
+
+def test_file_pinned_by_another_owner_stays(tmp_path):
+    cache = make_cache(tmp_path, max_bytes=50)
+    path = cache.get('c/a/a.mp3', owner='one')
+    cache.get('c/a/a.mp3', owner='two')
+
+    cache.unpin('c/a/a.mp3', 'one')
+    assert os.path.exists(path)
+    cache.unpin('c/a/a.mp3', 'two')
+    assert not os.path.exists(path)
+
+
+def test_remove_deletes_local_copies_under_a_folder(tmp_path):
+    cache = make_cache(tmp_path, max_bytes=1000)
+    first = cache.get('c/a/isolated_samples/x.mp3')
+    second = cache.get('c/a/ai_covers/y.mp3')
+
+    assert cache.remove('c/a')
+    assert not os.path.exists(first) and not os.path.exists(second)
+    assert cache.stats()['files'] == 0 and cache.stats()['bytes'] == 0
+    assert not cache.remove('c/a')
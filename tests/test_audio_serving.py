@@ -0,0 +1,116 @@
+"""/serve-audio byte ranges, validators and the async handler"""
+
+import os
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+import audio_serving
+
+SIZE = 1000
+STAT = SimpleNamespace(st_mtime_ns=1_700_000_000_000_000_000, st_size=SIZE, st_mtime=1_700_000_000)
+ETAG = audio_serving.file_etag(STAT)
+
+
+@pytest.mark.parametrize('header, expected', [
+    ('bytes=0-99', (0, 99)),
+    ('bytes=-100', (900, 999)),          # suffix
+    ('bytes=-5000', (0, 999)),           # suffix longer than the file
+    ('bytes=500-', (500, 999)),          # open-ended
+    ('bytes=900-5000', (900, 999)),      # end past EOF is clamped
+    ('bytes=999-999', (999, 999)),
+])
+def test_satisfiable_ranges(header, expected):
+    assert audio_serving.parse_range(header, SIZE) == expected
+
+
+@pytest.mark.parametrize('header', ['bytes=1000-', 'bytes=5000-6000', 'bytes=-0'])
+def test_unsatisfiable_ranges(header):
+    with pytest.raises(ValueError):
+        audio_serving.parse_range(header, SIZE)
+
+
+@pytest.mark.parametrize('header', [None, '', 'bytes=abc-', 'bytes=-', 'bytes=5-2', 'items=0-5',
+                                    'bytes=0-5,10-20', 'bytes=--5', 'bytes=1-2-3'])
+def test_unparsable_ranges_are_ignored(header):
+    assert audio_serving.parse_range(header, SIZE) is None
+
+
+def test_if_range_mismatch_serves_whole_file():
+    assert audio_serving.parse_range('bytes=0-99', SIZE, '"stale-etag"', STAT) is None
+
+
+def test_if_range_match_keeps_range():
+    assert audio_serving.parse_range('bytes=0-99', SIZE, f'"{ETAG}"', STAT) == (0, 99)
+
+
+def test_not_modified():
+    assert audio_serving.not_modified(STAT, f'"{ETAG}"')
+    assert audio_serving.not_modified(STAT, f'W/"{ETAG}", "other"')
+    assert not audio_serving.not_modified(STAT, '"other"')
+
+
+def serve(asgi, rel_path, headers=()):
+    sent = []
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {'type': 'http', 'method': 'GET', 'path': f'/serve-audio/{rel_path}',
+             'headers': [(k.encode(), v.encode()) for k, v in headers], 'query_string': b''}
+    asyncio.run(asgi.serve_audio(scope, send, rel_path))
+    return sent
+
+
+def write(server, rel_path, data):
+    path = os.path.join(server.DOWNLOADS_DIR, rel_path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(data)
+
+
+def test_asgi_empty_file_ends_response(server):
+    import asgi
+    write(server, 'Audio/Empty/Empty.mp3', b'')
+
+    sent = serve(asgi, 'Audio/Empty/Empty.mp3')
+    assert sent[0]['status'] == 200
+    assert sent[-1]['type'] == 'http.response.body' and not sent[-1].get('more_body')
+
+
+def test_asgi_range_and_invalid_range(server):
+    import asgi
+    write(server, 'Audio/Range/Range.mp3', bytes(range(200)))
+
+    sent = serve(asgi, 'Audio/Range/Range.mp3', [('Range', 'bytes=10-19')])
+    assert sent[0]['status'] == 206
+    assert b''.join(m.get('body', b'') for m in sent[1:]) == bytes(range(10, 20))
+
+    sent = serve(asgi, 'Audio/Range/Range.mp3', [('Range', 'bytes=abc-')])
+    assert sent[0]['status'] == 200
+    assert b''.join(m.get('body', b'') for m in sent[1:]) == bytes(range(200))
+
+    sent = serve(asgi, 'Audio/Range/Range.mp3', [('Range', 'bytes=500-')])
+    assert sent[0]['status'] == 416
+
+
+class CountingCache:
+    def __init__(self):
+        self.fetched = []
+
+    def get(self, rel_path, owner=None):
+        self.fetched.append(rel_path)
+        return None
+
+
+def test_unknown_paths_are_not_fetched(server, monkeypatch):
+    cache = CountingCache()
+    monkeypatch.setattr(server, 'file_cache', cache)
+
+    assert server.resolve_audio_path('Nobody/Nothing/Nothing.mp3') is None
+    assert cache.fetched == []
+
+    server.library.add_file('Known/Beat/Beat.mp3', 10)
+    assert server.resolve_audio_path('Known/Beat/Beat.mp3') is None
+    assert cache.fetched == ['Known/Beat/Beat.mp3']
@@ -0,0 +1,35 @@
+"""/cover/batch request validation and the cover defaults the UI reads"""
+
+import pytest
+
+import cover_sources
+
+
+@pytest.mark.parametrize('pairs', ['Beat', {'beat': 'Beat'}, ['Beat'], [{'beat': 'Beat'}, None],
+                                   [{'beat': 3, 'genre': 'jazz'}]])
+def test_malformed_pairs_are_rejected(client, pairs):
+    response = client.post('/cover/batch', json={'channel': 'Chan', 'stems': ['Drums'], 'pairs': pairs})
+    assert response.status_code == 400
+
+
+@pytest.mark.parametrize('body', [{'beats': ['Beat'], 'genres': [7]}, {'beats': 'Beat'},
+                                  {'beats': ['Beat'], 'genres': 'jazz'}])
+def test_beats_and_genres_must_be_string_lists(client, body):
+    response = client.post('/cover/batch', json=dict(body, channel='Chan', stems=['Drums']))
+    assert response.status_code == 400
+
+
+def test_null_genre_is_no_genre(client, server, monkeypatch):
+    submitted = []
+    monkeypatch.setattr(server, 'submit_job',
+                        lambda kind, key, params, priority: submitted.append(params) or ('', 202))
+    response = client.post('/cover/batch', json={'channel': 'Chan', 'stems': ['Drums'],
+                                                 'pairs': [{'beat': 'Beat', 'genre': None},
+                                                           {'beat': 'Beat', 'genre': ' '}]})
+    assert response.status_code == 202
+    assert submitted[0]['pairs'] == [('Beat', '')]
+
+
+def test_storage_info_reports_reduce_default(client, monkeypatch):
+    monkeypatch.setattr(cover_sources, 'COVER_SOURCE_REDUCE', True)
+    assert client.get('/storage-info').get_json()['cover_source_reduce'] is True
@@ -0,0 +1,53 @@
+"""Stem mixdown and limiter"""
+
+import pytest
+
+np = pytest.importorskip('numpy')
+
+import cover_sources
+
+RATE = cover_sources.SAMPLE_RATE
+
+
+def tone(seconds, amplitude, freq=220.0):
+    t = np.arange(int(RATE * seconds)) / RATE
+    wave = (amplitude * np.sin(2 * np.pi * freq * t)).astype(np.float32)
+    return np.stack([wave, wave], axis=1)
+
+
+def test_quiet_audio_is_untouched():
+    samples = tone(0.5, 0.3)
+    assert np.array_equal(cover_sources.limit(samples.copy(), 0.9), samples)
+
+
+def test_peaks_stay_under_ceiling_without_reshaping():
+    samples = tone(1.0, 0.4)
+    hit = slice(RATE // 2, RATE // 2 + 200)
+    samples[hit] *= 4   # a drum-like transient well over the ceiling
+    original = samples.copy()
+
+    limited = cover_sources.limit(samples, 0.9)
+    assert np.abs(limited).max() <= 0.9 + 1e-6
+
+    # Gain changes slowly: output/input ratio is smooth, not a waveshaper
+    loud = np.abs(original[:, 0]) > 0.05
+    ratio = limited[loud, 0] / original[loud, 0]
+    assert np.abs(np.diff(ratio)).max() < 0.02
+    # Well away from the transient nothing changes
+    assert np.allclose(limited[:RATE // 4], original[:RATE // 4])
+
+
+def test_mix_sums_tracks_of_different_lengths():
+    short = tone(0.25, 0.1)
+    long = tone(0.5, 0.1, 330.0)
+    mixed = cover_sources.mix(iter([short, long]))
+
+    assert mixed.shape == long.shape
+    target = 10 ** (cover_sources.MIX_TARGET_RMS_DB / 20)
+    assert np.sqrt(np.mean(np.square(mixed, dtype=np.float64))) == pytest.approx(target, rel=0.05)
+    assert np.abs(mixed).max() <= 10 ** (cover_sources.MIX_CEILING_DB / 20) + 1e-6
+
+
+def test_mix_does_not_write_into_tracks():
+    track = np.frombuffer(tone(0.1, 0.2).tobytes(), dtype=np.float32).reshape(-1, 2)   # read-only, like decode()
+    cover_sources.mix([track, track])
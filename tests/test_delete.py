@@ -0,0 +1,129 @@
+"""/delete driven by the library index, with GitHub storage and an evicting cache"""
+
+import os
+
+import pytest
+
+import audio_cache
+import github_storage
+
+CHANNEL = 'DeleteChannel'
+
+
+def beat_paths(beat):
+    return [f'{CHANNEL}/{beat}/{beat}.mp3',
+            f'{CHANNEL}/{beat}/isolated_samples/Drums_{beat}.mp3',
+            f'{CHANNEL}/{beat}/ai_covers/AI_Cover_jazz_1.mp3',
+            f'{CHANNEL}/{beat}/previews/Drums_{beat}.preview.mp3']
+
+
+@pytest.fixture
+def github(server, monkeypatch, tmp_path):
+    """GitHub mode against a fake repo; DOWNLOADS_DIR becomes an empty cache"""
+    repo = set()
+    refused = set()
+
+    def delete_from_github(rel_path):
+        if rel_path in refused or rel_path not in repo:
+            return False
+        repo.discard(rel_path)
+        return True
+
+    def store(beat):
+        for rel_path in beat_paths(beat):
+            repo.add(rel_path)
+            server.library.add_file(rel_path, 100, f'https://raw.test/{rel_path}')
+        source = f'{CHANNEL}/{beat}/cover_sources/mix_Drums_{beat}.mp3'
+        repo.add(source)
+        server.library.add_cover_source(f'digest-{beat}', source, f'https://raw.test/{source}')
+
+    cache = audio_cache.DiskCache(str(tmp_path), lambda rel_path, local_path: False)
+    monkeypatch.setattr(server, 'GITHUB_ENABLED', True)
+    monkeypatch.setattr(server, 'DOWNLOADS_DIR', str(tmp_path))
+    monkeypatch.setattr(server, 'file_cache', cache)
+    monkeypatch.setattr(github_storage, 'delete_from_github', delete_from_github)
+    yield repo, refused, store, cache
+    server.library.remove(CHANNEL)
+
+
+def indexed(server, beat=None):
+    return [row['path'] for category in ('original', 'stem', 'cover', 'preview')
+            for row in server.library.files(category, CHANNEL, beat)] + \
+        server.library.cover_source_paths(CHANNEL, beat)
+
+
+def test_evicted_beat_is_deleted_from_github(client, server, github):
+    repo, _, store, _ = github
+    store('Evicted')
+
+    response = client.post('/delete', json={'channel': CHANNEL, 'beat': 'Evicted'})
+
+    assert response.get_json()['success']
+    assert response.get_json()['deleted_github'] == 5
+    assert repo == set()
+    assert indexed(server, 'Evicted') == []
+
+
+def test_partly_cached_stems_are_all_deleted(client, server, github):
+    repo, _, store, cache = github
+    store('Partly')
+    cached = f'{CHANNEL}/Partly/isolated_samples/Drums_Partly.mp3'
+    os.makedirs(os.path.dirname(cache.local_path(cached)))
+    with open(cache.local_path(cached), 'wb') as f:
+        f.write(bytes(100))
+    cache.add(cached)
+
+    result = client.post('/delete', json={'channel': CHANNEL, 'type': 'stems'}).get_json()
+
+    assert result['success']
+    assert result['deleted_local'] == 1
+    assert not os.path.exists(cache.local_path(cached))
+    assert cache.stats()['files'] == 0
+    assert sorted(repo) == [f'{CHANNEL}/Partly/Partly.mp3', f'{CHANNEL}/Partly/ai_covers/AI_Cover_jazz_1.mp3']
+    assert indexed(server) == sorted(repo)
+
+
+def test_failed_github_delete_keeps_index_row(client, server, github):
+    repo, refused, store, _ = github
+    store('Stuck')
+    stuck = f'{CHANNEL}/Stuck/ai_covers/AI_Cover_jazz_1.mp3'
+    refused.add(stuck)
+
+    response = client.post('/delete', json={'channel': CHANNEL, 'beat': 'Stuck'})
+
+    assert not response.get_json()['success']
+    assert response.get_json()['failed'] == [stuck]
+    assert repo == {stuck}
+    assert indexed(server, 'Stuck') == [stuck]
+
+
+def test_local_only_delete_keeps_storage(client, server, github):
+    repo, _, store, _ = github
+    store('Kept')
+
+    result = client.post('/delete', json={'channel': CHANNEL, 'beat': 'Kept', 'deleteFromGithub': False}).get_json()
+
+    assert result['success']
+    assert len(repo) == 5
+    assert len(indexed(server, 'Kept')) == 5
+
+
+def test_unknown_type_is_rejected(client):
+    assert client.post('/delete', json={'channel': CHANNEL, 'type': 'everything'}).status_code == 400
+
+
+def test_channel_delete_takes_every_file_of_every_beat(client, server, github):
+    repo, _, store, cache = github
+    store('One')
+    store('Two')
+    leftover = cache.local_path(f'{CHANNEL}/Two/cover_sources/mix_unuploaded.mp3')
+    os.makedirs(os.path.dirname(leftover))
+    open(leftover, 'wb').close()
+
+    result = client.post('/delete', json={'channel': CHANNEL, 'type': 'all'}).get_json()
+
+    assert result['success']
+    assert result['deleted_github'] == 10
+    assert repo == set()
+    assert indexed(server) == []
+    assert not os.path.exists(os.path.dirname(os.path.dirname(leftover)))
@@ -0,0 +1,60 @@
+"""GitHub tree listing and its contents-API fallback"""
+
+import pytest
+
+import github_storage
+
+
+class Response:
+    def __init__(self, status_code, body):
+        self.status_code = status_code
+        self.body = body
+        self.text = str(body)
+
+    def json(self):
+        return self.body
+
+
+def item(kind, path, size=10):
+    return {'type': kind, 'name': path.split('/')[-1], 'path': f'storage/{path}', 'size': size,
+            'download_url': f'https://raw.test/storage/{path}'}
+
+
+@pytest.fixture
+def repo(monkeypatch):
+    """URL suffix -> Response served to github_storage's requests.get"""
+    responses = {}
+
+    def get(url, **kwargs):
+        for suffix, response in responses.items():
+            if url.endswith(suffix):
+                return response
+        return Response(404, {'message': 'Not Found'})
+
+    monkeypatch.setattr(github_storage, 'USE_GITHUB', True)
+    monkeypatch.setattr(github_storage, 'GITHUB_REPO', 'owner/repo')
+    monkeypatch.setattr(github_storage.requests, 'get', get)
+    responses['/git/trees/main'] = Response(200, {'truncated': True, 'tree': []})
+    responses['/contents/storage'] = Response(200, [item('dir', 'Chan')])
+    responses['/contents/storage/Chan'] = Response(200, [item('dir', 'Chan/Beat'), item('file', 'Chan/notes.txt')])
+    responses['/contents/storage/Chan/Beat'] = Response(200, [item('file', 'Chan/Beat/Beat.mp3')])
+    return responses
+
+
+def test_truncated_tree_falls_back_to_contents(repo):
+    files = github_storage.list_github_tree()
+    assert [f['path'] for f in files] == ['Chan/Beat/Beat.mp3', 'Chan/notes.txt']
+
+
+def test_failed_fallback_is_not_an_empty_repo(repo):
+    repo['/contents/storage/Chan/Beat'] = Response(403, {'message': 'rate limited'})
+    assert github_storage.list_github_tree() is None
+
+    repo['/contents/storage'] = Response(500, {'message': 'oops'})
+    assert github_storage.list_github_tree() is None
+
+
+def test_missing_storage_folder_is_empty(repo):
+    del repo['/contents/storage']
+    assert github_storage.list_github_tree() == []
+    assert github_storage.list_github_files('Nobody') == []
@@ -0,0 +1,44 @@
+"""Async SSE job streams woken by the progress bus"""
+
+import asyncio
+import threading
+import time
+
+import jobs
+
+
+def test_stream_wakes_on_events_and_ends_with_the_job(server):
+    import asgi
+
+    job = jobs.Job('test', ('stream',), {})
+    sent = []
+    arrived = []
+
+    async def receive():
+        await asyncio.Event().wait()    # the client never disconnects
+
+    async def send(message):
+        sent.append(message)
+        if message.get('body'):
+            arrived.append(time.perf_counter())
+
+    def produce():
+        time.sleep(0.05)
+        for n in range(3):
+            job.put({'status': f'step {n}'})
+            time.sleep(0.05)
+        job.put({'complete': True, 'message': 'done'})
+
+    producer = threading.Thread(target=produce)
+    producer.start()
+    started = time.perf_counter()
+    asyncio.run(asyncio.wait_for(asgi.stream_job_events(job, 0, receive, send), 5))
+    producer.join()
+
+    body = b''.join(message.get('body', b'') for message in sent[1:]).decode()
+    assert [line for line in body.splitlines() if line.startswith('id:')] == \
+        ['id: 1', 'id: 2', 'id: 3', 'id: 4']
+    assert sent[-1] == {'type': 'http.response.body', 'body': b'', 'more_body': False}
+    # Woken by the bus rather than a polling tick
+    assert arrived[0] - started < 0.2
+    assert job.bus._listeners == []
@@ -0,0 +1,164 @@
+"""kie.ai callbacks and the record-info polling fallback, against the local stand-in"""
+
+import os
+import time
+import threading
+
+import jobs
+import kie_tasks
+
+CHANNEL = 'TestChannel'
+
+
+def add_stem(server, beat):
+    iso_dir = os.path.join(server.DOWNLOADS_DIR, CHANNEL, beat, 'isolated_samples')
+    os.makedirs(iso_dir, exist_ok=True)
+    with open(os.path.join(iso_dir, f'Drums_{beat}.mp3'), 'wb') as f:
+        f.write(beat.encode() + bytes(2048))
+
+
+def submit_cover(client, server, beat):
+    add_stem(server, beat)
+    response = client.post('/cover', json={'channel': CHANNEL, 'beat': beat,
+                                           'stems': [{'type': 'Drums'}], 'genre': 'jazz'})
+    assert response.status_code == 202
+    return response.get_json()['jobId']
+
+
+def wait_for(client, job_id, predicate, timeout=15):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = client.get(f'/jobs/{job_id}').get_json()
+        if predicate(job):
+            return job
+        time.sleep(0.05)
+    raise AssertionError(f'job {job_id} did not get there in {timeout}s: {job}')
+
+
+def waiting_task(kie, client, job_id):
+    """The stand-in's task for a cover job, once the job waits on it"""
+    wait_for(client, job_id, lambda job: job['status'] == 'waiting')
+    return max(kie.tasks)
+
+
+def test_callback_token_required(client, kie):
+    body = kie.callback('task-unknown')
+    assert client.post('/kie-callback', json=body).status_code == 403
+    assert client.post('/kie-callback?token=wrong', json=body).status_code == 403
+    assert client.post('/kie-callback?token=test-token', json=body).status_code == 200
+
+
+def test_callback_without_task_is_rejected(client):
+    response = client.post('/kie-callback?token=test-token', json={'code': 200, 'data': {}})
+    assert response.status_code == 400
+
+
+def test_from_callback_first_and_complete(kie):
+    task_id, first = kie_tasks.from_callback(kie.callback('t1', 'first'))
+    assert task_id == 't1'
+    assert first['status'] == 'FIRST_SUCCESS'
+
+    task_id, complete = kie_tasks.from_callback(kie.callback('t1', 'complete'))
+    assert complete['status'] == 'SUCCESS'
+    assert complete['taskId'] == 't1'
+    assert [clip['audioUrl'] for clip in kie_tasks.clips(complete)] == \
+        [clip['audioUrl'] for clip in kie.clips('t1')]
+    assert 'errorMessage' not in complete
+
+
+def test_from_callback_error():
+    task_id, error = kie_tasks.from_callback({
+        'code': 531, 'msg': 'Audio generation failed',
+        'data': {'callbackType': 'error', 'taskId': 't2', 'data': None}})
+    assert task_id == 't2'
+    assert error['status'] == 'GENERATE_AUDIO_FAILED'
+    assert error['errorMessage'] == 'Audio generation failed'
+    assert kie_tasks.clips(error) == []
+
+
+def test_from_callback_not_a_task():
+    assert kie_tasks.from_callback({}) == (None, None)
+    assert kie_tasks.from_callback({'data': {'callbackType': 'complete'}}) == (None, None)
+
+
+def test_callback_finishes_waiting_job(client, server, kie):
+    job_id = submit_cover(client, server, 'CallbackBeat')
+    task_id = waiting_task(kie, client, job_id)
+
+    # record-info still says PENDING - only the callback carries the result
+    response = client.post('/kie-callback?token=test-token', json=kie.callback(task_id))
+    assert response.get_json() == {'status': 'received'}
+
+    job = wait_for(client, job_id, lambda job: job['finished'])
+    assert job['status'] == 'complete'
+    covers = os.listdir(os.path.join(server.DOWNLOADS_DIR, CHANNEL, 'CallbackBeat', 'ai_covers'))
+    assert len([name for name in covers if name.endswith('.mp3')]) == 2
+    assert not server.kie_tracker.tracking(task_id)
+
+
+def test_polling_fallback_without_callback(client, server, kie):
+    job_id = submit_cover(client, server, 'PolledBeat')
+    task_id = waiting_task(kie, client, job_id)
+
+    # No callback is ever delivered - record-info has to find the result
+    kie.finish(task_id)
+    job = wait_for(client, job_id, lambda job: job['finished'])
+    assert job['status'] == 'complete'
+    assert task_id in kie.polls
+    covers = os.listdir(os.path.join(server.DOWNLOADS_DIR, CHANNEL, 'PolledBeat', 'ai_covers'))
+    assert len([name for name in covers if name.endswith('.mp3')]) == 2
+
+
+def test_callback_error_fails_job(client, server, kie):
+    job_id = submit_cover(client, server, 'FailedBeat')
+    task_id = waiting_task(kie, client, job_id)
+
+    body = {'code': 531, 'msg': 'Audio generation failed',
+            'data': {'callbackType': 'error', 'task_id': task_id, 'data': None}}
+    client.post('/kie-callback?token=test-token', json=body)
+
+    job = wait_for(client, job_id, lambda job: job['finished'])
+    assert job['status'] == 'failed'
+    errors = [msg['error'] for msg in server.job_registry.get(job_id).events if msg.get('error')]
+    assert errors == ['Generation failed: Audio generation failed']
+    assert not server.kie_tracker.tracking(task_id)
+
+
+def test_finish_without_submit_time(server):
+    # Jobs stored before submit times were recorded only saved the taskId
+    job = jobs.Job('cover', ('old',), {})
+    job.mark_step('OldBeat', 'submitted', {'taskId': 'old-task'})
+    server.finish_kie_cover(CHANNEL, 'OldBeat', 'jazz',
+                            {'taskId': 'old-task', 'status': 'GENERATE_AUDIO_FAILED',
+                             'errorMessage': 'Audio generation failed'}, job)
+    assert [msg['error'] for msg in job.events if msg.get('error')] == \
+        ['Generation failed: Audio generation failed']
+
+
+def test_cover_request_locks_are_dropped_when_unused(server):
+    inside = []
+    entered = threading.Event()
+    release = threading.Event()
+
+    def work(name, wait=None):
+        with server.cover_request_lock('shared-key'):
+            inside.append(name)
+            entered.set()
+            if wait:
+                wait.wait(5)
+            inside.append(name)
+
+    first = threading.Thread(target=work, args=('first', release))
+    first.start()
+    assert entered.wait(2)
+    second = threading.Thread(target=work, args=('second',))
+    second.start()
+    time.sleep(0.05)
+    assert inside == ['first']     # the second waits on the same lock
+    assert server.cover_request_locks['shared-key'][1] == 2
+
+    release.set()
+    first.join(2)
+    second.join(2)
+    assert inside == ['first', 'first', 'second', 'second']
+    assert 'shared-key' not in server.cover_request_locks
@@ -0,0 +1,70 @@
+"""KieTaskTracker scheduling without a server"""
+
+import time
+import threading
+
+import kie_tasks
+
+
+class Fetch:
+    """record-info stand-in returning a fixed status"""
+
+    def __init__(self, status):
+        self.status = status
+        self.calls = []
+
+    def __call__(self, task_id):
+        self.calls.append(task_id)
+        clips = [{'id': 'c1', 'audioUrl': 'https://kie.test/c1.mp3'}] if self.status == 'SUCCESS' else []
+        return {'taskId': task_id, 'status': self.status, 'response': {'sunoData': clips}}
+
+
+def track(tracker, task_id, **kwargs):
+    updates = []
+    done = threading.Event()
+
+    def on_update(task_data):
+        updates.append(task_data)
+        if task_data['status'] in kie_tasks.TERMINAL_STATUSES:
+            done.set()
+
+    tracker.track(task_id, on_update, **kwargs)
+    assert done.wait(10), updates
+    return updates
+
+
+def test_resumed_task_past_timeout_is_polled_first():
+    fetch = Fetch('SUCCESS')
+    tracker = kie_tasks.KieTaskTracker(fetch, timeout=600)
+
+    updates = track(tracker, 'late', started=time.time() - 900, poll_now=True)
+
+    assert fetch.calls == ['late']
+    assert [u['status'] for u in updates] == ['SUCCESS']
+
+
+def test_unfinished_task_times_out_after_a_poll():
+    fetch = Fetch('PENDING')
+    tracker = kie_tasks.KieTaskTracker(fetch, timeout=600)
+
+    updates = track(tracker, 'stuck', started=time.time() - 900, poll_now=True)
+
+    assert fetch.calls == ['stuck']
+    assert [u['status'] for u in updates] == ['PENDING', 'TIMEOUT']
+    assert not tracker.tracking('stuck')
+
+
+def test_pushed_result_finishes_task_without_polling():
+    fetch = Fetch('PENDING')
+    tracker = kie_tasks.KieTaskTracker(fetch)
+    updates = []
+    tracker.track('pushed', updates.append)
+
+    task_id, task_data = kie_tasks.from_callback({'code': 200, 'data': {
+        'callbackType': 'complete', 'task_id': 'pushed',
+        'data': [{'id': 'c1', 'audio_url': 'https://kie.test/c1.mp3'}]}})
+    assert tracker.deliver(task_id, task_data)
+
+    assert [u['status'] for u in updates] == ['SUCCESS']
+    assert fetch.calls == []
+    assert not tracker.tracking('pushed')
@@ -0,0 +1,32 @@
+"""Cursor validation of the paginated library listings"""
+
+import json
+import base64
+
+import pytest
+
+
+def cursor(value):
+    return base64.urlsafe_b64encode(json.dumps(value).encode()).decode()
+
+
+@pytest.mark.parametrize('value', [{'name': 'a'}, ['a', 'b'], 3, None, ['a']])
+def test_beats_rejects_wrong_cursor_shape(client, value):
+    response = client.get(f'/beats/AnyChannel?cursor={cursor(value)}')
+    assert response.status_code == 400
+    assert response.get_json() == {'error': 'Invalid cursor'}
+
+
+@pytest.mark.parametrize('value', [{'name': 'a'}, ['a', 'b'], 'a', ['a', 'b', 3], ['a', 'b', 'c', 'd']])
+def test_samples_rejects_wrong_cursor_shape(client, value):
+    response = client.get(f'/samples?cursor={cursor(value)}')
+    assert response.status_code == 400
+
+
+def test_garbage_cursor_is_rejected(client):
+    assert client.get('/beats/AnyChannel?cursor=%%%').status_code == 400
+
+
+def test_valid_cursors_are_accepted(client):
+    assert client.get(f'/beats/AnyChannel?cursor={cursor("Beat")}').status_code == 200
+    assert client.get(f'/samples?cursor={cursor(["AnyChannel", "Beat", "Drums_Beat.mp3"])}').status_code == 200
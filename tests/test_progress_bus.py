@@ -0,0 +1,78 @@
+"""ProgressBus coalescing, release and persistence"""
+
+import time
+import threading
+
+import progress_bus
+
+
+def test_progress_is_coalesced_per_item():
+    bus = progress_bus.ProgressBus(interval=60)
+    for percent in range(10):
+        bus.publish({'progress': percent, 'item': 'a'})
+    bus.publish({'status': 'done with a'})
+
+    assert bus.events == [{'progress': 0, 'item': 'a'}, {'progress': 9, 'item': 'a'},
+                          {'status': 'done with a'}]
+
+
+def test_held_back_progress_is_released_without_a_reader():
+    saved = []
+    bus = progress_bus.ProgressBus(interval=0.05, on_append=lambda seq, msg: saved.append((seq, msg)))
+    bus.publish({'progress': 1, 'item': 'a'})
+    bus.publish({'progress': 2, 'item': 'a'})
+
+    deadline = time.time() + 2
+    while len(saved) < 2 and time.time() < deadline:
+        time.sleep(0.01)
+    assert saved == [(1, {'progress': 1, 'item': 'a'}), (2, {'progress': 2, 'item': 'a'})]
+
+
+def test_slow_store_does_not_block_readers():
+    writing = threading.Event()
+    release = threading.Event()
+
+    def slow_write(seq, msg):
+        writing.set()
+        release.wait(5)
+
+    bus = progress_bus.ProgressBus(on_append=slow_write)
+    producer = threading.Thread(target=bus.publish, args=({'status': 'one'},))
+    producer.start()
+    assert writing.wait(2)
+
+    started = time.perf_counter()
+    assert bus.read(0, timeout=0) == [{'status': 'one'}]
+    assert time.perf_counter() - started < 0.5
+
+    release.set()
+    producer.join(2)
+
+
+def test_events_are_saved_in_order():
+    saved = []
+    bus = progress_bus.ProgressBus(interval=0, on_append=lambda seq, msg: saved.append(seq))
+    threads = [threading.Thread(target=lambda n=n: [bus.publish({'status': f'{n}-{i}'}) for i in range(50)])
+               for n in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    bus.close()
+
+    assert saved == list(range(1, 201))
+
+
+def test_listeners_are_woken_by_events_and_close():
+    bus = progress_bus.ProgressBus(interval=60)
+    wakes = []
+    stop = bus.listen(lambda: wakes.append(len(bus.events)))
+
+    bus.publish({'progress': 1, 'item': 'a'})
+    bus.publish({'progress': 2, 'item': 'a'})   # held back - nothing new to read
+    bus.publish({'status': 'next'})
+    assert wakes == [1, 3]
+
+    stop()
+    bus.close()
+    assert wakes == [1, 3]
@@ -0,0 +1,46 @@
+"""Candidate ordering of /search at scale"""
+
+import random
+
+import library_index
+import sample_search
+
+KEYS = ['Amin', 'Cmaj', 'Emin', 'Gmaj', 'Dmin', 'F#min']
+
+
+def build_library(tmp_path, count=2000):
+    library = library_index.LibraryIndex(str(tmp_path / 'library.sqlite3'))
+    rng = random.Random(7)
+    for n in range(count):
+        bpm = rng.randint(60, 180)
+        key = rng.choice(KEYS)
+        library.add_file(f'Chan{n % 7}/Beat{n}/isolated_samples/Drums_Beat{n}_{bpm}BPM_{key}.mp3', 1000)
+    return library
+
+
+def test_limit_keeps_the_best_candidates(tmp_path):
+    library = build_library(tmp_path)
+    bpm, tolerance = 120.0, 6.0
+    keys = sample_search.matching_keys('Amin', 'compatible')
+    bpm_ranges = [(low, high) for _, low, high in sample_search.tempo_ranges(bpm, tolerance)]
+    search = dict(bpm_ranges=bpm_ranges, keys=list(keys))
+
+    everything = sample_search.rank(library.search_stems(**search, limit=100000), bpm, tolerance, keys)
+    assert len(everything) > 40
+
+    limited = library.search_stems(**search, limit=20, score=sample_search.score_terms(bpm, tolerance, keys))
+    assert [s['path'] for s in sample_search.rank(limited, bpm, tolerance, keys)] == \
+        [s['path'] for s in everything[:20]]
+
+
+def test_tempo_only_ordering(tmp_path):
+    library = build_library(tmp_path, 500)
+    bpm, tolerance = 90.0, 3.0
+    bpm_ranges = [(low, high) for _, low, high in sample_search.tempo_ranges(bpm, tolerance, False)]
+
+    everything = sample_search.rank(library.search_stems(bpm_ranges=bpm_ranges, limit=100000),
+                                    bpm, tolerance, half_double=False)
+    limited = library.search_stems(bpm_ranges=bpm_ranges, limit=5,
+                                   score=sample_search.score_terms(bpm, tolerance, half_double=False))
+    assert [s['path'] for s in sample_search.rank(limited, bpm, tolerance, half_double=False)] == \
+        [s['path'] for s in everything[:5]]
@@ -0,0 +1,59 @@
+"""Pool queue announcements and priority parsing"""
+
+import time
+import threading
+
+import jobs
+import progress_bus
+import scheduler
+
+
+def test_queue_positions_are_coalesced():
+    pool = scheduler.Pool('test', workers=1, max_queued=50)
+    release = threading.Event()
+    started = threading.Event()
+
+    def block(job):
+        started.set()
+        release.wait(5)
+
+    pool.submit(jobs.Job('test', ('blocker',), {}), block)
+    assert started.wait(2)
+
+    waiting = [jobs.Job('test', (n,), {}) for n in range(20)]
+    for job in waiting:
+        pool.submit(job, lambda job: None)
+
+    # Appending to the queue doesn't move anyone ahead of the new job
+    assert all(len([m for m in job.events if m.get('queued')]) == 1 for job in waiting)
+    assert waiting[-1].events[-1]['position'] == 20
+
+    # Draining moves everyone up 19 times; the bus keeps the latest position only
+    release.set()
+    deadline = time.time() + 5
+    while pool.stats()['queued'] or pool.stats()['running']:
+        assert time.time() < deadline
+        time.sleep(0.01)
+    for job in waiting:
+        job.bus.close()
+    assert max(len([m for m in job.events if m.get('queued')]) for job in waiting) <= 3
+
+
+def test_queue_message_is_progress():
+    assert progress_bus.is_progress({'queued': True, 'item': 'queue', 'position': 2, 'eta': 10,
+                                     'startAt': 0, 'status': 'Queued (position 2)'})
+    assert not progress_bus.is_progress({'queued': True, 'position': 2, 'error': 'x', 'item': 'queue'})
+
+
+def test_parse_priority():
+    assert scheduler.parse_priority('HIGH') == scheduler.PRIORITY_HIGH
+    assert scheduler.parse_priority(None, scheduler.PRIORITY_LOW) == scheduler.PRIORITY_LOW
+    assert scheduler.parse_priority('urgent') == scheduler.PRIORITY_NORMAL
+    assert scheduler.parse_priority(0) == scheduler.PRIORITY_HIGH
+
+
+def test_parse_priority_bounds():
+    assert scheduler.parse_priority(-100) == scheduler.PRIORITY_HIGH
+    assert scheduler.parse_priority(99) == scheduler.PRIORITY_LOW
+    assert scheduler.parse_priority(True, scheduler.PRIORITY_LOW) == scheduler.PRIORITY_LOW
+    assert scheduler.parse_priority(False) == scheduler.PRIORITY_NORMAL
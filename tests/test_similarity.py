@@ -0,0 +1,77 @@
+"""SimilarityIndex growth, top-k ranking and reload"""
+
+import numpy as np
+import pytest
+
+import similarity
+
+
+def brute_force(index, path, k, exclude_prefix=None):
+    paths, matrix, positions = index._normalize()
+    scores = matrix @ matrix[positions[path]]
+    ranked = [paths[i] for i in np.argsort(-scores, kind='stable')
+              if paths[i] != path and not (exclude_prefix and paths[i].startswith(exclude_prefix))]
+    return ranked[:k]
+
+
+@pytest.fixture
+def index(tmp_path):
+    index = similarity.SimilarityIndex(str(tmp_path))
+    rng = np.random.default_rng(7)
+    for beat in range(30):
+        for stem in range(10):
+            index.add(f'Chan/Beat{beat}/isolated_samples/Stem{stem}.mp3',
+                      rng.standard_normal(similarity.FEATURE_DIM))
+    return index
+
+
+def test_nearest_matches_a_full_sort(index):
+    query = 'Chan/Beat3/isolated_samples/Stem1.mp3'
+    assert [p for p, _ in index.nearest(query, k=10)] == brute_force(index, query, 10)
+
+
+def test_nearest_skips_excluded_beat(index):
+    query = 'Chan/Beat3/isolated_samples/Stem1.mp3'
+    results = index.nearest(query, k=25, exclude_prefix='Chan/Beat3/')
+    assert [p for p, _ in results] == brute_force(index, query, 25, 'Chan/Beat3/')
+
+    # Exclusions can leave fewer than k candidates
+    assert len(index.nearest(query, k=500, exclude_prefix='Chan/Beat')) == 0
+    assert len(index.nearest(query, k=500)) == 299
+
+
+def test_growth_keeps_rows_and_survives_reload(index, tmp_path):
+    assert len(index) == 300
+    assert len(index._vectors) >= 300
+    reloaded = similarity.SimilarityIndex(str(tmp_path))
+    assert len(reloaded) == 300
+
+    query = 'Chan/Beat0/isolated_samples/Stem0.mp3'
+    assert reloaded.nearest(query, k=5) == index.nearest(query, k=5)
+
+    # Adding after a reload grows the loaded array
+    reloaded.add('Chan/New/isolated_samples/Drums.mp3', np.ones(similarity.FEATURE_DIM))
+    assert 'Chan/New/isolated_samples/Drums.mp3' in reloaded
+    assert len(reloaded.nearest(query, k=500)) == 300
+
+
+def test_remove_and_compact(index):
+    for beat in range(25):
+        index.remove(f'Chan/Beat{beat}')
+    assert len(index) == 50
+    query = 'Chan/Beat27/isolated_samples/Stem2.mp3'
+    assert [p for p, _ in index.nearest(query, k=10)] == brute_force(index, query, 10)
+
+
+def test_re_adding_compacts_dead_rows(tmp_path):
+    index = similarity.SimilarityIndex(str(tmp_path))
+    rng = np.random.default_rng(3)
+    for _ in range(20):
+        for stem in range(10):
+            index.add(f'Chan/Beat/isolated_samples/Stem{stem}.mp3', rng.standard_normal(similarity.FEATURE_DIM))
+
+    assert len(index) == 10
+    assert index._rows <= 2 * 10 + 100
+    rows = (tmp_path / 'features.f32').stat().st_size // (4 * similarity.FEATURE_DIM)
+    assert rows == index._rows
+    assert len(similarity.SimilarityIndex(str(tmp_path))) == 10
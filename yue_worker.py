@@ -0,0 +1,288 @@
+"""
+YuE Worker Module
+Runs YuE inference in long-lived worker processes, so torch and the YuE and
+xcodec models are loaded once instead of on every cover. Requests wait in a
+bounded queue and are served YUE_WORKERS at a time; a worker process exits
+after YUE_IDLE_SECONDS without work to give its memory back, and the next
+request starts a new one.
+
+This file is also the worker process (python yue_worker.py). It talks to the
+server over stdin/stdout in JSON lines:
+    -> {'args': [infer.py arguments], 'cwd': inference dir}
+    <- {'event': 'ready'}
+    <- {'event': 'progress', 'line': str, 'percent': float or None, 'stage': int or None}
+    <- {'event': 'done', 'returncode': int, 'error': str or None}
+
+YuE's infer.py loads its models at the top level of the script, so the
+worker runs it with runpy for each request and keeps what it loads through
+from_pretrained and torch.load between runs.
+"""
+
+import os
+import re
+import sys
+import json
+import queue
+import threading
+import subprocess
+
+# Worker processes, i.e. inferences running at once (each holds its own models)
+YUE_WORKERS = int(os.environ.get('YUE_WORKERS', 1))
+
+# Requests waiting for a worker beyond this many are refused
+YUE_QUEUE_SIZE = int(os.environ.get('YUE_QUEUE_SIZE', 4))
+
+# A worker with nothing to do for this long exits and frees its models (seconds)
+YUE_IDLE_SECONDS = int(os.environ.get('YUE_IDLE_SECONDS', 600))
+
+# Seconds allowed for a new worker to import torch before it is given up on
+YUE_START_TIMEOUT = 300
+
+PERCENT_PATTERN = re.compile(r'(\d{1,3})%\|')
+STAGE_PATTERN = re.compile(r'stage\s*(\d)', re.IGNORECASE)
+
+
+class QueueFull(Exception):
+    """Raised when YUE_QUEUE_SIZE requests are already waiting"""
+
+
+def parse_progress(line):
+    """Percent and stage announced by an infer.py output line (tqdm bars, stage headers)"""
+    percent = PERCENT_PATTERN.search(line)
+    stage = STAGE_PATTERN.search(line)
+    return (float(percent.group(1)) if percent else None,
+            int(stage.group(1)) if stage else None)
+
+
+class YueWorkerPool:
+    """Bounded queue of inference requests served by persistent worker processes"""
+
+    def __init__(self, workers=YUE_WORKERS, queue_size=YUE_QUEUE_SIZE, idle_seconds=YUE_IDLE_SECONDS):
+        self.workers = max(1, workers)
+        self.idle_seconds = idle_seconds
+        self.busy = 0
+        self.processes = 0
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._threads = []
+        self._lock = threading.Lock()
+
+    def submit(self, args, cwd, on_event):
+        """Queue an inference
+
+        Args:
+            args: infer.py command-line arguments
+            cwd: Directory infer.py runs in (its model paths are relative)
+            on_event: Callback(event) for every progress event and the final
+                'done' event; runs on the worker's thread
+
+        Returns:
+            Number of requests ahead of this one
+
+        Raises:
+            QueueFull if the queue is at YUE_QUEUE_SIZE
+        """
+        with self._lock:
+            ahead = self._queue.qsize() + self.busy
+            try:
+                self._queue.put_nowait({'args': list(args), 'cwd': cwd, 'on_event': on_event})
+            except queue.Full:
+                raise QueueFull(f'YuE queue is full ({self._queue.maxsize} covers waiting)')
+            if len(self._threads) < self.workers:
+                thread = threading.Thread(target=self._slot, name=f'yue-worker-{len(self._threads)}', daemon=True)
+                self._threads.append(thread)
+                thread.start()
+        return ahead
+
+    def stats(self):
+        with self._lock:
+            return {'queued': self._queue.qsize(), 'busy': self.busy, 'processes': self.processes}
+
+    def _slot(self):
+        """One worker process's thread: start it on demand, stop it when idle"""
+        process = None
+        while True:
+            try:
+                request = self._queue.get(timeout=self.idle_seconds if process else None)
+            except queue.Empty:
+                print(f'YuE worker idle for {self.idle_seconds}s - unloading models')
+                process = self._stop(process)
+                continue
+
+            with self._lock:
+                self.busy += 1
+            try:
+                if process is None or process.poll() is not None:
+                    process = self._start(request['on_event'])
+                if process is not None and not self._serve(process, request):
+                    process = self._stop(process)
+            finally:
+                with self._lock:
+                    self.busy -= 1
+
+    def _start(self, on_event):
+        """Launch a worker process and wait until it has imported torch"""
+        on_event({'event': 'progress', 'line': 'Starting YuE worker (loading torch)...',
+                  'percent': None, 'stage': None})
+        process = subprocess.Popen(
+            [sys.executable, os.path.abspath(__file__)],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+            text=True, bufsize=1
+        )
+        with self._lock:
+            self.processes += 1
+        timer = threading.Timer(YUE_START_TIMEOUT, process.kill)
+        timer.start()
+        try:
+            line = process.stdout.readline()
+        finally:
+            timer.cancel()
+        try:
+            ready = json.loads(line).get('event') == 'ready'
+        except ValueError:
+            ready = False
+        if ready:
+            return process
+        on_event({'event': 'done', 'returncode': 1, 'error': 'YuE worker failed to start'})
+        self._stop(process)
+        return None
+
+    def _stop(self, process):
+        if process is not None:
+            try:
+                process.stdin.close()
+                process.wait(timeout=10)
+            except (OSError, subprocess.TimeoutExpired):
+                process.kill()
+            with self._lock:
+                self.processes -= 1
+        return None
+
+    def _serve(self, process, request):
+        """Run one request on a process
+
+        Returns:
+            False if the process died and must be replaced
+        """
+        on_event = request['on_event']
+        try:
+            process.stdin.write(json.dumps({'args': request['args'], 'cwd': request['cwd']}) + '\n')
+            process.stdin.flush()
+            for line in process.stdout:
+                try:
+                    event = json.loads(line)
+                except ValueError:
+                    continue
+                on_event(event)
+                if event.get('event') == 'done':
+                    return True
+        except OSError as e:
+            print(f'YuE worker pipe error: {e}')
+        on_event({'event': 'done', 'returncode': 1, 'error': 'YuE worker exited unexpectedly'})
+        return False
+
+
+# --- Worker process ---
+
+class _ProgressWriter:
+    """File object that turns infer.py's output (tqdm uses \\r) into progress events"""
+
+    def __init__(self, send):
+        self._send = send
+        self._pending = ''
+        self._last = None
+
+    def write(self, text):
+        self._pending += text
+        *lines, self._pending = re.split(r'[\r\n]', self._pending)
+        for line in lines:
+            line = line.strip()
+            if line and line != self._last:
+                self._last = line
+                percent, stage = parse_progress(line)
+                self._send({'event': 'progress', 'line': line[:200], 'percent': percent, 'stage': stage})
+        return len(text)
+
+    def flush(self):
+        pass
+
+    def isatty(self):
+        return False
+
+
+def _keep_model_loads():
+    """Make model loading return the object loaded by an earlier run"""
+    import torch
+
+    loaded = {}
+
+    def remember(load):
+        def load_once(source, *args, **kwargs):
+            if not isinstance(source, (str, os.PathLike)):
+                return load(source, *args, **kwargs)
+            key = (load.__qualname__, os.fspath(source), repr(args), repr(sorted(kwargs.items())))
+            if key not in loaded:
+                loaded[key] = load(source, *args, **kwargs)
+            return loaded[key]
+        return load_once
+
+    torch.load = remember(torch.load)
+    try:
+        import transformers
+    except ImportError:
+        return
+    for name in ('AutoModelForCausalLM', 'AutoModel'):
+        model_class = getattr(transformers, name, None)
+        if model_class is not None:
+            model_class.from_pretrained = remember(model_class.from_pretrained)
+
+
+def _serve_forever():
+    import gc
+    import runpy
+    import traceback
+
+    # Protocol on a private copy of stdout; anything else printed goes to stderr
+    protocol = os.fdopen(os.dup(1), 'w', buffering=1)
+    os.dup2(2, 1)
+    lock = threading.Lock()
+
+    def send(event):
+        with lock:
+            protocol.write(json.dumps(event) + '\n')
+
+    import torch
+    _keep_model_loads()
+    send({'event': 'ready'})
+
+    for line in sys.stdin:
+        request = json.loads(line)
+        args = list(request['args'])
+        if not torch.cuda.is_available() and '--cuda_idx' not in args:
+            args += ['--cuda_idx', '-1']
+            send({'event': 'progress', 'line': 'Using CPU for inference (slower)...', 'percent': None, 'stage': None})
+
+        infer_path = os.path.join(request['cwd'], 'infer.py')
+        saved = (sys.argv, sys.stdout, sys.stderr, list(sys.path), os.getcwd())
+        returncode, error = 0, None
+        try:
+            os.chdir(request['cwd'])
+            sys.path.insert(0, request['cwd'])
+            sys.argv = [infer_path] + args
+            sys.stdout = sys.stderr = _ProgressWriter(send)
+            runpy.run_path(infer_path, run_name='__main__')
+        except SystemExit as e:
+            returncode = e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
+        except Exception as e:
+            traceback.print_exc()
+            returncode, error = 1, str(e)
+        finally:
+            sys.argv, sys.stdout, sys.stderr, sys.path[:], cwd = saved
+            os.chdir(cwd)
+            gc.collect()
+            if torch.cuda.is_available():
+                torch.cuda.empty_cache()
+        send({'event': 'done', 'returncode': returncode, 'error': error})
+
+
+if __name__ == '__main__':
+    _serve_forever()